@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     EventAnalytics, VoteTimeSeries, DemographicData,
-    ContestantAnalytics, AnalyticsSnapshot
+    ContestantAnalytics, AnalyticsSnapshot, VoteRollup
 )
 
 
@@ -40,8 +40,8 @@ class DemographicDataAdmin(admin.ModelAdmin):
 @admin.register(ContestantAnalytics)
 class ContestantAnalyticsAdmin(admin.ModelAdmin):
     readonly_fields = ['updated_at']
-    list_display = ['contestant', 'event', 'total_votes', 'total_revenue', 'vote_rank']
-    list_filter = ['event', 'vote_rank']
+    list_display = ['contestant', 'event', 'total_votes', 'total_revenue']
+    list_filter = ['event']
     search_fields = ['contestant__name', 'event__name']
     ordering = ['-total_votes']
 
@@ -53,3 +53,11 @@ class AnalyticsSnapshotAdmin(admin.ModelAdmin):
     list_filter = ['event', 'date']
     search_fields = ['event__name']
     ordering = ['-date']
+
+
+@admin.register(VoteRollup)
+class VoteRollupAdmin(admin.ModelAdmin):
+    list_display = ['event', 'resolution', 'bucket', 'vote_count', 'revenue', 'unique_voters', 'dirty']
+    list_filter = ['resolution', 'dirty', 'event']
+    search_fields = ['event__name']
+    ordering = ['-bucket']
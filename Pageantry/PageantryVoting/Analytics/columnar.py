@@ -0,0 +1,125 @@
+"""
+Columnar (Parquet) Exports
+- An event's votes (with their fraud detection) or vote audit log written as a
+  compressed Parquet file with typed columns: UTC timestamps, decimal amounts,
+  dictionary-encoded categoricals (payment_status, action, names)
+- Rows are read in chunks and written one row group at a time, so memory is
+  bounded by the row group size
+- pyarrow is optional (requirements-parquet.txt); without it the exports raise
+  ColumnarExportUnavailable
+"""
+
+import json
+import logging
+
+from django.conf import settings
+
+from Event.models import Vote, VoteAuditLog
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION = 'zstd'
+TABLES = ('votes', 'audit')
+
+
+class ColumnarExportUnavailable(Exception):
+    pass
+
+
+def _load_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ColumnarExportUnavailable("Parquet export needs pyarrow (pip install -r requirements-parquet.txt)") from e
+    return pyarrow, pyarrow.parquet
+
+
+def _json(value):
+    return json.dumps(value) if value is not None else None
+
+
+def _columns(pa, table):
+    """(column name, values lookup, arrow type, dictionary encoded, converter)"""
+    timestamp = pa.timestamp('us', tz='UTC')
+    if table == 'votes':
+        return [
+            ('id', 'id', pa.int64(), False, None),
+            ('created_at', 'created_at', timestamp, False, None),
+            ('updated_at', 'updated_at', timestamp, False, None),
+            ('contestant_id', 'contestant_id', pa.int64(), False, None),
+            ('contestant', 'contestant__name', pa.string(), True, None),
+            ('category', 'contestant__category__name', pa.string(), True, None),
+            ('number_of_votes', 'number_of_votes', pa.int32(), False, None),
+            ('vote_amount', 'vote_amount', pa.decimal128(10, 2), False, None),
+            ('payment_status', 'payment_status', pa.string(), True, None),
+            ('payment_reference', 'payment_reference', pa.string(), False, None),
+            ('voter_email', 'voter_email', pa.string(), False, None),
+            ('voter_ip', 'voter_ip', pa.string(), False, None),
+            ('voter_identifier', 'voter_identifier', pa.string(), False, None),
+            ('risk_score', 'fraud_detection__risk_score', pa.int16(), False, None),
+            ('is_suspicious', 'fraud_detection__is_suspicious', pa.bool_(), False, None),
+            ('is_quarantined', 'fraud_detection__is_quarantined', pa.bool_(), False, None),
+            ('fraud_flags', 'fraud_detection__fraud_flags', pa.list_(pa.string()), False, None),
+            ('device_fingerprint', 'fraud_detection__device_fingerprint', pa.string(), False, None),
+        ]
+    return [
+        ('id', 'id', pa.int64(), False, None),
+        ('created_at', 'created_at', timestamp, False, None),
+        ('vote_id', 'vote_id', pa.int64(), False, None),
+        ('action', 'action', pa.string(), True, None),
+        ('description', 'description', pa.string(), False, None),
+        ('actor', 'actor', pa.string(), False, None),
+        ('ip_address', 'ip_address', pa.string(), False, None),
+        ('metadata', 'metadata', pa.string(), False, _json),
+    ]
+
+
+def _queryset(event, table):
+    if table == 'votes':
+        return Vote.objects.filter(event=event).order_by('id')
+    return VoteAuditLog.objects.filter(vote__event=event).order_by('id')
+
+
+def _batch(pa, schema, columns, rows):
+    arrays = []
+    for index, (_, _, arrow_type, dictionary, convert) in enumerate(columns):
+        values = [row[index] for row in rows]
+        if convert is not None:
+            values = [convert(value) for value in values]
+        array = pa.array(values, type=arrow_type)
+        arrays.append(array.dictionary_encode() if dictionary else array)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(event, sink, table='votes'):
+    """Write an event's votes or audit log to `sink` (path or binary file). Returns the row count."""
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    pa, pq = _load_pyarrow()
+
+    columns = _columns(pa, table)
+    schema = pa.schema([
+        pa.field(name, pa.dictionary(pa.int32(), arrow_type) if dictionary else arrow_type)
+        for name, _, arrow_type, dictionary, _ in columns
+    ])
+    row_group_size = settings.ANALYTICS_PARQUET_ROW_GROUP_SIZE
+    rows = _queryset(event, table).values_list(*(lookup for _, lookup, _, _, _ in columns)).iterator(
+        chunk_size=settings.ANALYTICS_EXPORT_CHUNK_SIZE
+    )
+
+    count = 0
+    with pq.ParquetWriter(sink, schema, compression=COMPRESSION) as writer:
+        pending = []
+        for row in rows:
+            pending.append(row)
+            if len(pending) >= row_group_size:
+                writer.write_batch(_batch(pa, schema, columns, pending), row_group_size=row_group_size)
+                count += len(pending)
+                pending = []
+        if pending:
+            writer.write_batch(_batch(pa, schema, columns, pending), row_group_size=row_group_size)
+            count += len(pending)
+
+    logger.info(f"Wrote {count} {table} rows of event {event.id} as Parquet")
+    return count
@@ -0,0 +1,255 @@
+"""
+Sharded Counters
+- With ANALYTICS_COUNTER_SHARDS > 1 the engine stops updating the hot aggregate
+  rows (the event, its contestants, the current hour, day and minute) on every
+  vote: each apply adds its changes to one of N CounterShard rows per target,
+  picked at random, so concurrent votes rarely wait for the same row lock
+- New voters go into the shard's HyperLogLog sketch (sketch unions are exact);
+  a voter leaving the completed set compacts its event first, so the rebuilt
+  sketches are not merged with shards that still hold the voter
+- Headline readers add the pending shard sums (overlay_event, pending_contestants);
+  compact() folds the shards into the aggregate rows and refreshes the ratios
+  the sharded path skips. Run it every few seconds (compact_counters)
+"""
+
+import logging
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from Event.models import Vote
+from .hll import HyperLogLog
+from . import rollups
+from .models import (
+    AnalyticsSnapshot, ContestantAnalytics, CounterShard, EventAnalytics, VoteRollup, VoteTimeSeries
+)
+
+logger = logging.getLogger(__name__)
+
+# Engine counter field -> CounterShard column, per target
+FIELDS = {
+    'event': {
+        'total_votes': 'votes',
+        'total_vote_amount': 'amount',
+        'completed_payments': 'completed_payments',
+        'failed_payments': 'failed_payments',
+        'pending_payments': 'pending_payments',
+        'refunded_amount': 'refunded_amount',
+    },
+    'contestant': {'total_votes': 'votes', 'total_revenue': 'amount'},
+    'hour': {'vote_count': 'votes', 'revenue_generated': 'amount'},
+    'day': {'total_votes': 'votes', 'total_revenue': 'amount'},
+    'rollup': {'vote_count': 'votes', 'revenue': 'amount'},
+}
+
+
+def shard_count():
+    return getattr(settings, 'ANALYTICS_COUNTER_SHARDS', 0)
+
+
+def enabled():
+    return shard_count() > 1
+
+
+def pick_shard():
+    return random.randrange(shard_count())
+
+
+def encode_key(target, value):
+    """target_key for a contestant id or bucket ('' for the event itself)"""
+    if target == 'event':
+        return ''
+    if target == 'contestant':
+        return str(value)
+    return value.isoformat()
+
+
+def decode_key(target, target_key):
+    if target == 'event':
+        return None
+    if target == 'contestant':
+        return int(target_key)
+    if target == 'day':
+        return date.fromisoformat(target_key)
+    return datetime.fromisoformat(target_key)
+
+
+# Writing (inside engine.apply)
+
+def increment(event_id, target, target_key, shard, changes):
+    """Add engine counter `changes` to one shard of a target"""
+    lookup = {'event_id': event_id, 'target': target, 'target_key': target_key, 'shard': shard}
+    columns = FIELDS[target]
+    updates = {columns[field]: F(columns[field]) + amount for field, amount in changes.items()}
+    if CounterShard.objects.filter(**lookup).update(**updates):
+        return
+    _ensure_target(event_id, target, target_key)
+    CounterShard.objects.get_or_create(**lookup)
+    CounterShard.objects.filter(**lookup).update(**updates)
+
+
+def _ensure_target(event_id, target, target_key):
+    # Readers overlay shards on the event and contestant rows, so those rows must exist
+    if target == 'event':
+        EventAnalytics.objects.get_or_create(event_id=event_id)
+    elif target == 'contestant':
+        ContestantAnalytics.objects.get_or_create(contestant_id=int(target_key), defaults={'event_id': event_id})
+
+
+def add_voter(event_id, targets, shard, email):
+    """Add a voter to the sketches of one shard of each (target, target_key)"""
+    for target, target_key in targets:
+        lookup = {'event_id': event_id, 'target': target, 'target_key': target_key, 'shard': shard}
+        CounterShard.objects.get_or_create(**lookup)
+        row = CounterShard.objects.select_for_update().filter(**lookup).values('id', 'voter_sketch').first()
+        sketch = HyperLogLog.from_bytes(row['voter_sketch']) if row['voter_sketch'] is not None else HyperLogLog()
+        if sketch.add(email) or row['voter_sketch'] is None:
+            CounterShard.objects.filter(pk=row['id']).update(voter_sketch=sketch.to_bytes())
+
+
+# Reading
+
+def _merge(sketch, registers):
+    if registers is None:
+        return sketch
+    other = HyperLogLog.from_bytes(registers)
+    return sketch.merge(other) if sketch is not None else other
+
+
+def overlay_event(analytics):
+    """Add the pending shard totals of its event to an EventAnalytics instance (in memory only)"""
+    columns = FIELDS['event']
+    sketch = None
+    rows = CounterShard.objects.filter(event_id=analytics.event_id, target='event').values(
+        *columns.values(), 'voter_sketch'
+    )
+    for row in rows:
+        for field, column in columns.items():
+            setattr(analytics, field, getattr(analytics, field) + row[column])
+        sketch = _merge(sketch, row['voter_sketch'])
+
+    if sketch is not None:
+        sketch = _merge(sketch, analytics.voter_sketch)
+        analytics.unique_voters = max(analytics.unique_voters, sketch.count())
+    return analytics
+
+
+def event_totals(event_id):
+    """EventAnalytics of an event with its pending shard totals added (unsaved if it has no row)"""
+    analytics = EventAnalytics.objects.filter(event_id=event_id).first() or EventAnalytics(event_id=event_id)
+    return overlay_event(analytics)
+
+
+def pending_contestants(event_id):
+    """{contestant_id: (votes, revenue)} not compacted yet"""
+    rows = CounterShard.objects.filter(event_id=event_id, target='contestant').values('target_key').annotate(
+        pending_votes=Sum('votes'), pending_revenue=Sum('amount')
+    )
+    return {int(row['target_key']): (row['pending_votes'], row['pending_revenue']) for row in rows}
+
+
+def overlay_contestants(event_id, stats):
+    """Add pending shard totals to ContestantAnalytics instances; returns them re-sorted by votes"""
+    pending = pending_contestants(event_id)
+    if not pending:
+        return stats
+    for stat in stats:
+        votes, revenue = pending.get(stat.contestant_id, (0, 0))
+        stat.total_votes += votes
+        stat.total_revenue += revenue
+    return sorted(stats, key=lambda stat: -stat.total_votes)
+
+
+# Compaction
+
+def _target_row(event_id, target, key):
+    """(model, row lookup, create defaults) of the aggregate row behind a target"""
+    if target == 'event':
+        return EventAnalytics, {'event_id': event_id}, {}
+    if target == 'contestant':
+        return ContestantAnalytics, {'contestant_id': key}, {'event_id': event_id}
+    if target == 'hour':
+        return VoteTimeSeries, {'event_id': event_id, 'timestamp': key}, {}
+    if target == 'day':
+        return AnalyticsSnapshot, {'event_id': event_id, 'date': key}, {}
+    return VoteRollup, {'event_id': event_id, 'resolution': 'minute', 'bucket': key}, {}
+
+
+def _completed_voters(event_id, target, key):
+    """Voter emails of the completed votes counted by a target row (to seed a missing sketch)"""
+    completed = Vote.objects.filter(event_id=event_id, payment_status='completed', voter_email__isnull=False)
+    if target == 'hour':
+        completed = completed.filter(created_at__gte=key, created_at__lt=key + timedelta(hours=1))
+    elif target == 'day':
+        completed = completed.filter(created_at__date=key)
+    elif target == 'rollup':
+        completed = completed.filter(created_at__gte=key, created_at__lt=key + timedelta(minutes=1))
+    return completed.values_list('voter_email', flat=True).distinct()
+
+
+def _merge_sketch(model, lookup, sketch, voters):
+    row = model.objects.select_for_update().filter(**lookup).values('id', 'voter_sketch').first()
+    if row is None:
+        return
+    if row['voter_sketch'] is not None:
+        sketch = sketch.merge(HyperLogLog.from_bytes(row['voter_sketch']))
+    else:
+        # Written before sketches existed: start from every voter counted by the row
+        for email in voters:
+            sketch.add(email)
+    model.objects.filter(pk=row['id']).update(voter_sketch=sketch.to_bytes(), unique_voters=sketch.count())
+
+
+def compact(event_id=None):
+    """Fold counter shards (of one event, or all) into the aggregate rows; returns shards folded"""
+    from . import engine
+
+    with transaction.atomic():
+        shards = CounterShard.objects.select_for_update().order_by('id')
+        if event_id is not None:
+            shards = shards.filter(event_id=event_id)
+        shards = list(shards)
+        if not shards:
+            return 0
+
+        groups = defaultdict(lambda: {'changes': defaultdict(int), 'sketch': None})
+        for shard in shards:
+            group = groups[(shard.event_id, shard.target, shard.target_key)]
+            for field, column in FIELDS[shard.target].items():
+                group['changes'][field] += getattr(shard, column)
+            group['sketch'] = _merge(group['sketch'], shard.voter_sketch)
+
+        touched_events, touched_hours = set(), set()
+        for (shard_event_id, target, target_key), group in groups.items():
+            key = decode_key(target, target_key)
+            changes = {field: amount for field, amount in group['changes'].items() if amount}
+            model, lookup, defaults = _target_row(shard_event_id, target, key)
+
+            if target == 'rollup':
+                rollups.add(shard_event_id, 'minute', key, **changes)
+            elif changes:
+                engine._bump(model, lookup, changes, defaults=defaults)
+            else:
+                model.objects.get_or_create(**lookup, defaults=defaults)
+
+            if group['sketch'] is not None:
+                _merge_sketch(model, lookup, group['sketch'], _completed_voters(shard_event_id, target, key))
+
+            touched_events.add(shard_event_id)
+            if target == 'hour':
+                touched_hours.add((shard_event_id, key))
+
+        CounterShard.objects.filter(pk__in=[shard.pk for shard in shards]).delete()
+
+        for shard_event_id in touched_events:
+            engine._refresh_event_ratios(shard_event_id)
+        for shard_event_id, timestamp in touched_hours:
+            engine._refresh_hour_ratios(shard_event_id, timestamp)
+        engine._bump_tallies(touched_events)
+
+    logger.debug(f"Compacted {len(shards)} counter shards")
+    return len(shards)
@@ -0,0 +1,203 @@
+"""
+Materialized Analytics Dashboard
+- The dashboard payload is built read-only and cached per event, base URL (photo
+  URLs are absolute) and event version (names, categories), together with the
+  tally version it was built from
+- Vote and fraud changes bump the event's tally version (see engine.apply)
+- Stale payloads keep being served while at most one background refresh per
+  interval rebuilds them (stale-while-revalidate)
+"""
+
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from Event.models import Event, Vote
+from Event.versions import get_version
+from . import counters
+from .leaderboards import ranked_contestants
+from .models import EventAnalytics, DemographicData
+from .serializers import EventAnalyticsSerializer, VoteTimeSeriesSerializer, ContestantAnalyticsSerializer
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'dashboard'
+
+
+def tally_version(event_id):
+    return get_version('tally', event_id)
+
+
+def build_dashboard(event, base_url=None):
+    """Build the dashboard payload from the aggregate tables without writing anything"""
+    analytics = EventAnalytics.objects.filter(event=event).select_related('event').first()
+    if analytics is None:
+        analytics = EventAnalytics(event=event)
+    if counters.enabled():
+        counters.overlay_event(analytics)
+
+    # Photo URLs are made absolute against the URL of the request that triggered the build
+    context = {}
+    if base_url:
+        context['request'] = SimpleNamespace(build_absolute_uri=lambda path: urljoin(base_url, path))
+
+    return {
+        "event_overview": EventAnalyticsSerializer(analytics).data,
+        "contestants": _contestant_analytics(event, context),
+        "vote_timeline": _vote_timeline(event),
+        "device_breakdown": _device_breakdown(event),
+        "geographic_breakdown": _geographic_breakdown(event),
+        "fraud_summary": {
+            'flagged_votes': analytics.flagged_votes,
+            'quarantined_votes': analytics.quarantined_votes,
+            'fraud_detection_rate': round(analytics.fraud_detection_rate, 2),
+        },
+        "revenue_summary": _revenue_summary(event),
+    }
+
+
+def _contestant_analytics(event, context):
+    """Contestant analytics by category, ranked within it"""
+    contestant_stats = ranked_contestants(event.id)
+    return ContestantAnalyticsSerializer(contestant_stats, many=True, context=context).data
+
+
+def _vote_timeline(event):
+    """Vote time-series for the last 24 hours"""
+    last_24h = timezone.now() - timedelta(hours=24)
+    time_series = event.vote_time_series.filter(timestamp__gte=last_24h).order_by('timestamp')
+    return VoteTimeSeriesSerializer(time_series, many=True).data
+
+
+def _device_breakdown(event):
+    devices = DemographicData.objects.filter(
+        event=event
+    ).values('device_type').annotate(
+        count=Count('id')
+    ).order_by('-count')
+
+    total_records = sum(d['count'] for d in devices)
+
+    return [
+        {
+            'device_type': d['device_type'] or 'unknown',
+            'votes': d['count'],
+            'percentage': (d['count'] / total_records * 100) if total_records > 0 else 0,
+        }
+        for d in devices
+    ]
+
+
+def _geographic_breakdown(event):
+    """Top 10 countries"""
+    locations = DemographicData.objects.filter(
+        event=event,
+        country__isnull=False
+    ).exclude(
+        country=''
+    ).values('country').annotate(
+        votes=Count('id')
+    ).order_by('-votes')[:10]
+
+    return [{'country': d['country'], 'votes': d['votes']} for d in locations]
+
+
+def _revenue_summary(event):
+    """Revenue by payment status in a single aggregate"""
+    totals = Vote.objects.filter(event=event).aggregate(
+        completed=Sum('vote_amount', filter=Q(payment_status='completed')),
+        pending=Sum('vote_amount', filter=Q(payment_status='pending')),
+        failed=Sum('vote_amount', filter=Q(payment_status='failed')),
+    )
+    completed = totals['completed'] or 0
+    pending = totals['pending'] or 0
+    failed = totals['failed'] or 0
+
+    return {
+        'completed': float(completed),
+        'pending': float(pending),
+        'failed': float(failed),
+        'total': float(completed + pending + failed),
+    }
+
+
+def _key(event_id, base_url, event_version):
+    site = hashlib.sha1((base_url or '').encode()).hexdigest()[:12]
+    return f"{KEY_PREFIX}:{event_id}:{site}:{event_version}"
+
+
+def refresh_dashboard(event_id, base_url=None):
+    """Rebuild and store the payload for the current tally and event versions"""
+    # Read the versions first: a change during the build leaves the entry stale, never ahead
+    version = tally_version(event_id)
+    event_version = get_version('event', event_id)
+    event = Event.objects.filter(pk=event_id).first()
+    if event is None:
+        return None
+
+    entry = {
+        'version': version,
+        'event_version': event_version,
+        'built_at': timezone.now().isoformat(),
+        'payload': build_dashboard(event, base_url),
+    }
+    cache.set(_key(event_id, base_url, event_version), entry, timeout=settings.ANALYTICS_DASHBOARD_TTL)
+    return entry
+
+
+def get_dashboard(event_id, base_url=None):
+    """
+    Cached dashboard entry for an event: {'version', 'event_version', 'built_at', 'payload'}.
+    Built inline when nothing is cached for this base URL and event version
+    (renames are never served stale); a tally change returns the cached entry
+    as-is and schedules a background refresh.
+    """
+    key = _key(event_id, base_url, get_version('event', event_id))
+    entry = cache.get(key)
+    if entry is None:
+        return refresh_dashboard(event_id, base_url)
+
+    if entry['version'] != tally_version(event_id):
+        schedule_refresh(event_id, base_url, key)
+    return entry
+
+
+def schedule_refresh(event_id, base_url=None, key=None):
+    """Queue a background refresh unless one already ran within the refresh interval"""
+    key = key or _key(event_id, base_url, get_version('event', event_id))
+    if not cache.add(f"{key}:refresh", 1, timeout=settings.ANALYTICS_DASHBOARD_REFRESH_SECONDS):
+        return False
+    _get_executor().submit(_refresh_in_background, event_id, base_url)
+    return True
+
+
+def _refresh_in_background(event_id, base_url):
+    try:
+        refresh_dashboard(event_id, base_url)
+    except Exception as e:
+        logger.error(f"Dashboard refresh failed for event {event_id}: {e}", exc_info=True)
+    finally:
+        close_old_connections()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='dashboard-refresh')
+    return _executor
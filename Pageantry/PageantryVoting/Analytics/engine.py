@@ -0,0 +1,490 @@
+"""
+Incremental analytics engine
+- Applies only the delta of a changed vote to the aggregate tables
+- Full re-aggregation is available on demand through rebuild_event_analytics()
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, FloatField, Q, Sum, When
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+from datetime import timedelta
+
+from Event.models import Vote
+from Event.versions import bump_version
+from .models import (
+    AnalyticsSnapshot, ContestantAnalytics, CounterShard, EventAnalytics, VoteRollup, VoteTimeSeries
+)
+from .hll import HyperLogLog
+from .live import record_live_votes
+from . import counters, rollups, standings
+
+logger = logging.getLogger(__name__)
+
+# Vote fields whose values feed the aggregates
+TRACKED_FIELDS = Vote.TRACKED_FIELDS
+
+PAYMENT_COUNTERS = {
+    'completed': 'completed_payments',
+    'failed': 'failed_payments',
+    'pending': 'pending_payments',
+}
+
+
+def vote_state(vote):
+    """Snapshot the tracked fields of a vote"""
+    state = {field: getattr(vote, field) for field in TRACKED_FIELDS}
+    state['id'] = vote.pk
+    return state
+
+
+def hour_bucket(moment):
+    """Hourly bucket used by VoteTimeSeries"""
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment):
+    """Daily bucket used by AnalyticsSnapshot"""
+    return timezone.localdate(moment)
+
+
+class VoteDelta:
+    """Counter changes produced by one or more vote transitions"""
+
+    def __init__(self):
+        # target key -> field -> amount
+        self.counters = defaultdict(lambda: defaultdict(int))
+        # (sign, state) for votes entering (+1) or leaving (-1) the completed set
+        self.voters = []
+
+    def add(self, state, sign):
+        """Add (sign=1) or remove (sign=-1) the contribution of a vote state"""
+        if state is None:
+            return
+
+        event_id = state['event_id']
+        amount = Decimal(state['vote_amount'] or 0)
+        event = self.counters[('event', event_id)]
+
+        counter = PAYMENT_COUNTERS.get(state['payment_status'])
+        if counter:
+            event[counter] += sign
+
+        if state['payment_status'] == 'refunded':
+            event['refunded_amount'] += sign * amount
+
+        if state['payment_status'] != 'completed':
+            return
+
+        votes = state['number_of_votes']
+        event['total_votes'] += sign * votes
+        event['total_vote_amount'] += sign * amount
+
+        if state['contestant_id']:
+            contestant = self.counters[('contestant', event_id, state['contestant_id'])]
+            contestant['total_votes'] += sign * votes
+            contestant['total_revenue'] += sign * amount
+
+        created_at = state['created_at'] or timezone.now()
+        hour = self.counters[('hour', event_id, hour_bucket(created_at))]
+        hour['vote_count'] += sign * votes
+        hour['revenue_generated'] += sign * amount
+
+        day = self.counters[('day', event_id, day_bucket(created_at))]
+        day['total_votes'] += sign * votes
+        day['total_revenue'] += sign * amount
+
+        # Durable minute rollups; hours and days are rolled up from them (see rollups.py)
+        rollup = self.counters[('rollup', event_id, rollups.bucket_start(created_at, 'minute'))]
+        rollup['vote_count'] += sign * votes
+        rollup['revenue'] += sign * amount
+
+        # Live minute buckets live in the cache (see live.py), not in a table
+        self.counters[('minute', event_id, int(created_at.timestamp() // 60))]['votes'] += sign * votes
+
+        self.voters.append((sign, state))
+
+    def merge(self, other):
+        for key, fields in other.counters.items():
+            for field, amount in fields.items():
+                self.counters[key][field] += amount
+        self.voters.extend(other.voters)
+        return self
+
+    def is_empty(self):
+        return not self.voters and not any(
+            amount for fields in self.counters.values() for amount in fields.values()
+        )
+
+
+def diff(old_state, new_state):
+    """Build the delta for a vote moving from old_state to new_state (either may be None)"""
+    delta = VoteDelta()
+    delta.add(old_state, -1)
+    delta.add(new_state, 1)
+    if old_state and new_state and all(
+        old_state[field] == new_state[field] for field in ('event_id', 'voter_email', 'created_at', 'payment_status')
+    ):
+        # Same voter in the same buckets: the unique-voter sketches are unaffected
+        delta.voters = []
+    return delta
+
+
+def apply(delta, create=True):
+    """
+    Apply a delta with atomic F() updates.
+    create=False skips rows that do not exist yet (used while votes are being deleted).
+    With sharded counters enabled the hot rows are left to counters.compact().
+    """
+    if delta.is_empty():
+        return
+
+    sharded = create and counters.enabled()
+    shard = counters.pick_shard() if sharded else None
+
+    with transaction.atomic():
+        touched_events = set()
+        touched_hours = set()
+        live_minutes = defaultdict(lambda: defaultdict(int))
+        contestant_votes = defaultdict(set)
+
+        for key, fields in delta.counters.items():
+            changes = {field: amount for field, amount in fields.items() if amount}
+            if not changes:
+                continue
+
+            kind, event_id = key[0], key[1]
+            if kind == 'contestant' and changes.get('total_votes'):
+                contestant_votes[event_id].add(key[2])
+            if sharded and kind in counters.FIELDS:
+                target_key = counters.encode_key(kind, key[2] if len(key) > 2 else None)
+                counters.increment(event_id, kind, target_key, shard, changes)
+            elif kind == 'event':
+                _bump(EventAnalytics, {'event_id': event_id}, changes, create=create)
+                touched_events.add(event_id)
+            elif kind == 'contestant':
+                _bump(
+                    ContestantAnalytics, {'contestant_id': key[2]}, changes,
+                    defaults={'event_id': event_id}, create=create
+                )
+            elif kind == 'hour':
+                _bump(VoteTimeSeries, {'event_id': event_id, 'timestamp': key[2]}, changes, create=create)
+                touched_hours.add((event_id, key[2]))
+            elif kind == 'day':
+                _bump(AnalyticsSnapshot, {'event_id': event_id, 'date': key[2]}, changes, create=create)
+            elif kind == 'rollup':
+                rollups.add(event_id, 'minute', key[2], create=create, **changes)
+            elif kind == 'minute':
+                live_minutes[event_id][key[2]] += changes['votes']
+
+        if counters.enabled():
+            # Pending shard sketches may still hold a leaving voter and compaction would
+            # merge it back into the rebuilt sketch: fold them in before rebuilding
+            for event_id in {state['event_id'] for sign, state in delta.voters if sign < 0 and state['voter_email']}:
+                counters.compact(event_id)
+
+        for sign, state in delta.voters:
+            if sharded and sign > 0:
+                _shard_unique_voter(shard, state)
+                continue
+            _apply_unique_voter(sign, state)
+            touched_events.add(state['event_id'])
+            touched_hours.add((state['event_id'], hour_bucket(state['created_at'] or timezone.now())))
+
+        for event_id in touched_events:
+            _refresh_event_ratios(event_id)
+        _bump_tallies(key[1] for key in delta.counters)
+        for event_id, minutes in live_minutes.items():
+            transaction.on_commit(lambda event_id=event_id, minutes=dict(minutes): record_live_votes(event_id, minutes))
+        for event_id, contestant_ids in contestant_votes.items():
+            transaction.on_commit(
+                lambda event_id=event_id, ids=sorted(contestant_ids): standings.record_votes(event_id, ids)
+            )
+        for event_id, timestamp in touched_hours:
+            _refresh_hour_ratios(event_id, timestamp)
+
+
+def record_fraud_detections(fraud_detections):
+    """Count newly created fraud detection records against their events"""
+    suspicious = [fd for fd in fraud_detections if fd.is_suspicious]
+    if not suspicious:
+        return
+
+    event_ids = dict(
+        Vote.objects.filter(pk__in=[fd.vote_id for fd in suspicious]).values_list('id', 'event_id')
+    )
+    changes = defaultdict(lambda: defaultdict(int))
+    for fd in suspicious:
+        event_id = event_ids.get(fd.vote_id)
+        if event_id is None:
+            continue
+        changes[event_id]['flagged_votes'] += 1
+        if fd.is_quarantined:
+            changes[event_id]['quarantined_votes'] += 1
+
+    with transaction.atomic():
+        for event_id, fields in changes.items():
+            _bump(EventAnalytics, {'event_id': event_id}, fields)
+            _refresh_event_ratios(event_id)
+        _bump_tallies(changes)
+
+
+def _bump_tallies(event_ids):
+    """Move the events' tally versions once the aggregates are committed (read by the dashboard)"""
+    for event_id in set(event_ids):
+        transaction.on_commit(lambda event_id=event_id: bump_version('tally', event_id))
+
+
+def _bump(model, lookup, changes, defaults=None, create=True):
+    """Atomically add `changes` to the row matching `lookup`, creating it if needed"""
+    updates = {field: F(field) + amount for field, amount in changes.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    if not create:
+        return
+    model.objects.get_or_create(**lookup, defaults=defaults or {})
+    model.objects.filter(**lookup).update(**updates)
+
+
+def _apply_unique_voter(sign, state):
+    """
+    Fold a vote's voter into the HyperLogLog sketches of its event, hour, day and
+    minute rollup. Adding a voter touches only those sketch rows. A sketch cannot forget a
+    value, so a vote leaving the completed set rebuilds the affected sketches
+    from the remaining completed votes (refunds and deletions are rare).
+    """
+    email = state['voter_email']
+    if not email:
+        return
+
+    for model, lookup, completed in _sketch_scopes(state):
+        row = model.objects.select_for_update().filter(**lookup).values('id', 'voter_sketch').first()
+        if row is None:
+            continue
+
+        if sign > 0 and row['voter_sketch'] is not None:
+            sketch = HyperLogLog.from_bytes(row['voter_sketch'])
+            if not sketch.add(email):
+                continue
+        else:
+            # Removal, or a row written before sketches existed
+            sketch = _sketch_of(completed.values_list('voter_email', flat=True).distinct())
+
+        model.objects.filter(pk=row['id']).update(voter_sketch=sketch.to_bytes(), unique_voters=sketch.count())
+
+
+def _shard_unique_voter(shard, state):
+    """Add a voter entering the completed set to the sketches of one counter shard per scope"""
+    if not state['voter_email']:
+        return
+
+    created_at = state['created_at'] or timezone.now()
+    counters.add_voter(state['event_id'], [
+        ('event', counters.encode_key('event', None)),
+        ('hour', counters.encode_key('hour', hour_bucket(created_at))),
+        ('day', counters.encode_key('day', day_bucket(created_at))),
+        ('rollup', counters.encode_key('rollup', rollups.bucket_start(created_at, 'minute'))),
+    ], shard, state['voter_email'])
+
+
+def _sketch_scopes(state):
+    """(model, row lookup, completed votes in scope) for each unique-voter sketch of a vote"""
+    created_at = state['created_at'] or timezone.now()
+    hour = hour_bucket(created_at)
+    day = day_bucket(created_at)
+    minute = rollups.bucket_start(created_at, 'minute')
+    completed = Vote.objects.filter(
+        event_id=state['event_id'], payment_status='completed', voter_email__isnull=False
+    )
+    return [
+        (EventAnalytics, {'event_id': state['event_id']}, completed),
+        (VoteTimeSeries, {'event_id': state['event_id'], 'timestamp': hour},
+            completed.filter(created_at__gte=hour, created_at__lt=hour + timedelta(hours=1))),
+        (AnalyticsSnapshot, {'event_id': state['event_id'], 'date': day},
+            completed.filter(created_at__date=day)),
+        (VoteRollup, {'event_id': state['event_id'], 'resolution': 'minute', 'bucket': minute},
+            completed.filter(created_at__gte=minute, created_at__lt=minute + timedelta(minutes=1))),
+    ]
+
+
+def _sketch_of(emails):
+    sketch = HyperLogLog()
+    for email in emails:
+        sketch.add(email)
+    return sketch
+
+
+def unique_voters_between(event_id, start, end):
+    """
+    Estimated distinct voters for votes created in [start, end), answered by
+    merging the hourly sketches (hours are included if they start in the range)
+    """
+    sketch = HyperLogLog()
+    sketches = VoteTimeSeries.objects.filter(
+        event_id=event_id, timestamp__gte=start, timestamp__lt=end, voter_sketch__isnull=False
+    ).values_list('voter_sketch', flat=True)
+    for registers in sketches:
+        sketch.merge(HyperLogLog.from_bytes(registers))
+    return sketch.count()
+
+
+def _refresh_event_ratios(event_id):
+    """Recompute derived event ratios from the stored counters in SQL"""
+    EventAnalytics.objects.filter(event_id=event_id, total_votes__gt=0).update(
+        average_vote_price=ExpressionWrapper(
+            F('total_vote_amount') * 1.0 / F('total_votes'),
+            output_field=DecimalField(max_digits=10, decimal_places=2)
+        ),
+        fraud_detection_rate=ExpressionWrapper(
+            F('flagged_votes') * 100.0 / (F('total_votes') + F('flagged_votes')),
+            output_field=FloatField()
+        ),
+    )
+
+
+def _refresh_hour_ratios(event_id, timestamp):
+    VoteTimeSeries.objects.filter(event_id=event_id, timestamp=timestamp).update(
+        avg_votes_per_voter=Case(
+            When(unique_voters__gt=0, then=F('vote_count') * 1.0 / F('unique_voters')),
+            default=0.0,
+            output_field=FloatField()
+        )
+    )
+
+
+def refresh_contestant_windows(event_id=None, now=None):
+    """
+    Recompute contestant trend windows (of one event, or all) with one grouped
+    query over the last 24 hours of votes. Votes do not refresh them: the
+    rollup_votes command runs this every minute. Returns the rows updated.
+    """
+    now = now or timezone.now()
+    last_hour = now - timedelta(hours=1)
+    recent = Vote.objects.filter(payment_status='completed', created_at__gte=now - timedelta(hours=24))
+    stats = ContestantAnalytics.objects.all()
+    if event_id is not None:
+        recent = recent.filter(event_id=event_id)
+        stats = stats.filter(event_id=event_id)
+
+    windows = {
+        row['contestant_id']: row
+        for row in recent.values('contestant_id').annotate(
+            last_24h=Sum('number_of_votes'),
+            last_hour=Sum('number_of_votes', filter=Q(created_at__gte=last_hour)),
+        )
+    }
+    # Contestants whose windows emptied, plus those with recent votes
+    stats = stats.filter(
+        Q(contestant_id__in=list(windows)) | Q(votes_in_last_24_hours__gt=0) | Q(votes_in_last_hour__gt=0)
+    ).only('id', 'contestant_id')
+
+    changed = []
+    for stat in stats:
+        row = windows.get(stat.contestant_id, {})
+        stat.votes_in_last_hour = row.get('last_hour') or 0
+        stat.votes_in_last_24_hours = row.get('last_24h') or 0
+        stat.momentum = float(stat.votes_in_last_hour)
+        changed.append(stat)
+
+    ContestantAnalytics.objects.bulk_update(
+        changed, ['votes_in_last_hour', 'votes_in_last_24_hours', 'momentum'], batch_size=500
+    )
+    return len(changed)
+
+
+def rebuild_event_analytics(event):
+    """Recompute every aggregate for an event from raw votes (on demand only)"""
+    with transaction.atomic():
+        # Pending counter shards hold votes the rebuild counts from Vote: compacting
+        # them later would count those votes twice
+        shards = CounterShard.objects.select_for_update().filter(event=event)
+        CounterShard.objects.filter(pk__in=list(shards.values_list('pk', flat=True))).delete()
+
+        analytics, _ = EventAnalytics.objects.get_or_create(event=event)
+        analytics.update_from_votes()
+
+        completed = Vote.objects.filter(event=event, payment_status='completed')
+
+        # Unique-voter sketches: hourly from raw votes, days and the event merged from hours
+        hour_sketches = defaultdict(HyperLogLog)
+        voters = completed.exclude(voter_email__isnull=True).annotate(
+            bucket=TruncHour('created_at')
+        ).values_list('bucket', 'voter_email').distinct()
+        for bucket, email in voters:
+            hour_sketches[bucket].add(email)
+
+        day_sketches = defaultdict(HyperLogLog)
+        event_sketch = HyperLogLog()
+        for bucket, sketch in hour_sketches.items():
+            day_sketches[day_bucket(bucket)].merge(sketch)
+            event_sketch.merge(sketch)
+        EventAnalytics.objects.filter(pk=analytics.pk).update(voter_sketch=event_sketch.to_bytes())
+
+        VoteTimeSeries.objects.filter(event=event).delete()
+        hourly = completed.annotate(bucket=TruncHour('created_at')).values('bucket').annotate(
+            vote_count=Sum('number_of_votes'),
+            revenue=Sum('vote_amount'),
+            voters=Count('voter_email', distinct=True),
+        )
+        VoteTimeSeries.objects.bulk_create([
+            VoteTimeSeries(
+                event=event,
+                timestamp=row['bucket'],
+                vote_count=row['vote_count'] or 0,
+                unique_voters=row['voters'],
+                revenue_generated=row['revenue'] or 0,
+                avg_votes_per_voter=(row['vote_count'] / row['voters']) if row['voters'] else 0.0,
+                voter_sketch=hour_sketches[row['bucket']].to_bytes(),
+            )
+            for row in hourly
+        ])
+
+        AnalyticsSnapshot.objects.filter(event=event).delete()
+        daily = completed.annotate(bucket=TruncDate('created_at')).values('bucket').annotate(
+            vote_count=Sum('number_of_votes'),
+            revenue=Sum('vote_amount'),
+            voters=Count('voter_email', distinct=True),
+        )
+        AnalyticsSnapshot.objects.bulk_create([
+            AnalyticsSnapshot(
+                event=event,
+                date=row['bucket'],
+                total_votes=row['vote_count'] or 0,
+                unique_voters=row['voters'],
+                total_revenue=row['revenue'] or 0,
+                voter_sketch=day_sketches[row['bucket']].to_bytes(),
+            )
+            for row in daily
+        ])
+
+        rollups.rebuild_minutes(event, completed)
+
+        totals = {
+            row['contestant_id']: row
+            for row in completed.values('contestant_id').annotate(
+                votes=Sum('number_of_votes'), revenue=Sum('vote_amount')
+            )
+        }
+        contestant_ids = Vote.objects.filter(event=event).values_list('contestant_id', flat=True).distinct()
+        for contestant_id in set(contestant_ids) | set(
+            ContestantAnalytics.objects.filter(event=event).values_list('contestant_id', flat=True)
+        ):
+            row = totals.get(contestant_id, {})
+            ContestantAnalytics.objects.update_or_create(
+                contestant_id=contestant_id,
+                defaults={
+                    'event': event,
+                    'total_votes': row.get('votes') or 0,
+                    'total_revenue': row.get('revenue') or 0,
+                }
+            )
+
+        refresh_contestant_windows(event.id)
+        _bump_tallies([event.id])
+        transaction.on_commit(lambda: standings.invalidate(event.id))
+
+    logger.info(f"Rebuilt analytics for event {event.id}")
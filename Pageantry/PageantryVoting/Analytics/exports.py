@@ -0,0 +1,92 @@
+"""
+Streaming Analytics Exports
+- Row exports of an event (votes, contestants, timeline, audit) as CSV or NDJSON
+- Rows come from .values().iterator(chunk_size=...), so memory stays constant
+  however many rows are exported; each line is yielded as soon as it is built
+"""
+
+import csv
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from Event.models import Vote, VoteAuditLog
+from .leaderboards import category_rank
+from .models import ContestantAnalytics, VoteTimeSeries
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# data_type -> (queryset for an event, exported columns); ordered by a unique key
+EXPORTS = {
+    'votes': (
+        lambda event: Vote.objects.filter(event=event).order_by('id'),
+        ('id', 'created_at', 'contestant_id', 'contestant__name', 'contestant__category__name',
+         'number_of_votes', 'vote_amount', 'payment_status', 'payment_reference',
+         'voter_email', 'voter_ip'),
+    ),
+    'contestants': (
+        lambda event: ContestantAnalytics.objects.filter(event=event).annotate(
+            category_rank=category_rank()
+        ).order_by('-total_votes', 'contestant_id'),
+        ('contestant_id', 'contestant__name', 'contestant__category__name', 'total_votes',
+         'total_revenue', 'category_rank', 'percentage_of_total', 'votes_in_last_hour',
+         'votes_in_last_24_hours', 'momentum'),
+    ),
+    'timeline': (
+        lambda event: VoteTimeSeries.objects.filter(event=event).order_by('timestamp', 'id'),
+        ('timestamp', 'vote_count', 'unique_voters', 'revenue_generated', 'avg_votes_per_voter'),
+    ),
+    'audit': (
+        lambda event: VoteAuditLog.objects.filter(vote__event=event).order_by('id'),
+        ('id', 'created_at', 'vote_id', 'action', 'description', 'actor', 'ip_address', 'metadata'),
+    ),
+}
+
+
+class _Echo:
+    """File-like object whose write returns the line instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(event, data_type):
+    """(columns, row iterator) for a data type, reading in chunks"""
+    queryset, columns = EXPORTS[data_type]
+    rows = queryset(event).values_list(*columns).iterator(chunk_size=settings.ANALYTICS_EXPORT_CHUNK_SIZE)
+    return columns, rows
+
+
+def _csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def stream_ndjson(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_export(event, data_type, format_type):
+    """Generator of the encoded export lines"""
+    columns, rows = export_rows(event, data_type)
+    if format_type == 'csv':
+        return stream_csv(columns, rows)
+    return stream_ndjson(columns, rows)
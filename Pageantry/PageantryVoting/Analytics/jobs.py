@@ -0,0 +1,200 @@
+"""
+Analytics Job Queue
+- With ANALYTICS_PIPELINE = 'queue' the vote signals do not touch the aggregate
+  tables; they queue the vote's (prior, new) states as an AnalyticsJob once the
+  request's transaction commits
+- The analytics_worker command drains the queue: it claims every pending job of
+  one event at a time, merges them into a single delta and applies it, deleting
+  the jobs in the same transaction (a crash re-runs the whole batch, never half)
+- Claims are a conditional UPDATE with a lease token, so several worker threads
+  or processes can share the queue on any database; expired leases are reclaimed
+"""
+
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AnalyticsJob
+from . import engine
+
+logger = logging.getLogger(__name__)
+
+RETRY_SECONDS = 30
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def pipeline_mode():
+    return getattr(settings, 'ANALYTICS_PIPELINE', 'inline')
+
+
+# Producing
+
+def _encode(state):
+    return dict(state) if state is not None else None
+
+
+def _decode(state):
+    if state is None:
+        return None
+    state = dict(state)
+    if isinstance(state.get('created_at'), str):
+        state['created_at'] = parse_datetime(state['created_at'])
+    return state
+
+
+def enqueue(changes, deleted=False):
+    """Queue (prior state, new state) pairs after commit, one job per event"""
+    by_event = {}
+    for prior, new in changes:
+        event_id = (new or prior)['event_id']
+        by_event.setdefault(event_id, []).append([_encode(prior), _encode(new)])
+
+    kind = 'votes_deleted' if deleted else 'votes'
+    jobs = [AnalyticsJob(event_id=event_id, kind=kind, changes=pairs) for event_id, pairs in by_event.items()]
+    if jobs:
+        transaction.on_commit(lambda: AnalyticsJob.objects.bulk_create(jobs))
+
+
+# Consuming
+
+def _release_expired(now):
+    """Put jobs of workers that died mid-batch back in the queue"""
+    expired = now - timedelta(seconds=settings.ANALYTICS_JOB_LEASE_SECONDS)
+    AnalyticsJob.objects.filter(status='running', claimed_at__lt=expired).update(status='pending', lease='')
+
+
+def claim(batch):
+    """
+    Claim up to `batch` pending jobs of the event with the oldest pending job
+    that no other worker is processing. Returns (lease, jobs); jobs may be empty.
+    """
+    now = timezone.now()
+    _release_expired(now)
+
+    # Failed batches wait RETRY_SECONDS before they are claimed again
+    claimable = AnalyticsJob.objects.filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - timedelta(seconds=RETRY_SECONDS)),
+        status='pending',
+    )
+    busy = AnalyticsJob.objects.filter(status='running').values('event_id')
+    event_id = claimable.exclude(event_id__in=busy).values_list(
+        'event_id', flat=True
+    ).first()
+    if event_id is None:
+        return None, []
+
+    lease = uuid.uuid4().hex
+    ids = list(
+        claimable.filter(event_id=event_id).values_list('id', flat=True)[:batch]
+    )
+    # Only the worker whose UPDATE flips the rows from pending owns them
+    AnalyticsJob.objects.filter(id__in=ids, status='pending').update(status='running', lease=lease, claimed_at=now)
+    return lease, list(AnalyticsJob.objects.filter(lease=lease, status='running'))
+
+
+def process(lease, jobs):
+    """Apply claimed jobs as one merged delta per kind; returns the number applied"""
+    if not jobs:
+        return 0
+
+    try:
+        changed, deleted = engine.VoteDelta(), engine.VoteDelta()
+        for job in jobs:
+            delta = deleted if job.kind == 'votes_deleted' else changed
+            for prior, new in job.changes:
+                delta.merge(engine.diff(_decode(prior), _decode(new)))
+
+        with transaction.atomic():
+            engine.apply(changed)
+            engine.apply(deleted, create=False)
+            # The lease may have expired mid-batch and the jobs been handed to another
+            # worker: roll back rather than apply them twice
+            removed = AnalyticsJob.objects.filter(lease=lease, status='running').delete()[0]
+            if removed != len(jobs):
+                raise LeaseLost(f"Lease {lease} lost: {removed} of {len(jobs)} jobs still held")
+        return len(jobs)
+    except LeaseLost as e:
+        logger.warning(f"Analytics job batch for event {jobs[0].event_id} abandoned: {e}")
+        AnalyticsJob.objects.filter(lease=lease, status='running').update(status='pending', lease='')
+        return 0
+    except Exception as e:
+        logger.error(f"Analytics job batch for event {jobs[0].event_id} failed: {e}", exc_info=True)
+        _fail(lease, e)
+        return 0
+
+
+def _fail(lease, error):
+    """Return the batch to the queue for a later retry, or park it after too many attempts"""
+    claimed = AnalyticsJob.objects.filter(lease=lease)
+    claimed.filter(attempts__gte=settings.ANALYTICS_JOB_MAX_ATTEMPTS - 1).update(
+        status='failed', attempts=F('attempts') + 1, last_error=str(error)
+    )
+    claimed.filter(status='running').update(
+        status='pending', lease='', claimed_at=timezone.now(), attempts=F('attempts') + 1, last_error=str(error)
+    )
+
+
+def run_once(batch=None):
+    """Claim and process one event's jobs; returns the number applied (0 when idle)"""
+    lease, jobs = claim(batch or settings.ANALYTICS_WORKER_BATCH)
+    return process(lease, jobs)
+
+
+def drain(batch=None):
+    """Process until no claimable job is left; returns the number applied"""
+    total = 0
+    while True:
+        lease, jobs = claim(batch or settings.ANALYTICS_WORKER_BATCH)
+        if not jobs:
+            return total
+        total += process(lease, jobs)
+
+
+class AnalyticsWorker:
+    """Threads that drain the queue and poll it when idle"""
+
+    def __init__(self, concurrency=1, batch=None, poll_seconds=1.0):
+        self.concurrency = concurrency
+        self.batch = batch or settings.ANALYTICS_WORKER_BATCH
+        self.poll_seconds = poll_seconds
+        self.stopping = threading.Event()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._loop, name=f'analytics-worker-{i}', daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+
+    def stop(self):
+        self.stopping.set()
+
+    def _loop(self):
+        while not self.stopping.is_set():
+            try:
+                close_old_connections()
+                if not run_once(self.batch):
+                    self.stopping.wait(self.poll_seconds)
+            except Exception as e:
+                logger.error(f"Analytics worker error: {e}", exc_info=True)
+                self.stopping.wait(self.poll_seconds)
+        close_old_connections()
@@ -0,0 +1,109 @@
+"""
+Category Leaderboards
+- Contestants are ranked within their EventCategory by one query using
+  RANK() OVER (PARTITION BY category ORDER BY <sort field> DESC); ties share a
+  rank and the next rank is skipped (1, 1, 3)
+- Payloads are cached per event, keyed by the tally version (votes) and the
+  event version (categories, names, photos)
+- Totals still held in counter shards are added and ranked in memory with the
+  same tie rules (see counters.py)
+"""
+
+import logging
+from itertools import groupby
+
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import Rank
+
+from Event.fast_serializers import photo_storage
+from Event.versions import get_version
+from . import counters
+from .models import ContestantAnalytics
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'leaderboard'
+CACHE_TIMEOUT = 86400
+
+# sort_by query value -> ContestantAnalytics field
+SORT_FIELDS = {
+    'votes': 'total_votes',
+    'revenue': 'total_revenue',
+    'momentum': 'momentum',
+}
+
+
+def category_rank(sort_field='total_votes'):
+    """RANK() of a ContestantAnalytics row within its category, for annotate()"""
+    return Window(Rank(), partition_by=F('contestant__category_id'), order_by=F(sort_field).desc())
+
+
+def ranked_contestants(event_id, sort_field='total_votes'):
+    """
+    ContestantAnalytics of an event with `category_rank`, ordered by category and
+    rank (contestants without a category form their own group, last)
+    """
+    stats = list(
+        ContestantAnalytics.objects.filter(event_id=event_id).select_related(
+            'contestant', 'contestant__category'
+        ).annotate(
+            category_rank=category_rank(sort_field),
+        ).order_by(F('contestant__category_id').asc(nulls_last=True), 'category_rank', 'contestant_id')
+    )
+
+    if counters.enabled() and counters.pending_contestants(event_id):
+        stats = _rank_in_memory(counters.overlay_contestants(event_id, stats), sort_field)
+    return stats
+
+
+def _rank_in_memory(stats, sort_field):
+    def category(stat):
+        category_id = stat.contestant.category_id
+        return (category_id is None, category_id or 0)
+
+    ranked = []
+    for _, group in groupby(sorted(stats, key=category), key=category):
+        group = sorted(group, key=lambda stat: (-getattr(stat, sort_field), stat.contestant_id))
+        for position, stat in enumerate(group, 1):
+            previous = ranked[-1] if position > 1 else None
+            if previous is not None and getattr(previous, sort_field) == getattr(stat, sort_field):
+                stat.category_rank = previous.category_rank
+            else:
+                stat.category_rank = position
+            ranked.append(stat)
+    return ranked
+
+
+def build_leaderboard(event_id, sort_field='total_votes'):
+    """Leaderboard payload: one entry per category with its ranked contestants"""
+    categories = []
+    for stat in ranked_contestants(event_id, sort_field):
+        contestant = stat.contestant
+        if not categories or categories[-1]['category_id'] != contestant.category_id:
+            categories.append({
+                'category_id': contestant.category_id,
+                'category': contestant.category.name if contestant.category else None,
+                'contestants': [],
+            })
+        categories[-1]['contestants'].append({
+            'rank': stat.category_rank,
+            'contestant_id': contestant.id,
+            'name': contestant.name,
+            'photo': photo_storage.url(contestant.photo.name) if contestant.photo else None,
+            'total_votes': stat.total_votes,
+            'total_revenue': float(stat.total_revenue),
+            'percentage_of_total': round(stat.percentage_of_total, 2),
+            'momentum': round(stat.momentum, 2),
+        })
+    return categories
+
+
+def get_leaderboard(event_id, sort_field='total_votes'):
+    """Cached leaderboard for the current tally and event versions"""
+    key = f"{KEY_PREFIX}:{event_id}:{sort_field}:{get_version('tally', event_id)}:{get_version('event', event_id)}"
+    leaderboard = cache.get(key)
+    if leaderboard is None:
+        leaderboard = build_leaderboard(event_id, sort_field)
+        cache.set(key, leaderboard, timeout=CACHE_TIMEOUT)
+    return leaderboard
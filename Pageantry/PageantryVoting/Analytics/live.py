@@ -0,0 +1,135 @@
+"""
+Live Vote Windows
+- Completed votes are counted into per-minute buckets in the shared cache
+  (1,440 minutes per event, each bucket expiring once it leaves the 24 hour ring)
+- Every minute bucket is mirrored into an hourly bucket, so the 24 hour window
+  reads at most ~150 buckets with one get_many instead of scanning Vote
+- The ring is seeded from the database once a day (or after a cache flush)
+"""
+
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncMinute
+
+from Event.models import Vote
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'livevotes'
+RING_MINUTES = 1440
+MINUTE_TIMEOUT = (RING_MINUTES + 2) * 60
+HOUR_TIMEOUT = (RING_MINUTES + 120) * 60
+SEED_TIMEOUT = 86400
+
+# Window name -> length in minutes
+WINDOWS = {
+    'last_minute': 1,
+    'last_hour': 60,
+    'last_24h': RING_MINUTES,
+}
+
+
+def _minute_key(event_id, minute):
+    return f"{KEY_PREFIX}:{event_id}:m:{minute}"
+
+
+def _hour_key(event_id, hour):
+    return f"{KEY_PREFIX}:{event_id}:h:{hour}"
+
+
+def _incr(key, amount, timeout):
+    cache.add(key, 0, timeout=timeout)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.add(key, amount, timeout=timeout)
+
+
+def record_live_votes(event_id, minute_counts, clock=time.time):
+    """Add {absolute minute: votes} to the ring; negative counts remove refunded votes"""
+    oldest = int(clock() // 60) - RING_MINUTES
+    for minute, votes in minute_counts.items():
+        if not votes or minute < oldest:
+            continue
+        _incr(_minute_key(event_id, minute), votes, MINUTE_TIMEOUT)
+        _incr(_hour_key(event_id, minute // 60), votes, HOUR_TIMEOUT)
+
+
+def _plan(event_id, start, end):
+    """
+    Keys covering minutes [start, end]: minute keys for the partial hours at
+    either end and hour keys for the full hours in between
+    """
+    first_full_hour = -(-start // 60)
+    last_full_hour = (end + 1) // 60 - 1
+    if first_full_hour > last_full_hour:
+        return [_minute_key(event_id, minute) for minute in range(start, end + 1)]
+
+    keys = [_minute_key(event_id, minute) for minute in range(start, first_full_hour * 60)]
+    keys += [_hour_key(event_id, hour) for hour in range(first_full_hour, last_full_hour + 1)]
+    keys += [_minute_key(event_id, minute) for minute in range((last_full_hour + 1) * 60, end + 1)]
+    return keys
+
+
+def live_window_totals(event_id, clock=time.time):
+    """
+    Votes in the last minute, hour and 24 hours. Each window spans the current
+    partial minute plus the previous N minutes, the oldest weighted by how much
+    of it still overlaps the window (as in the vote rate limiter).
+    """
+    _ensure_seeded(event_id, clock)
+
+    now = clock()
+    current = int(now // 60)
+    overlap = 1 - (now % 60) / 60
+
+    plans = {}
+    for name, length in WINDOWS.items():
+        oldest = current - length
+        plans[name] = (_minute_key(event_id, oldest), _plan(event_id, oldest + 1, current))
+
+    keys = {key for oldest, keys in plans.values() for key in (oldest, *keys)}
+    counts = cache.get_many(list(keys))
+
+    return {
+        name: sum(counts.get(key, 0) for key in keys) + int(counts.get(oldest, 0) * overlap)
+        for name, (oldest, keys) in plans.items()
+    }
+
+
+def _ensure_seeded(event_id, clock):
+    """Load the last 24 hours from the database when the ring has not been seeded recently"""
+    if not cache.add(f"{KEY_PREFIX}:{event_id}:seeded", 1, timeout=SEED_TIMEOUT):
+        return
+
+    now = clock()
+    since = datetime.fromtimestamp((int(now // 60) - RING_MINUTES) * 60, tz=dt_timezone.utc)
+    rows = Vote.objects.filter(
+        event_id=event_id, payment_status='completed', created_at__gte=since
+    ).annotate(minute=TruncMinute('created_at')).values('minute').annotate(votes=Sum('number_of_votes'))
+
+    minutes = {}
+    hours = {}
+    for row in rows:
+        minute = int(row['minute'].timestamp() // 60)
+        minutes[_minute_key(event_id, minute)] = row['votes'] or 0
+        hours[minute // 60] = hours.get(minute // 60, 0) + (row['votes'] or 0)
+
+    cache.set_many(minutes, timeout=MINUTE_TIMEOUT)
+    cache.set_many({_hour_key(event_id, hour): votes for hour, votes in hours.items()}, timeout=HOUR_TIMEOUT)
+    # Buckets left over from before the seed would otherwise double count
+    stale = [
+        _minute_key(event_id, minute)
+        for minute in range(int(now // 60) - RING_MINUTES, int(now // 60) + 1)
+        if _minute_key(event_id, minute) not in minutes
+    ]
+    cache.delete_many(stale)
+    cache.delete_many([
+        _hour_key(event_id, hour)
+        for hour in range((int(now // 60) - RING_MINUTES) // 60, int(now // 60) // 60 + 1)
+        if hour not in hours
+    ])
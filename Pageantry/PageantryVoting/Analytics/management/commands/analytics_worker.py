@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from Analytics.jobs import AnalyticsWorker, drain, pipeline_mode
+
+
+class Command(BaseCommand):
+    help = "Apply queued vote changes to the analytics tables (ANALYTICS_PIPELINE = 'queue')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help="Worker threads")
+        parser.add_argument('--batch', type=int, default=None, help="Most jobs of one event applied together")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit")
+
+    def handle(self, *args, **options):
+        if pipeline_mode() != 'queue':
+            self.stderr.write("ANALYTICS_PIPELINE is not 'queue'; only previously queued jobs will be found")
+
+        if options['once']:
+            self.stdout.write(f"Applied {drain(options['batch'])} jobs")
+            return
+
+        self.stdout.write(f"Analytics worker running with {options['concurrency']} threads")
+        AnalyticsWorker(options['concurrency'], options['batch'], options['poll']).run()
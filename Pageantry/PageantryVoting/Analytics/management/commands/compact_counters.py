@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Analytics.counters import compact, enabled
+
+
+class Command(BaseCommand):
+    help = "Fold sharded vote counters into the analytics tables (ANALYTICS_COUNTER_SHARDS > 1)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, default=None, help="Only compact this event's shards")
+        parser.add_argument('--interval', type=float, default=None, help="Keep compacting every N seconds")
+
+    def handle(self, *args, **options):
+        if not enabled():
+            self.stderr.write("ANALYTICS_COUNTER_SHARDS is not above 1; only existing shards will be found")
+
+        if options['interval'] is None:
+            self.stdout.write(f"Compacted {compact(options['event'])} counter shards")
+            return
+
+        try:
+            while True:
+                compact(options['event'])
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Event.models import Event
+from Analytics.columnar import TABLES, ColumnarExportUnavailable, write_parquet
+
+
+class Command(BaseCommand):
+    help = "Write an event's votes (with fraud detection) or vote audit log to a Parquet file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('output', help="Path of the .parquet file to write")
+        parser.add_argument('--table', choices=TABLES, default='votes')
+
+    def handle(self, *args, **options):
+        event = Event.objects.filter(id=options['event_id']).first()
+        if event is None:
+            raise CommandError("No matching event found")
+
+        try:
+            count = write_parquet(event, options['output'], table=options['table'])
+        except ColumnarExportUnavailable as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Wrote {count} {options['table']} rows of event {event.id} to {options['output']}")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Event.models import Event
+from Analytics.engine import rebuild_event_analytics
+
+
+class Command(BaseCommand):
+    help = "Recompute event analytics from raw votes (full rebuild, run on demand)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', type=int, help="Events to rebuild (default: all)")
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options['event_ids']:
+            events = events.filter(id__in=options['event_ids'])
+            if not events.exists():
+                raise CommandError("No matching events found")
+
+        for event in events:
+            rebuild_event_analytics(event)
+            self.stdout.write(f"Rebuilt analytics for event {event.id} ({event.name})")
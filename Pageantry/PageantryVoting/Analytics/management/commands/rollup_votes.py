@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from Analytics.counters import compact
+from Analytics.engine import refresh_contestant_windows
+from Analytics.rollups import ROLLUP_BATCH, prune, roll_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll changed minute rollups into hours and days, prune rows past retention and refresh "
+        "contestant trend windows (run every minute)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=ROLLUP_BATCH, help="Rows rolled up per transaction")
+
+    def handle(self, *args, **options):
+        # Minutes still held in counter shards would otherwise wait for the next run
+        compact()
+        total = 0
+        while True:
+            rolled = roll_up(batch=options['batch'])
+            total += rolled
+            if rolled < options['batch']:
+                break
+
+        deleted = prune()
+        refreshed = refresh_contestant_windows()
+        self.stdout.write(f"Rolled up {total} rows, pruned {deleted}, refreshed {refreshed} contestant windows")
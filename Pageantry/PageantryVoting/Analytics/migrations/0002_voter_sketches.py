@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyticssnapshot',
+            name='voter_sketch',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='eventanalytics',
+            name='voter_sketch',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='votetimeseries',
+            name='voter_sketch',
+            field=models.BinaryField(null=True),
+        ),
+    ]
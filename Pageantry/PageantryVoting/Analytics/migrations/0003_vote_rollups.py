@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Analytics', '0002_voter_sketches'),
+        ('Event', '0018_event_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket', models.DateTimeField()),
+                ('vote_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('unique_voters', models.IntegerField(default=0)),
+                ('voter_sketch', models.BinaryField(null=True)),
+                ('rolled_vote_count', models.IntegerField(default=0)),
+                ('rolled_revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('dirty', models.BooleanField(default=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vote_rollups', to='Event.event')),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'indexes': [models.Index(fields=['resolution', 'dirty'], name='Analytics_v_resolut_2dc4e1_idx'), models.Index(fields=['resolution', 'bucket'], name='Analytics_v_resolut_80ecf3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'resolution', 'bucket'), name='unique_vote_rollup_bucket')],
+            },
+        ),
+    ]
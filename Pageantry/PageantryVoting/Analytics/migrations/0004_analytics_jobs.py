@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:31
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Analytics', '0003_vote_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('votes', 'Votes changed'), ('votes_deleted', 'Votes deleted')], default='votes', max_length=20)),
+                ('changes', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('lease', models.CharField(blank=True, max_length=32)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='Analytics_a_status_dfe855_idx'), models.Index(fields=['event_id', 'status'], name='Analytics_a_event_i_f7be75_idx'), models.Index(fields=['lease'], name='Analytics_a_lease_0f1a46_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Analytics', '0004_analytics_jobs'),
+        ('Event', '0018_event_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(choices=[('event', 'EventAnalytics'), ('contestant', 'ContestantAnalytics'), ('hour', 'VoteTimeSeries'), ('day', 'AnalyticsSnapshot'), ('rollup', 'VoteRollup (minute)')], max_length=10)),
+                ('target_key', models.CharField(blank=True, max_length=40)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('votes', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('completed_payments', models.IntegerField(default=0)),
+                ('failed_payments', models.IntegerField(default=0)),
+                ('pending_payments', models.IntegerField(default=0)),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('voter_sketch', models.BinaryField(null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='Event.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'target', 'target_key', 'shard'), name='unique_counter_shard')],
+            },
+        ),
+    ]
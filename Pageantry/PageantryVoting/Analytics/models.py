@@ -2,6 +2,7 @@ from django.db import models
 from django.db.models import Sum, Count
 from Event.models import Event, Vote
 from Auth.models import ExtendedUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
 
@@ -12,6 +13,7 @@ class EventAnalytics(models.Model):
     # Vote metrics
     total_votes = models.IntegerField(default=0)
     unique_voters = models.IntegerField(default=0)
+    voter_sketch = models.BinaryField(null=True, editable=False)  # HyperLogLog registers
     total_vote_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     average_vote_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     
@@ -48,7 +50,7 @@ class EventAnalytics(models.Model):
         votes = Vote.objects.filter(event=self.event, payment_status='completed')
         
         self.total_votes = votes.aggregate(total=Sum('number_of_votes'))['total'] or 0
-        self.unique_voters = votes.values('voter_email').distinct().count()
+        self.unique_voters = votes.exclude(voter_email__isnull=True).values('voter_email').distinct().count()
         vote_amounts = votes.aggregate(total=Sum('vote_amount'))['total']
         self.total_vote_amount = vote_amounts or 0.00
         
@@ -68,6 +70,10 @@ class EventAnalytics(models.Model):
             event=self.event,
             payment_status='pending'
         ).count()
+        self.refunded_amount = Vote.objects.filter(
+            event=self.event,
+            payment_status='refunded'
+        ).aggregate(total=Sum('vote_amount'))['total'] or 0.00
         
         # Fraud metrics
         from Event.models import VoteFraudDetection
@@ -91,6 +97,7 @@ class VoteTimeSeries(models.Model):
     
     vote_count = models.IntegerField(default=0)
     unique_voters = models.IntegerField(default=0)
+    voter_sketch = models.BinaryField(null=True, editable=False)  # HyperLogLog registers
     revenue_generated = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     avg_votes_per_voter = models.FloatField(default=0.0)
     
@@ -178,6 +185,7 @@ class AnalyticsSnapshot(models.Model):
     
     total_votes = models.IntegerField(default=0)
     unique_voters = models.IntegerField(default=0)
+    voter_sketch = models.BinaryField(null=True, editable=False)  # HyperLogLog registers
     total_revenue = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     page_views = models.IntegerField(default=0)
     
@@ -192,3 +200,110 @@ class AnalyticsSnapshot(models.Model):
     
     def __str__(self):
         return f"{self.event.name} - {self.date}"
+
+
+class VoteRollup(models.Model):
+    """Completed votes per minute, hour or day bucket (see Analytics/rollups.py)"""
+    RESOLUTIONS = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='vote_rollups')
+    resolution = models.CharField(max_length=10, choices=RESOLUTIONS)
+    bucket = models.DateTimeField()  # Start of the bucket
+    
+    vote_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    unique_voters = models.IntegerField(default=0)
+    voter_sketch = models.BinaryField(null=True, editable=False)  # HyperLogLog registers
+    
+    # Part of the counts already added to the next coarser bucket
+    rolled_vote_count = models.IntegerField(default=0)
+    rolled_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    dirty = models.BooleanField(default=True)  # Changed since it was last rolled up
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'resolution', 'bucket'], name='unique_vote_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'dirty']),
+            models.Index(fields=['resolution', 'bucket']),
+        ]
+        ordering = ['bucket']
+    
+    def __str__(self):
+        return f"{self.event.name} - {self.resolution} {self.bucket}"
+
+
+class AnalyticsJob(models.Model):
+    """Queued vote changes for the analytics worker (see Analytics/jobs.py)"""
+    KINDS = [
+        ('votes', 'Votes changed'),
+        ('votes_deleted', 'Votes deleted'),
+    ]
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    ]
+    
+    # Not a foreign key: deletions of an event's votes are queued while the event is being deleted
+    event_id = models.BigIntegerField()
+    kind = models.CharField(max_length=20, choices=KINDS, default='votes')
+    changes = models.JSONField(encoder=DjangoJSONEncoder)  # [[prior state, new state], ...]
+    
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    lease = models.CharField(max_length=32, blank=True)  # Worker claim token
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['event_id', 'status']),
+            models.Index(fields=['lease']),
+        ]
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.kind} job for event {self.event_id} ({self.status})"
+
+
+class CounterShard(models.Model):
+    """
+    One of several rows that absorb increments for a hot aggregate row (see
+    Analytics/counters.py); folded into the aggregate row by compaction
+    """
+    TARGETS = [
+        ('event', 'EventAnalytics'),
+        ('contestant', 'ContestantAnalytics'),
+        ('hour', 'VoteTimeSeries'),
+        ('day', 'AnalyticsSnapshot'),
+        ('rollup', 'VoteRollup (minute)'),
+    ]
+    
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='counter_shards')
+    target = models.CharField(max_length=10, choices=TARGETS)
+    target_key = models.CharField(max_length=40, blank=True)  # Contestant id or bucket, '' for the event
+    shard = models.PositiveSmallIntegerField()
+    
+    votes = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    completed_payments = models.IntegerField(default=0)
+    failed_payments = models.IntegerField(default=0)
+    pending_payments = models.IntegerField(default=0)
+    refunded_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    voter_sketch = models.BinaryField(null=True, editable=False)  # HyperLogLog registers of voters added
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'target', 'target_key', 'shard'], name='unique_counter_shard'),
+        ]
+    
+    def __str__(self):
+        return f"{self.target} {self.target_key} of event {self.event_id} (shard {self.shard})"
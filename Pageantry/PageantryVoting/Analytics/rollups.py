@@ -0,0 +1,215 @@
+"""
+Multi-resolution Vote Rollups
+- Completed votes, revenue and a unique-voter sketch per minute, hour and day
+  bucket of an event (VoteRollup rows)
+- The analytics engine only writes minute rows; roll_up() folds changed minutes
+  into their hour and changed hours into their day, adding only the part not
+  rolled up before, so late refunds propagate as negative amounts
+- prune() drops rolled-up rows older than their resolution's retention
+- vote_series() reads the finest retained resolution that stays within
+  max_points (weeks read hours or days, never minutes) and adds the changes not
+  rolled up yet, so answers are current between roll-up runs
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+from .hll import HyperLogLog
+from .models import VoteRollup
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ('minute', 'hour', 'day')
+PARENT = {'minute': 'hour', 'hour': 'day'}
+STEP = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+DEFAULT_MAX_POINTS = 500
+ROLLUP_BATCH = 5000
+
+
+def bucket_start(moment, resolution):
+    """Start of the bucket containing `moment` (local time, like the other aggregates)"""
+    moment = timezone.localtime(moment)
+    if resolution == 'minute':
+        return moment.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def add(event_id, resolution, bucket, vote_count=0, revenue=0, create=True):
+    """Atomically add to a bucket and mark it for the next roll-up (days are the top level)"""
+    lookup = {'event_id': event_id, 'resolution': resolution, 'bucket': bucket}
+    updates = {
+        'vote_count': F('vote_count') + vote_count,
+        'revenue': F('revenue') + revenue,
+        'dirty': resolution in PARENT,
+    }
+    if VoteRollup.objects.filter(**lookup).update(**updates) or not create:
+        return
+    VoteRollup.objects.get_or_create(**lookup)
+    VoteRollup.objects.filter(**lookup).update(**updates)
+
+
+def _merge_sketch(event_id, resolution, bucket, sketch):
+    row = VoteRollup.objects.select_for_update().filter(
+        event_id=event_id, resolution=resolution, bucket=bucket
+    ).values('id', 'voter_sketch').first()
+    if row is None:
+        return
+    if row['voter_sketch'] is not None:
+        sketch = HyperLogLog.from_bytes(row['voter_sketch']).merge(sketch)
+    VoteRollup.objects.filter(pk=row['id']).update(voter_sketch=sketch.to_bytes(), unique_voters=sketch.count())
+
+
+def roll_up(batch=ROLLUP_BATCH):
+    """
+    Fold up to `batch` changed minutes into hours, then changed hours into days.
+    Returns the number of rows rolled up; call again while it returns a full batch.
+    Sketches only grow, so voters of refunded votes stay counted in hours and days
+    until rebuild_event_analytics() runs.
+    """
+    rolled = 0
+    for resolution, parent in PARENT.items():
+        with transaction.atomic():
+            rows = list(
+                VoteRollup.objects.select_for_update().filter(resolution=resolution, dirty=True).order_by('id').values(
+                    'id', 'event_id', 'bucket', 'vote_count', 'revenue',
+                    'rolled_vote_count', 'rolled_revenue', 'voter_sketch',
+                )[:batch]
+            )
+            if not rows:
+                continue
+
+            groups = defaultdict(lambda: {'vote_count': 0, 'revenue': Decimal(0), 'sketch': None})
+            for row in rows:
+                group = groups[(row['event_id'], bucket_start(row['bucket'], parent))]
+                group['vote_count'] += row['vote_count'] - row['rolled_vote_count']
+                group['revenue'] += row['revenue'] - row['rolled_revenue']
+                if row['voter_sketch'] is not None:
+                    sketch = HyperLogLog.from_bytes(row['voter_sketch'])
+                    group['sketch'] = group['sketch'].merge(sketch) if group['sketch'] else sketch
+
+            for (event_id, bucket), group in groups.items():
+                add(event_id, parent, bucket, group['vote_count'], group['revenue'])
+                if group['sketch'] is not None:
+                    _merge_sketch(event_id, parent, bucket, group['sketch'])
+
+            VoteRollup.objects.bulk_update([
+                VoteRollup(id=row['id'], rolled_vote_count=row['vote_count'], rolled_revenue=row['revenue'], dirty=False)
+                for row in rows
+            ], ['rolled_vote_count', 'rolled_revenue', 'dirty'])
+            rolled += len(rows)
+
+    return rolled
+
+
+def prune(now=None):
+    """Delete rolled-up rows past their retention; returns the number deleted"""
+    now = now or timezone.now()
+    deleted = 0
+    for resolution, days in settings.ANALYTICS_ROLLUP_RETENTION_DAYS.items():
+        if days is None:
+            continue
+        deleted += VoteRollup.objects.filter(
+            resolution=resolution, dirty=False, bucket__lt=now - timedelta(days=days)
+        ).delete()[0]
+    return deleted
+
+
+def choose_resolution(start, end, max_points=DEFAULT_MAX_POINTS, now=None):
+    """Finest resolution still retained at `start` with at most max_points buckets in range"""
+    now = now or timezone.now()
+    retention = settings.ANALYTICS_ROLLUP_RETENTION_DAYS
+    for resolution in RESOLUTIONS:
+        days = retention.get(resolution)
+        if days is not None and start < now - timedelta(days=days):
+            continue
+        if (end - start) / STEP[resolution] <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def vote_series(event_id, start, end, max_points=DEFAULT_MAX_POINTS, now=None):
+    """
+    Completed votes in [start, end) bucketed at the chosen resolution.
+    Returns (resolution, points); each point holds timestamp, vote_count,
+    revenue and unique_voters, oldest first.
+    """
+    resolution = choose_resolution(start, end, max_points, now)
+    buckets = defaultdict(lambda: {'vote_count': 0, 'revenue': Decimal(0), 'sketch': None})
+
+    def fold(bucket, vote_count, revenue, registers):
+        entry = buckets[bucket_start(bucket, resolution)]
+        entry['vote_count'] += vote_count
+        entry['revenue'] += revenue
+        if registers is not None:
+            sketch = HyperLogLog.from_bytes(registers)
+            entry['sketch'] = entry['sketch'].merge(sketch) if entry['sketch'] else sketch
+
+    in_range = VoteRollup.objects.filter(
+        event_id=event_id, bucket__gte=bucket_start(start, resolution), bucket__lt=end
+    )
+    for row in in_range.filter(resolution=resolution).values('bucket', 'vote_count', 'revenue', 'voter_sketch'):
+        fold(row['bucket'], row['vote_count'], row['revenue'], row['voter_sketch'])
+
+    # Changes of finer buckets that have not reached this resolution yet
+    for finer in RESOLUTIONS[:RESOLUTIONS.index(resolution)]:
+        pending = in_range.filter(resolution=finer, dirty=True).values(
+            'bucket', 'vote_count', 'revenue', 'rolled_vote_count', 'rolled_revenue', 'voter_sketch'
+        )
+        for row in pending:
+            fold(
+                row['bucket'], row['vote_count'] - row['rolled_vote_count'],
+                row['revenue'] - row['rolled_revenue'], row['voter_sketch']
+            )
+
+    return resolution, [
+        {
+            'timestamp': bucket,
+            'vote_count': entry['vote_count'],
+            'revenue': entry['revenue'],
+            'unique_voters': entry['sketch'].count() if entry['sketch'] else 0,
+        }
+        for bucket, entry in sorted(buckets.items())
+    ]
+
+
+def rebuild_minutes(event, completed):
+    """Replace an event's rollups with minute rows from its completed votes (rolled up later)"""
+    VoteRollup.objects.filter(event=event).delete()
+
+    sketches = defaultdict(HyperLogLog)
+    voters = completed.exclude(voter_email__isnull=True).annotate(
+        minute=TruncMinute('created_at')
+    ).values_list('minute', 'voter_email').distinct()
+    for minute, email in voters:
+        sketches[minute].add(email)
+
+    minutes = completed.annotate(minute=TruncMinute('created_at')).values('minute').annotate(
+        votes=Sum('number_of_votes'), revenue=Sum('vote_amount'), voters=Count('voter_email', distinct=True)
+    )
+    VoteRollup.objects.bulk_create([
+        VoteRollup(
+            event=event,
+            resolution='minute',
+            bucket=row['minute'],
+            vote_count=row['votes'] or 0,
+            revenue=row['revenue'] or 0,
+            unique_voters=row['voters'],
+            voter_sketch=sketches[row['minute']].to_bytes() if row['minute'] in sketches else None,
+        )
+        for row in minutes
+    ])
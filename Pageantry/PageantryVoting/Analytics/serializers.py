@@ -5,6 +5,7 @@ from .models import (
     ContestantAnalytics, AnalyticsSnapshot
 )
 from Event.models import EventCategoryContestant
+from .leaderboards import category_rank
 
 
 class EventAnalyticsSerializer(serializers.ModelSerializer):
@@ -75,6 +76,10 @@ class ContestantAnalyticsSerializer(serializers.ModelSerializer):
     contestant_name = serializers.CharField(source='contestant.name', read_only=True)
     contestant_id = serializers.IntegerField(source='contestant.id', read_only=True)
     contestant_photo = serializers.SerializerMethodField()
+    category_id = serializers.IntegerField(source='contestant.category_id', read_only=True)
+    category_name = serializers.CharField(source='contestant.category.name', read_only=True)
+    # Rank within the category: the category_rank annotation (see leaderboards.category_rank)
+    vote_rank = serializers.IntegerField(source='category_rank', read_only=True, default=None)
     
     class Meta:
         model = ContestantAnalytics
@@ -82,6 +87,8 @@ class ContestantAnalyticsSerializer(serializers.ModelSerializer):
             'contestant_id',
             'contestant_name',
             'contestant_photo',
+            'category_id',
+            'category_name',
             'total_votes',
             'total_revenue',
             'vote_rank',
@@ -129,7 +136,7 @@ class EventAnalyticsDashboardSerializer(serializers.Serializer):
     
     def get_contestant_analytics(self, obj):
         """Get all contestant analytics"""
-        contestant_stats = obj.event.contestant_analytics.all()
+        contestant_stats = obj.event.contestant_analytics.annotate(category_rank=category_rank())
         return ContestantAnalyticsSerializer(
             contestant_stats,
             many=True,
@@ -190,7 +197,9 @@ class EventAnalyticsDashboardSerializer(serializers.Serializer):
     
     def get_top_performers(self, obj):
         """Get top 5 contestants"""
-        top_contestants = obj.event.contestant_analytics.all()[:5]
+        top_contestants = obj.event.contestant_analytics.annotate(
+            category_rank=category_rank()
+        ).order_by('-total_votes')[:5]
         return ContestantAnalyticsSerializer(
             top_contestants,
             many=True,
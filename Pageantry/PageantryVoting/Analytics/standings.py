@@ -0,0 +1,202 @@
+"""
+Event Standings
+- A ranked structure of an event's contestant vote totals kept in the shared
+  cache, so every worker reads the same one: for the whole event and for each
+  category, a list of (-votes, contestant_id) keys kept sorted
+- After a commit changes contestant totals, engine.apply calls record_votes(),
+  which reads those contestants' committed totals and moves each with two
+  bisects instead of re-sorting the board
+- Updates and rebuilds read the database while holding the same per-event lock,
+  so the entry always ends at the latest committed totals: a change is never
+  lost to, or counted on top of, a concurrent rebuild
+- top(), standing() and the leader's lead are answered from the cached entry;
+  it is rebuilt with one query when missing, when the event's categories or
+  contestants change (event version) or when an update could not take the lock
+"""
+
+import logging
+import time
+import uuid
+from bisect import bisect_left, insort
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from Event.fast_serializers import photo_storage
+from Event.versions import get_version
+from . import counters
+from .models import ContestantAnalytics
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'standings'
+EVENT = 'event'  # board holding every contestant of the event
+LOCK_TIMEOUT = 5
+LOCK_ATTEMPTS = 20
+LOCK_WAIT = 0.005
+
+
+def _key(event_id):
+    return f"{KEY_PREFIX}:{event_id}"
+
+
+def build_standings(event_id, event_version):
+    """Cache entry for an event from its ContestantAnalytics rows (plus pending counter shards)"""
+    pending = counters.pending_contestants(event_id) if counters.enabled() else {}
+    rows = ContestantAnalytics.objects.filter(event_id=event_id).values_list(
+        'contestant_id', 'contestant__category_id', 'contestant__name', 'contestant__photo', 'total_votes'
+    )
+
+    contestants = {}
+    boards = defaultdict(list)
+    for contestant_id, category_id, name, photo, votes in rows:
+        votes += pending.get(contestant_id, (0, 0))[0]
+        contestants[contestant_id] = {
+            'category_id': category_id,
+            'name': name,
+            'photo': photo_storage.url(photo) if photo else None,
+            'votes': votes,
+        }
+        boards[EVENT].append((-votes, contestant_id))
+        boards[category_id].append((-votes, contestant_id))
+
+    for board in boards.values():
+        board.sort()
+    return {'event_version': event_version, 'contestants': contestants, 'boards': dict(boards)}
+
+
+def _valid(entry, event_version):
+    return entry is not None and entry['event_version'] == event_version
+
+
+def get_standings(event_id):
+    """Current cache entry for an event, rebuilt if missing or behind the event version"""
+    event_version = get_version('event', event_id)
+    entry = cache.get(_key(event_id))
+    if _valid(entry, event_version):
+        return entry
+
+    with _locked(event_id) as acquired:
+        if acquired:
+            entry = cache.get(_key(event_id))
+            if _valid(entry, event_version):
+                return entry
+        entry = build_standings(event_id, event_version)
+        # Without the lock an update may be running: serve this build but do not publish it
+        if acquired:
+            cache.set(_key(event_id), entry, timeout=settings.ANALYTICS_STANDINGS_TTL)
+    return entry
+
+
+def invalidate(event_id):
+    cache.delete(_key(event_id))
+
+
+# Updating
+
+@contextmanager
+def _locked(event_id):
+    """Per-event lock shared by updates and rebuilds; yields whether it was acquired"""
+    lock_key = f"{_key(event_id)}:lock"
+    token = uuid.uuid4().hex
+    acquired = False
+    for _ in range(LOCK_ATTEMPTS):
+        acquired = cache.add(lock_key, token, timeout=LOCK_TIMEOUT)
+        if acquired:
+            break
+        time.sleep(LOCK_WAIT)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def _move(board, contestant_id, old_votes, new_votes):
+    """Re-position one contestant: O(log n) search, then a list shift"""
+    index = bisect_left(board, (-old_votes, contestant_id))
+    del board[index]
+    insort(board, (-new_votes, contestant_id))
+
+
+def _committed_votes(event_id, contestant_ids):
+    """{contestant_id: votes} as committed, including pending counter shards"""
+    votes = dict(
+        ContestantAnalytics.objects.filter(contestant_id__in=contestant_ids).values_list('contestant_id', 'total_votes')
+    )
+    if counters.enabled():
+        for contestant_id, (pending, _) in counters.pending_contestants(event_id).items():
+            if contestant_id in votes:
+                votes[contestant_id] += pending
+    return votes
+
+
+def record_votes(event_id, contestant_ids):
+    """Move contestants whose totals changed (after commit) to their committed totals"""
+    with _locked(event_id) as acquired:
+        if not acquired:
+            # Cannot update in place: drop the entry so the next read rebuilds it
+            invalidate(event_id)
+            return
+
+        entry = cache.get(_key(event_id))
+        if entry is None:
+            return
+        # Read under the lock: whichever update runs last sees every earlier commit
+        votes = _committed_votes(event_id, contestant_ids)
+        for contestant_id in contestant_ids:
+            contestant = entry['contestants'].get(contestant_id)
+            if contestant is None or contestant_id not in votes:
+                # First votes of a contestant: its category is not known here
+                invalidate(event_id)
+                return
+            for board in (entry['boards'][EVENT], entry['boards'][contestant['category_id']]):
+                _move(board, contestant_id, contestant['votes'], votes[contestant_id])
+            contestant['votes'] = votes[contestant_id]
+        cache.set(_key(event_id), entry, timeout=settings.ANALYTICS_STANDINGS_TTL)
+
+
+# Reading
+
+def _rank(board, votes):
+    # Keys sort by -votes; (-votes,) sorts before every key with that total, so ties share a rank
+    return bisect_left(board, (-votes,)) + 1
+
+
+def _standing(entry, board, contestant_id):
+    contestant = entry['contestants'][contestant_id]
+    return {
+        'rank': _rank(board, contestant['votes']),
+        'contestant_id': contestant_id,
+        'category_id': contestant['category_id'],
+        'name': contestant['name'],
+        'photo': contestant['photo'],
+        'votes': contestant['votes'],
+        'behind_leader': -board[0][0] - contestant['votes'],
+    }
+
+
+def top(event_id, n=10, category_id=EVENT):
+    """First n standings of the event, or of one category"""
+    entry = get_standings(event_id)
+    board = entry['boards'].get(category_id, [])
+    return [_standing(entry, board, contestant_id) for _, contestant_id in board[:n]]
+
+
+def standing(event_id, contestant_id):
+    """A contestant's standing in its category plus its event-wide rank, or None"""
+    entry = get_standings(event_id)
+    contestant = entry['contestants'].get(contestant_id)
+    if contestant is None:
+        return None
+    result = _standing(entry, entry['boards'][contestant['category_id']], contestant_id)
+    result['event_rank'] = _rank(entry['boards'][EVENT], contestant['votes'])
+    return result
+
+
+def categories(event_id):
+    """Category ids with a board, in id order (contestants without a category last)"""
+    boards = get_standings(event_id)['boards']
+    return sorted((key for key in boards if key != EVENT), key=lambda key: (key is None, key or 0))
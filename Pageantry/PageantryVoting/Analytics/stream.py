@@ -0,0 +1,175 @@
+"""
+Live Tally Stream
+- One TallyHub per event loop (i.e. per ASGI worker) fans tally changes out to
+  every Server-Sent Events subscriber of an event
+- Each event with subscribers has a single poller that watches the event's tally
+  version (bumped by the analytics engine when votes complete, are refunded or
+  removed) and recomputes the tally once per change, not once per client
+- Subscribers receive a snapshot on connect and deltas afterwards
+"""
+
+import asyncio
+import json
+import logging
+import weakref
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import counters
+from .dashboard import tally_version
+from .models import EventAnalytics, ContestantAnalytics
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+
+
+def compute_tally(event_id):
+    """Public tally for an event, read from the aggregate tables"""
+    totals = EventAnalytics.objects.filter(event_id=event_id).values(
+        'total_votes', 'unique_voters', 'total_vote_amount'
+    ).first() or {'total_votes': 0, 'unique_voters': 0, 'total_vote_amount': 0}
+
+    contestants = ContestantAnalytics.objects.filter(event_id=event_id).values_list('contestant_id', 'total_votes')
+
+    if counters.enabled():
+        analytics = counters.event_totals(event_id)
+        totals = {field: getattr(analytics, field) for field in ('total_votes', 'unique_voters', 'total_vote_amount')}
+        pending = counters.pending_contestants(event_id)
+        contestants = [
+            (contestant_id, votes + pending.get(contestant_id, (0, 0))[0]) for contestant_id, votes in contestants
+        ]
+
+    return {
+        'total_votes': totals['total_votes'],
+        'unique_voters': totals['unique_voters'],
+        'total_vote_amount': str(totals['total_vote_amount']),
+        'contestants': {str(contestant_id): votes for contestant_id, votes in contestants},
+    }
+
+
+def diff_tally(old, new):
+    """Fields of `new` that differ from `old`; contestants that disappeared are reported as 0"""
+    delta = {field: value for field, value in new.items() if field != 'contestants' and old.get(field) != value}
+
+    old_contestants = old.get('contestants', {})
+    contestants = {
+        contestant_id: votes
+        for contestant_id, votes in new['contestants'].items()
+        if old_contestants.get(contestant_id) != votes
+    }
+    contestants.update({
+        contestant_id: 0 for contestant_id in old_contestants if contestant_id not in new['contestants']
+    })
+    if contestants:
+        delta['contestants'] = contestants
+    return delta
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class TallyHub:
+    """Fan-out of tally changes to the subscribers of each event"""
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self._subscribers = defaultdict(set)
+        self._pollers = {}
+        self._snapshots = {}
+        self._locks = defaultdict(asyncio.Lock)
+
+    async def subscribe(self, event_id):
+        """Register a subscriber; returns (queue, current snapshot)"""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers[event_id].add(queue)
+
+        poller = self._pollers.get(event_id)
+        if poller is None or poller.done():
+            self._pollers[event_id] = asyncio.create_task(self._poll(event_id))
+
+        return queue, await self._snapshot(event_id)
+
+    def unsubscribe(self, event_id, queue):
+        subscribers = self._subscribers.get(event_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[event_id]
+            self._snapshots.pop(event_id, None)
+            poller = self._pollers.pop(event_id, None)
+            if poller:
+                poller.cancel()
+
+    async def _snapshot(self, event_id):
+        async with self._locks[event_id]:
+            if event_id not in self._snapshots:
+                version = await sync_to_async(tally_version)(event_id)
+                tally = await sync_to_async(compute_tally)(event_id)
+                self._snapshots[event_id] = (version, tally)
+            version, tally = self._snapshots[event_id]
+            return {'version': version, **tally}
+
+    async def _poll(self, event_id):
+        while self._subscribers.get(event_id):
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._check(event_id)
+            except Exception as e:
+                logger.error(f"Tally poll failed for event {event_id}: {e}", exc_info=True)
+
+    async def _check(self, event_id):
+        version = await sync_to_async(tally_version)(event_id)
+        async with self._locks[event_id]:
+            previous = self._snapshots.get(event_id)
+            if previous is None or previous[0] == version:
+                return
+            tally = await sync_to_async(compute_tally)(event_id)
+            self._snapshots[event_id] = (version, tally)
+
+        delta = diff_tally(previous[1], tally)
+        if delta:
+            self.publish(event_id, ('delta', {'version': version, **delta}), snapshot={'version': version, **tally})
+
+    def publish(self, event_id, message, snapshot):
+        """Queue a message for every subscriber; a subscriber that fell behind gets a fresh snapshot"""
+        for queue in list(self._subscribers.get(event_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(('snapshot', snapshot))
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """The hub of the running event loop (asyncio primitives cannot be shared across loops)"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = TallyHub(settings.ANALYTICS_STREAM_POLL_SECONDS)
+    return hub
+
+
+async def tally_events(event_id):
+    """Server-Sent Events for an event: a snapshot, then deltas, with keep-alive comments"""
+    hub = get_hub()
+    queue, snapshot = await hub.subscribe(event_id)
+    try:
+        yield format_sse('snapshot', snapshot)
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=settings.ANALYTICS_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event, data)
+    finally:
+        hub.unsubscribe(event_id, queue)
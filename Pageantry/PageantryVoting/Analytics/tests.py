@@ -1,13 +1,63 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
 from django.contrib.auth import get_user_model
-from Event.models import Event, EventCategory, EventCategoryContestant, Vote
-from .models import EventAnalytics, ContestantAnalytics
+from Event.models import Event, EventCategory, EventCategoryContestant, Vote, VoteFraudDetection
+from .models import EventAnalytics, ContestantAnalytics, VoteTimeSeries, AnalyticsSnapshot, VoteRollup, AnalyticsJob, CounterShard
+from .columnar import ColumnarExportUnavailable
+from . import engine
+from .engine import rebuild_event_analytics, unique_voters_between
+from .hll import HyperLogLog
+from .leaderboards import build_leaderboard, get_leaderboard
+from .live import live_window_totals, record_live_votes
+from . import counters, jobs, rollups, standings
+from .rollups import prune, roll_up, vote_series
+from .stream import compute_tally, diff_tally
 from datetime import timedelta
 from django.utils import timezone
 
 User = get_user_model()
 
 
+class AnalyticsTestMixin:
+    """Shared event/category/contestant fixture and vote factory"""
+    
+    CONTESTANT_NAME = 'Contestant'
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='analyst', email='analyst@test.com', password='testpass123')
+        self.event = Event.objects.create(creator=self.user, name='Finale', amount_per_vote=1.00)
+        self.category = EventCategory.objects.create(event=self.event, name='Main')
+        self.contestant = EventCategoryContestant.objects.create(category=self.category, name=self.CONTESTANT_NAME)
+    
+    def _vote(self, number_of_votes=1, contestant=None, voter_email='voter@test.com', payment_status='completed',
+              created_at=None, **fields):
+        """Create a vote and run its after-commit work; created_at back-dates it afterwards"""
+        fields.setdefault('vote_amount', number_of_votes)
+        with self.captureOnCommitCallbacks(execute=True):
+            vote = Vote.objects.create(
+                event=self.event, contestant=contestant or self.contestant, voter_ip='10.0.0.1',
+                voter_email=voter_email, number_of_votes=number_of_votes, payment_status=payment_status, **fields
+            )
+        if created_at is not None:
+            Vote.objects.filter(pk=vote.pk).update(created_at=created_at)
+            vote.refresh_from_db()
+        return vote
+
+
 class EventAnalyticsTestCase(TestCase):
     """Test event analytics functionality"""
     
@@ -87,3 +137,755 @@ class EventAnalyticsTestCase(TestCase):
         self.assertEqual(analytics.total_votes, 50)
         self.assertEqual(analytics.unique_voters, 5)
         self.assertEqual(analytics.total_vote_amount, 50.00)
+
+
+class IncrementalAnalyticsTestCase(AnalyticsTestMixin, TestCase):
+    """Test delta-based analytics updates"""
+    
+    def test_status_transitions_apply_deltas(self):
+        """Pending -> completed -> refunded moves counters without re-aggregation"""
+        vote = self._vote(3, payment_status='pending', vote_amount=6.00)
+        analytics = EventAnalytics.objects.get(event=self.event)
+        self.assertEqual(analytics.pending_payments, 1)
+        self.assertEqual(analytics.total_votes, 0)
+        
+        vote.payment_status = 'completed'
+        vote.save()
+        analytics.refresh_from_db()
+        self.assertEqual(analytics.pending_payments, 0)
+        self.assertEqual(analytics.completed_payments, 1)
+        self.assertEqual(analytics.total_votes, 3)
+        self.assertEqual(analytics.unique_voters, 1)
+        self.assertEqual(ContestantAnalytics.objects.get(contestant=self.contestant).total_votes, 3)
+        
+        vote.payment_status = 'refunded'
+        vote.save()
+        analytics.refresh_from_db()
+        self.assertEqual(analytics.completed_payments, 0)
+        self.assertEqual(analytics.total_votes, 0)
+        self.assertEqual(analytics.unique_voters, 0)
+        self.assertEqual(analytics.refunded_amount, 6)
+    
+    def test_resave_of_completed_vote_does_not_double_count(self):
+        """Saving an unchanged completed vote leaves the counters alone"""
+        vote = self._vote(3)
+        vote.payment_reference = 'REF-1'
+        vote.save()
+        
+        analytics = EventAnalytics.objects.get(event=self.event)
+        self.assertEqual(analytics.total_votes, 3)
+        self.assertEqual(AnalyticsSnapshot.objects.get(event=self.event).total_votes, 3)
+    
+    def test_loaded_vote_tracks_changed_fields(self):
+        vote = Vote.objects.get(pk=self._vote(3, payment_status='pending').pk)
+        self.assertEqual(vote.changed_fields(), set())
+        vote.payment_reference = 'REF-1'
+        self.assertEqual(vote.changed_fields(), set())
+        vote.payment_status = 'completed'
+        self.assertEqual(vote.changed_fields(), {'payment_status'})
+        vote.save()
+        self.assertEqual(vote.changed_fields(), set())
+        self.assertIsNone(Vote.objects.only('id', 'payment_status').get(pk=vote.pk).changed_fields())
+    
+    @mock.patch('Analytics.signals.engine.apply')
+    def test_no_op_save_skips_analytics_without_reading_the_vote(self, apply):
+        vote = Vote.objects.get(pk=self._vote(3).pk)
+        apply.reset_mock()
+        
+        vote.payment_reference = 'REF-2'
+        with self.assertNumQueries(1):  # the UPDATE only
+            vote.save()
+        apply.assert_not_called()
+        
+        vote.payment_status = 'refunded'
+        vote.save()
+        apply.assert_called_once()
+    
+    def test_rebuild_matches_incremental_state(self):
+        """A full rebuild produces the same totals as the incremental path"""
+        self._vote(3)
+        self._vote(2, voter_email='other@test.com')
+        self._vote(3, voter_email='pending@test.com', payment_status='pending')
+        
+        incremental = EventAnalytics.objects.get(event=self.event)
+        rebuild_event_analytics(self.event)
+        rebuilt = EventAnalytics.objects.get(event=self.event)
+        
+        for field in ['total_votes', 'unique_voters', 'total_vote_amount', 'completed_payments', 'pending_payments']:
+            self.assertEqual(getattr(incremental, field), getattr(rebuilt, field))
+        self.assertEqual(VoteTimeSeries.objects.get(event=self.event).vote_count, 5)
+
+
+class HyperLogLogTestCase(AnalyticsTestMixin, TestCase):
+    """Test unique-voter sketches"""
+    
+    def test_estimate_is_close_for_large_sets(self):
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(f'voter{i}@test.com')
+        self.assertLess(abs(sketch.count() - 20000) / 20000, 0.05)
+    
+    def test_merge_counts_overlap_once(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(300):
+            first.add(f'voter{i}@test.com')
+        for i in range(200, 500):
+            second.add(f'voter{i}@test.com')
+        merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+        self.assertLess(abs(merged.count() - 500), 10)
+        self.assertFalse(first.add('voter0@test.com'))
+    
+    def test_unique_voters_merge_hourly_sketches(self):
+        now = timezone.now()
+        for email, hours_ago in [('a@test.com', 0), ('b@test.com', 0), ('a@test.com', 2), ('c@test.com', 2)]:
+            self._vote(voter_email=email, created_at=now - timedelta(hours=hours_ago))
+        rebuild_event_analytics(self.event)
+        
+        event_id = self.event.id
+        self.assertEqual(EventAnalytics.objects.get(event=self.event).unique_voters, 3)
+        self.assertEqual(unique_voters_between(event_id, now - timedelta(hours=3), now + timedelta(hours=1)), 3)
+        self.assertEqual(unique_voters_between(event_id, now - timedelta(hours=1), now + timedelta(hours=1)), 2)
+
+
+class MaterializedDashboardTestCase(AnalyticsTestMixin, TestCase):
+    """Test the cached, read-only analytics dashboard"""
+    
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = f'/analytics/dashboard/{self.event.id}/'
+    
+    def test_get_never_writes(self):
+        self._vote(2)
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(self.url)
+            self.client.get(self.url)
+        
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['data']['event_overview']['total_votes'], 2)
+        self.assertEqual(first.json()['data']['contestants'][0]['vote_rank'], 1)
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+    
+    def test_etag_returns_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+    
+    @mock.patch('Analytics.dashboard._get_executor')
+    def test_stale_payload_is_served_while_refreshing(self, get_executor):
+        etag = self.client.get(self.url)['ETag']
+        self._vote(2)
+        
+        stale = self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(stale['ETag'], etag)
+        self.assertEqual(stale.json()['data']['event_overview']['total_votes'], 0)
+        self.assertEqual(get_executor.return_value.submit.call_count, 1)
+        
+        # Run the refresh the pool would have run
+        _, event_id, base_url = get_executor.return_value.submit.call_args.args
+        from .dashboard import refresh_dashboard
+        refresh_dashboard(event_id, base_url)
+        fresh = self.client.get(self.url)
+        self.assertNotEqual(fresh['ETag'], etag)
+        self.assertEqual(fresh.json()['data']['event_overview']['total_votes'], 2)
+
+    @mock.patch('Analytics.dashboard._get_executor')
+    def test_rename_is_not_served_stale(self, get_executor):
+        self._vote()
+        etag = self.client.get(self.url)['ETag']
+        self.contestant.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contestant.save()
+
+        response = self.client.get(self.url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data']['contestants'][0]['contestant_name'], 'Renamed')
+        get_executor.return_value.submit.assert_not_called()
+
+    def test_photo_urls_follow_the_requesting_host(self):
+        self.contestant.photo = 'contestants_photos/a.jpg'
+        self.contestant.save()
+        self._vote()
+
+        first = self.client.get(self.url, HTTP_HOST='one.example.com')
+        second = self.client.get(self.url, HTTP_HOST='two.example.com')
+        self.assertTrue(first.json()['data']['contestants'][0]['contestant_photo'].startswith('http://one.example.com/'))
+        self.assertTrue(second.json()['data']['contestants'][0]['contestant_photo'].startswith('http://two.example.com/'))
+
+
+class LiveVoteWindowsTestCase(AnalyticsTestMixin, TestCase):
+    """Test the minute-bucket ring behind LiveVoteCounter"""
+    
+    def test_windows_are_summed_from_buckets(self):
+        minute = 29_000_000
+        clock = lambda: minute * 60 + 30
+        live_window_totals(self.event.id, clock)  # seed the empty ring
+        record_live_votes(self.event.id, {
+            minute: 3, minute - 1: 4, minute - 30: 2, minute - 200: 5, minute - 1500: 100
+        }, clock)
+        
+        with self.assertNumQueries(0):
+            totals = live_window_totals(self.event.id, clock)
+        self.assertEqual(totals, {'last_minute': 5, 'last_hour': 9, 'last_24h': 14})
+    
+    def test_live_counter_follows_completed_votes(self):
+        self.client.force_login(self.user)
+        url = f'/analytics/live-votes/{self.event.id}/'
+        self.client.get(url)
+        
+        vote = self._vote(4)
+        data = self.client.get(url).json()['data']
+        self.assertEqual(data['total_votes'], 4)
+        self.assertEqual(data['votes_last_hour'], 4)
+        self.assertEqual(data['votes_last_24h'], 4)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            vote.payment_status = 'refunded'
+            vote.save()
+        self.assertEqual(self.client.get(url).json()['data']['votes_last_24h'], 0)
+
+
+@override_settings(ANALYTICS_STREAM_POLL_SECONDS=0.01)
+class LiveTallyStreamTestCase(AnalyticsTestMixin, TestCase):
+    """Test the Server-Sent Events tally stream"""
+    
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = True
+            self.event.save()
+    
+    def test_diff_reports_only_changes(self):
+        old = {'total_votes': 1, 'unique_voters': 1, 'contestants': {'1': 1, '2': 3}}
+        new = {'total_votes': 2, 'unique_voters': 1, 'contestants': {'1': 2}}
+        self.assertEqual(diff_tally(old, new), {'total_votes': 2, 'contestants': {'1': 2, '2': 0}})
+    
+    def test_unpublished_event_is_not_streamed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = False
+            self.event.save()
+        self.assertEqual(self.client.get(f'/analytics/stream/{self.event.id}/').status_code, 404)
+    
+    async def test_stream_sends_snapshot_then_delta(self):
+        response = await self.async_client.get(f'/analytics/stream/{self.event.id}/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        
+        snapshot = (await anext(stream)).decode()
+        self.assertTrue(snapshot.startswith('event: snapshot'))
+        self.assertIn('"total_votes": 0', snapshot)
+        
+        await sync_to_async(self._vote)(2)
+        delta = (await asyncio.wait_for(anext(stream), timeout=5)).decode()
+        self.assertTrue(delta.startswith('event: delta'))
+        self.assertIn('"total_votes": 2', delta)
+        self.assertIn(f'"{self.contestant.id}": 2', delta)
+
+
+@override_settings(ANALYTICS_EXPORT_CHUNK_SIZE=2)
+class StreamingExportTestCase(AnalyticsTestMixin, TestCase):
+    """Test the streamed CSV/NDJSON row exports"""
+    
+    CONTESTANT_NAME = 'Contestant, Jr.'
+    
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            self._vote(i + 1, voter_email=f'voter{i}@test.com')
+        self.client.force_login(self.user)
+        self.url = f'/analytics/export/{self.event.id}/'
+    
+    def _lines(self, response):
+        return b''.join(response.streaming_content).decode().splitlines()
+    
+    def test_votes_csv_streams_every_row(self):
+        response = self.client.get(self.url, {'format': 'csv', 'data_type': 'votes'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        
+        lines = self._lines(response)
+        self.assertTrue(lines[0].startswith('id,created_at,contestant_id,contestant__name'))
+        self.assertEqual(len(lines), 6)
+        self.assertIn('"Contestant, Jr."', lines[1])
+    
+    def test_votes_ndjson(self):
+        response = self.client.get(self.url, {'format': 'ndjson', 'data_type': 'votes'})
+        rows = [json.loads(line) for line in self._lines(response)]
+        self.assertEqual([row['number_of_votes'] for row in rows], [1, 2, 3, 4, 5])
+        self.assertEqual(rows[0]['vote_amount'], '1.00')
+    
+    def test_other_data_types(self):
+        rebuild_event_analytics(self.event)
+        contestants = self._lines(self.client.get(self.url, {'format': 'ndjson', 'data_type': 'contestants'}))
+        self.assertEqual(json.loads(contestants[0])['total_votes'], 15)
+        self.assertEqual(json.loads(contestants[0])['category_rank'], 1)
+        timeline = self._lines(self.client.get(self.url, {'format': 'csv', 'data_type': 'timeline'}))
+        self.assertTrue(timeline[0].startswith('timestamp,vote_count'))
+        audit = self.client.get(self.url, {'format': 'csv', 'data_type': 'audit'})
+        self.assertEqual(audit.status_code, 200)
+    
+    def test_summary_stays_json_and_bad_formats_are_rejected(self):
+        self.assertEqual(self.client.get(self.url).json()['status'], 'success')
+        self.assertEqual(self.client.get(self.url, {'format': 'xml', 'data_type': 'votes'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'format': 'csv', 'data_type': 'summary'}).status_code, 400)
+        self.assertEqual(self._lines(self.client.get(self.url, {'format': 'csv'}))[0].split(',')[0], 'id')
+
+
+class ParquetExportTestCase(AnalyticsTestMixin, TestCase):
+    """Test the columnar vote export"""
+    
+    def setUp(self):
+        super().setUp()
+        for status_value in ('completed', 'pending', 'completed'):
+            vote = self._vote(2, voter_email=None, payment_status=status_value, vote_amount='2.50')
+        VoteFraudDetection.objects.create(vote=vote, risk_score=40, fraud_flags=['velocity'])
+        self.client.force_login(self.user)
+        self.url = f'/analytics/export/{self.event.id}/'
+    
+    # CI installs requirements-parquet.txt: fail there rather than skip if pyarrow is missing
+    @skipUnless(find_spec('pyarrow') or os.environ.get('CI'), "pyarrow is not installed")
+    @override_settings(ANALYTICS_PARQUET_ROW_GROUP_SIZE=2)
+    def test_votes_round_trip_with_typed_columns(self):
+        import pyarrow
+        import pyarrow.parquet
+        
+        response = self.client.get(self.url, {'format': 'parquet', 'data_type': 'votes'})
+        self.assertEqual(response.status_code, 200)
+        table = pyarrow.parquet.read_table(pyarrow.BufferReader(b''.join(response.streaming_content)))
+        
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.schema.field('vote_amount').type, pyarrow.decimal128(10, 2))
+        self.assertTrue(pyarrow.types.is_timestamp(table.schema.field('created_at').type))
+        self.assertTrue(pyarrow.types.is_dictionary(table.schema.field('payment_status').type))
+        self.assertEqual(table.column('payment_status').to_pylist(), ['completed', 'pending', 'completed'])
+        self.assertEqual(table.column('fraud_flags').to_pylist(), [None, None, ['velocity']])
+    
+    @mock.patch('Analytics.columnar._load_pyarrow', side_effect=ColumnarExportUnavailable("Parquet export needs pyarrow"))
+    def test_missing_pyarrow_is_reported(self, _):
+        response = self.client.get(self.url, {'format': 'parquet', 'data_type': 'votes'})
+        self.assertEqual(response.status_code, 501)
+        with self.assertRaises(CommandError):
+            call_command('export_parquet', self.event.id, 'votes.parquet')
+    
+    def test_unsupported_table_is_rejected(self):
+        response = self.client.get(self.url, {'format': 'parquet', 'data_type': 'timeline'})
+        self.assertEqual(response.status_code, 400)
+
+
+class VoteRollupTestCase(AnalyticsTestMixin, TestCase):
+    """Test the minute/hour/day rollups and the resolution-picking series"""
+    
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+    
+    def test_contestant_windows_refresh_on_a_schedule(self):
+        now = timezone.now()
+        self._vote(2, created_at=now - timedelta(minutes=20))
+        self._vote(3, created_at=now - timedelta(hours=3))
+        self._vote(4, created_at=now - timedelta(hours=30))
+        stat = ContestantAnalytics.objects.get(contestant=self.contestant)
+        self.assertEqual((stat.total_votes, stat.votes_in_last_24_hours), (9, 0))
+        
+        with self.assertNumQueries(3):
+            self.assertEqual(engine.refresh_contestant_windows(self.event.id, now=now), 1)
+        stat.refresh_from_db()
+        self.assertEqual((stat.votes_in_last_hour, stat.votes_in_last_24_hours, stat.momentum), (2, 5, 2.0))
+        
+        # Windows empty out once the votes age past them
+        call_command('rollup_votes', stdout=io.StringIO())
+        engine.refresh_contestant_windows(now=now + timedelta(days=2))
+        stat.refresh_from_db()
+        self.assertEqual((stat.votes_in_last_hour, stat.votes_in_last_24_hours), (0, 0))
+    
+    def _votes_by_resolution(self):
+        return {
+            row['resolution']: row['total']
+            for row in VoteRollup.objects.values('resolution').annotate(total=Sum('vote_count'))
+        }
+    
+    def test_engine_writes_minutes_and_roll_up_folds_them(self):
+        self._vote(2, created_at=self.now)
+        self._vote(3, created_at=self.now + timedelta(minutes=1), voter_email='other@test.com')
+        self.assertEqual(self._votes_by_resolution(), {'minute': 5})
+        
+        roll_up()
+        self.assertEqual(self._votes_by_resolution(), {'minute': 5, 'hour': 5, 'day': 5})
+        self.assertFalse(VoteRollup.objects.filter(dirty=True).exists())
+        hour = VoteRollup.objects.get(resolution='hour')
+        self.assertEqual(hour.unique_voters, 2)
+        
+        # Rolling up again adds nothing
+        roll_up()
+        self.assertEqual(self._votes_by_resolution(), {'minute': 5, 'hour': 5, 'day': 5})
+    
+    def test_late_refund_propagates_after_minutes_are_pruned(self):
+        created_at = self.now - timedelta(days=5)
+        vote = self._vote(4, created_at=created_at)
+        # The vote was created "now"; move its minute row to when it was cast
+        VoteRollup.objects.update(bucket=rollups.bucket_start(created_at, 'minute'))
+        roll_up()
+        prune(now=self.now)
+        self.assertEqual(self._votes_by_resolution(), {'hour': 4, 'day': 4})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            vote.payment_status = 'refunded'
+            vote.save()
+        roll_up()
+        self.assertEqual(self._votes_by_resolution(), {'minute': -4, 'hour': 0, 'day': 0})
+        prune(now=self.now)
+        self.assertEqual(self._votes_by_resolution(), {'hour': 0, 'day': 0})
+    
+    def test_series_picks_resolution_and_includes_pending_changes(self):
+        self._vote(2, created_at=self.now)
+        roll_up()
+        self._vote(1, created_at=self.now, voter_email='late@test.com')
+        
+        resolution, points = vote_series(self.event.id, self.now - timedelta(hours=2), self.now + timedelta(hours=1))
+        self.assertEqual(resolution, 'minute')
+        self.assertEqual(sum(point['vote_count'] for point in points), 3)
+        
+        resolution, points = vote_series(self.event.id, self.now - timedelta(days=7), self.now + timedelta(hours=1))
+        self.assertEqual(resolution, 'hour')
+        self.assertEqual([point['vote_count'] for point in points], [3])
+        self.assertEqual(points[0]['unique_voters'], 2)
+        
+        resolution, _ = vote_series(self.event.id, self.now - timedelta(days=120), self.now)
+        self.assertEqual(resolution, 'day')
+    
+    def test_timeline_endpoint(self):
+        self._vote(2, created_at=self.now)
+        self.client.force_login(self.user)
+        response = self.client.get(f'/analytics/timeline/{self.event.id}/')
+        self.assertEqual(response.json()['resolution'], 'hour')
+        self.assertEqual(response.json()['data'][0]['vote_count'], 2)
+        self.assertEqual(self.client.get(f'/analytics/timeline/{self.event.id}/', {'start': 'nonsense-only'}).status_code, 200)
+
+
+@override_settings(ANALYTICS_PIPELINE='queue')
+class AnalyticsJobQueueTestCase(AnalyticsTestMixin, TestCase):
+    """Test the after-commit analytics job queue and its worker"""
+    
+    def _total_votes(self):
+        return EventAnalytics.objects.get(event=self.event).total_votes
+    
+    def test_changes_are_queued_and_applied_as_one_batch(self):
+        vote = self._vote(2, payment_status='pending')
+        with self.captureOnCommitCallbacks(execute=True):
+            vote.payment_status = 'completed'
+            vote.save()
+        self._vote(2)
+        
+        self.assertEqual(AnalyticsJob.objects.count(), 3)
+        self.assertEqual(self._total_votes(), 0)
+        
+        with mock.patch('Analytics.jobs.engine.apply', wraps=jobs.engine.apply) as apply:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(jobs.drain(), 3)
+        self.assertEqual(apply.call_count, 2)  # one merged delta for changes, one for deletions
+        self.assertEqual(self._total_votes(), 4)
+        self.assertFalse(AnalyticsJob.objects.exists())
+    
+    def test_deletions_are_queued(self):
+        vote = self._vote(2)
+        jobs.drain()
+        with self.captureOnCommitCallbacks(execute=True):
+            vote.delete()
+        jobs.drain()
+        self.assertEqual(self._total_votes(), 0)
+    
+    def test_nothing_is_queued_before_commit(self):
+        # The callbacks are discarded, as they are when the transaction rolls back
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Vote.objects.create(
+                event=self.event, contestant=self.contestant, voter_ip='10.0.0.1', payment_status='completed'
+            )
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(AnalyticsJob.objects.exists())
+    
+    def test_failed_batch_is_retried_later(self):
+        self._vote(2)
+        with mock.patch('Analytics.jobs.engine.apply', side_effect=RuntimeError('boom')), self.assertLogs('Analytics.jobs', 'ERROR'):
+            self.assertEqual(jobs.drain(), 0)
+        
+        job = AnalyticsJob.objects.get()
+        self.assertEqual((job.status, job.attempts, job.last_error), ('pending', 1, 'boom'))
+        self.assertEqual(jobs.run_once(), 0)  # waiting out the retry delay
+        
+        AnalyticsJob.objects.update(claimed_at=timezone.now() - timedelta(seconds=jobs.RETRY_SECONDS + 1))
+        self.assertEqual(jobs.drain(), 1)
+        self.assertEqual(self._total_votes(), 2)
+    
+    def test_batch_whose_lease_expired_is_rolled_back(self):
+        self._vote(2)
+        lease, claimed = jobs.claim(10)
+        
+        def expire_lease(delta, create=True):
+            # Another worker reclaims the jobs while this batch is still applying
+            AnalyticsJob.objects.filter(lease=lease).update(status='pending', lease='')
+            engine.apply(delta, create=create)
+        
+        with mock.patch('Analytics.jobs.engine.apply', side_effect=expire_lease), self.assertLogs('Analytics.jobs', 'WARNING'):
+            self.assertEqual(jobs.process(lease, claimed), 0)
+        self.assertEqual(self._total_votes(), 0)
+        self.assertEqual(AnalyticsJob.objects.get().status, 'pending')
+        
+        AnalyticsJob.objects.update(claimed_at=None)
+        self.assertEqual(jobs.drain(), 1)
+        self.assertEqual(self._total_votes(), 2)
+
+
+@override_settings(ANALYTICS_COUNTER_SHARDS=4)
+class ShardedCountersTestCase(AnalyticsTestMixin, TestCase):
+    """Test sharded vote counters and their compaction"""
+    
+    CONTESTANT_NAME = 'First'
+    
+    def setUp(self):
+        super().setUp()
+        self.first = self.contestant
+        self.second = EventCategoryContestant.objects.create(category=self.category, name='Second')
+    
+    def test_votes_land_in_shards_until_compacted(self):
+        for i in range(6):
+            self._vote(2, contestant=self.first, voter_email=f'voter{i % 3}@test.com')
+        self._vote(5, contestant=self.second, voter_email='voter9@test.com')
+        
+        self.assertTrue(CounterShard.objects.exists())
+        self.assertLessEqual(CounterShard.objects.filter(target='event').count(), 4)
+        self.assertEqual(EventAnalytics.objects.get(event=self.event).total_votes, 0)
+        
+        # Readers see the pending totals before compaction
+        totals = counters.event_totals(self.event.id)
+        self.assertEqual((totals.total_votes, totals.unique_voters), (17, 4))
+        tally = compute_tally(self.event.id)
+        self.assertEqual(tally['contestants'], {str(self.first.id): 12, str(self.second.id): 5})
+        
+        self.assertGreater(counters.compact(), 0)
+        self.assertFalse(CounterShard.objects.exists())
+        
+        analytics = EventAnalytics.objects.get(event=self.event)
+        self.assertEqual((analytics.total_votes, analytics.unique_voters), (17, 4))
+        self.assertEqual(ContestantAnalytics.objects.get(contestant=self.first).total_votes, 12)
+        engine.refresh_contestant_windows(self.event.id)
+        self.assertEqual(ContestantAnalytics.objects.get(contestant=self.second).votes_in_last_hour, 5)
+        self.assertEqual(VoteTimeSeries.objects.get(event=self.event).vote_count, 17)
+        self.assertEqual(AnalyticsSnapshot.objects.get(event=self.event).total_votes, 17)
+        self.assertEqual(VoteRollup.objects.filter(event=self.event).aggregate(total=Sum('vote_count'))['total'], 17)
+    
+    def test_compacted_counters_match_a_rebuild(self):
+        votes = [self._vote(i + 1, contestant=self.first, voter_email=f'voter{i}@test.com') for i in range(5)]
+        pending = self._vote(3, contestant=self.second, voter_email='late@test.com', payment_status='pending')
+        counters.compact()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            votes[0].payment_status = 'refunded'
+            votes[0].save()
+            pending.payment_status = 'completed'
+            pending.save()
+        counters.compact()
+        
+        fields = ('total_votes', 'total_vote_amount', 'completed_payments', 'pending_payments', 'unique_voters')
+        incremental = EventAnalytics.objects.filter(event=self.event).values(*fields).get()
+        rebuild_event_analytics(self.event)
+        self.assertEqual(incremental, EventAnalytics.objects.filter(event=self.event).values(*fields).get())
+    
+    def test_rebuild_drops_pending_shards(self):
+        self._vote(3, contestant=self.first, voter_email='a@test.com')
+        self._vote(4, contestant=self.second, voter_email='b@test.com')
+        self.assertTrue(CounterShard.objects.exists())
+        
+        rebuild_event_analytics(self.event)
+        counters.compact()
+        
+        analytics = EventAnalytics.objects.get(event=self.event)
+        self.assertEqual((analytics.total_votes, analytics.total_vote_amount, analytics.unique_voters), (7, 7, 2))
+        self.assertEqual(ContestantAnalytics.objects.get(contestant=self.second).total_votes, 4)
+        self.assertEqual(VoteRollup.objects.filter(resolution='minute').aggregate(total=Sum('vote_count'))['total'], 7)
+    
+    def test_json_export_reads_pending_totals_without_writing(self):
+        self._vote(3, voter_email='a@test.com')
+        self.client.force_login(self.user)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/analytics/export/{self.event.id}/')
+        self.assertEqual(response.json()['data']['total_votes'], 3)
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+        self.assertEqual(EventAnalytics.objects.get(event=self.event).total_votes, 0)
+    
+    def test_refunded_voter_leaves_pending_shard_sketches(self):
+        self._vote(2, contestant=self.first, voter_email='stays@test.com')
+        refund = self._vote(3, contestant=self.first, voter_email='leaves@test.com')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            refund.payment_status = 'refunded'
+            refund.save()
+        counters.compact()
+        
+        self.assertEqual(EventAnalytics.objects.get(event=self.event).unique_voters, 1)
+        self.assertEqual(VoteTimeSeries.objects.get(event=self.event).unique_voters, 1)
+        self.assertEqual(AnalyticsSnapshot.objects.get(event=self.event).unique_voters, 1)
+    
+    def test_leaderboard_ranks_pending_totals(self):
+        self._vote(3, contestant=self.first, voter_email='a@test.com')
+        counters.compact()
+        self._vote(5, contestant=self.second, voter_email='b@test.com')
+        
+        self.client.force_login(self.user)
+        response = self.client.get(f'/analytics/leaderboard/{self.event.id}/')
+        contestants = response.json()['data'][0]['contestants']
+        self.assertEqual([(row['rank'], row['name']) for row in contestants], [(1, 'Second'), (2, 'First')])
+
+
+class CategoryLeaderboardTestCase(AnalyticsTestMixin, TestCase):
+    """Test per-category leaderboards ranked by a window function"""
+    
+    def setUp(self):
+        super().setUp()
+        self.queens = EventCategory.objects.create(event=self.event, name='Queens')
+        self.kings = EventCategory.objects.create(event=self.event, name='Kings')
+        for category, votes in ((self.queens, [5, 9, 5, 2]), (self.kings, [4, 7])):
+            for i, total in enumerate(votes):
+                contestant = EventCategoryContestant.objects.create(category=category, name=f'{category.name} {i}')
+                ContestantAnalytics.objects.create(
+                    contestant=contestant, event=self.event, total_votes=total, total_revenue=total
+                )
+    
+    def test_ranks_are_per_category_with_ties(self):
+        with self.assertNumQueries(1):
+            leaderboard = build_leaderboard(self.event.id)
+        
+        ranks = {
+            entry['category']: [(row['rank'], row['total_votes']) for row in entry['contestants']]
+            for entry in leaderboard
+        }
+        self.assertEqual(ranks, {
+            'Queens': [(1, 9), (2, 5), (2, 5), (4, 2)],
+            'Kings': [(1, 7), (2, 4)],
+        })
+    
+    def test_leaderboard_is_cached_until_the_tally_moves(self):
+        get_leaderboard(self.event.id)
+        with self.assertNumQueries(0):
+            get_leaderboard(self.event.id)
+        
+        self._vote(5, contestant=EventCategoryContestant.objects.get(name='Kings 0'))
+        kings = next(entry for entry in get_leaderboard(self.event.id) if entry['category'] == 'Kings')
+        self.assertEqual([(row['rank'], row['name']) for row in kings['contestants']], [(1, 'Kings 0'), (2, 'Kings 1')])
+    
+    def test_view_limits_each_category(self):
+        self.client.force_login(self.user)
+        response = self.client.get(f'/analytics/leaderboard/{self.event.id}/?limit=1&category={self.kings.id}')
+        data = response.json()['data']
+        self.assertEqual([(entry['category'], len(entry['contestants'])) for entry in data], [('Kings', 1)])
+    
+    def test_view_rejects_or_clamps_bad_limits(self):
+        self.client.force_login(self.user)
+        url = f'/analytics/leaderboard/{self.event.id}/?category={self.queens.id}&limit='
+        self.assertEqual(self.client.get(url + 'ten').status_code, 400)
+        
+        for limit, expected in (('-1', 1), ('0', 1), ('100000', 4)):
+            data = self.client.get(url + limit).json()['data']
+            self.assertEqual(len(data[0]['contestants']), expected)
+
+
+class EventStandingsTestCase(AnalyticsTestMixin, TestCase):
+    """Test the cached, bisect-updated contestant standings"""
+    
+    def setUp(self):
+        super().setUp()
+        queens = EventCategory.objects.create(event=self.event, name='Queens')
+        kings = EventCategory.objects.create(event=self.event, name='Kings')
+        self.ada = EventCategoryContestant.objects.create(category=queens, name='Ada')
+        self.bea = EventCategoryContestant.objects.create(category=queens, name='Bea')
+        self.cid = EventCategoryContestant.objects.create(category=kings, name='Cid')
+    
+    def test_votes_move_contestants_without_a_rebuild(self):
+        self._vote(5, contestant=self.ada)
+        self._vote(3, contestant=self.bea)
+        self._vote(4, contestant=self.cid)
+        self.assertEqual([row['name'] for row in standings.top(self.event.id)], ['Ada', 'Cid', 'Bea'])
+        
+        with mock.patch('Analytics.standings.build_standings', wraps=standings.build_standings) as build:
+            self._vote(4, contestant=self.bea)
+            refund = self._vote(2, contestant=self.ada)
+            with self.captureOnCommitCallbacks(execute=True):
+                refund.payment_status = 'refunded'
+                refund.save()
+            
+            with self.assertNumQueries(0):
+                leaders = standings.top(self.event.id)
+                bea = standings.standing(self.event.id, self.bea.id)
+        self.assertEqual(build.call_count, 0)
+        
+        self.assertEqual([(row['name'], row['votes']) for row in leaders], [('Bea', 7), ('Ada', 5), ('Cid', 4)])
+        self.assertEqual((bea['rank'], bea['event_rank'], bea['behind_leader']), (1, 1, 0))
+        ada = standings.standing(self.event.id, self.ada.id)
+        self.assertEqual((ada['rank'], ada['behind_leader']), (2, 2))
+    
+    def test_ties_share_a_rank(self):
+        self._vote(4, contestant=self.ada)
+        self._vote(4, contestant=self.bea)
+        self._vote(4, contestant=self.cid)
+        self.assertEqual([row['rank'] for row in standings.top(self.event.id)], [1, 1, 1])
+        
+        self._vote(1, contestant=self.cid)
+        self.assertEqual([row['rank'] for row in standings.top(self.event.id)], [1, 2, 2])
+    
+    def test_first_vote_of_a_contestant_rebuilds(self):
+        self._vote(2, contestant=self.ada)
+        standings.top(self.event.id)
+        self._vote(3, contestant=self.cid)
+        
+        self.assertIsNone(cache.get(f'{standings.KEY_PREFIX}:{self.event.id}'))
+        self.assertEqual([row['name'] for row in standings.top(self.event.id)], ['Cid', 'Ada'])
+    
+    def test_vote_read_by_a_concurrent_rebuild_is_not_counted_twice(self):
+        self._vote(2, contestant=self.ada)
+        self._vote(3, contestant=self.bea)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Vote.objects.create(
+                event=self.event, contestant=self.ada, voter_ip='10.0.0.1',
+                number_of_votes=4, vote_amount=4, payment_status='completed'
+            )
+        # The entry is rebuilt after the vote commits but before its update runs
+        standings.invalidate(self.event.id)
+        self.assertEqual(standings.standing(self.event.id, self.ada.id)['votes'], 6)
+        for callback in callbacks:
+            callback()
+        
+        self.assertEqual([(row['name'], row['votes']) for row in standings.top(self.event.id)], [('Ada', 6), ('Bea', 3)])
+    
+    def test_rebuild_is_not_published_while_an_update_holds_the_lock(self):
+        self._vote(2, contestant=self.ada)
+        standings.invalidate(self.event.id)
+        cache.set(f'{standings.KEY_PREFIX}:{self.event.id}:lock', 'other', timeout=5)
+        
+        with mock.patch.object(standings, 'LOCK_ATTEMPTS', 1):
+            self.assertEqual(standings.top(self.event.id)[0]['votes'], 2)
+        self.assertIsNone(cache.get(f'{standings.KEY_PREFIX}:{self.event.id}'))
+    
+    def test_view_returns_standings(self):
+        self._vote(2, contestant=self.ada)
+        self._vote(3, contestant=self.cid)
+        self.client.force_login(self.user)
+        response = self.client.get(f'/analytics/standings/{self.event.id}/?contestant={self.ada.id}')
+        data = response.json()['data']
+        self.assertEqual([row['name'] for row in data['leaders']], ['Cid', 'Ada'])
+        self.assertEqual(len(data['categories']), 2)
+        self.assertEqual((data['contestant']['rank'], data['contestant']['event_rank']), (1, 2))
+    
+    def test_view_rejects_or_clamps_bad_parameters(self):
+        self._vote(2, contestant=self.ada)
+        self._vote(3, contestant=self.bea)
+        self.client.force_login(self.user)
+        url = f'/analytics/standings/{self.event.id}/'
+        self.assertEqual(self.client.get(url, {'limit': '1.5'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'contestant': 'ada'}).status_code, 400)
+        
+        self.assertEqual(len(self.client.get(url, {'limit': '-3'}).json()['data']['leaders']), 1)
+        self.assertEqual(len(self.client.get(url, {'limit': '100000'}).json()['data']['leaders']), 2)
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     EventAnalyticsDashboard, LiveVoteCounter,
-    ContestantLeaderboard, AnalyticsExport
+    ContestantLeaderboard, ContestantStandings, AnalyticsExport, VoteTimeline, live_tally_stream
 )
 
 urlpatterns = [
@@ -11,6 +11,9 @@ urlpatterns = [
     # Real-time endpoints
     path('live-votes/<int:event_id>/', LiveVoteCounter.as_view(), name='live-votes'),
     path('leaderboard/<int:event_id>/', ContestantLeaderboard.as_view(), name='leaderboard'),
+    path('standings/<int:event_id>/', ContestantStandings.as_view(), name='standings'),
+    path('stream/<int:event_id>/', live_tally_stream, name='live-tally-stream'),
+    path('timeline/<int:event_id>/', VoteTimeline.as_view(), name='vote-timeline'),
     
     # Export endpoints
     path('export/<int:event_id>/', AnalyticsExport.as_view(), name='analytics-export'),
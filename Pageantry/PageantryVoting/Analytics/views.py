@@ -3,16 +3,30 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 from django.db.models import Count, Sum, F, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
 from datetime import timedelta
 import logging
+import tempfile
 
 from Event.models import Event, Vote, EventCategoryContestant
+from Event.catalog import get_catalog
 from .models import (
     EventAnalytics, VoteTimeSeries, DemographicData,
     ContestantAnalytics, AnalyticsSnapshot
 )
+from . import counters, standings
+from .dashboard import get_dashboard
+from .columnar import TABLES as COLUMNAR_TABLES, ColumnarExportUnavailable, write_parquet
+from .exports import EXPORTS, FORMATS as EXPORT_FORMATS, stream_export
+from .leaderboards import SORT_FIELDS, get_leaderboard
+from .live import live_window_totals
+from .rollups import DEFAULT_MAX_POINTS, vote_series
+from .stream import tally_events
 from .serializers import (
     EventAnalyticsSerializer, VoteTimeSeriesSerializer,
     ContestantAnalyticsSerializer, EventAnalyticsDashboardSerializer
@@ -20,6 +34,17 @@ from .serializers import (
 
 logger = logging.getLogger(__name__)
 
+MAX_RESULTS_LIMIT = 100
+
+
+def _results_limit(request, default=10):
+    """?limit= clamped to 1..MAX_RESULTS_LIMIT, or None when it is not an integer"""
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        return None
+    return min(max(limit, 1), MAX_RESULTS_LIMIT)
+
 
 class EventAnalyticsDashboard(APIView):
     """Get comprehensive analytics dashboard for an event"""
@@ -27,7 +52,7 @@ class EventAnalyticsDashboard(APIView):
     
     def get(self, request, event_id):
         """
-        Fetch complete analytics dashboard data
+        Fetch complete analytics dashboard data (materialized, read-only)
         
         Returns:
         - Event-level metrics (total votes, revenue, engagement)
@@ -36,30 +61,31 @@ class EventAnalyticsDashboard(APIView):
         - Device/browser breakdown
         - Geographic breakdown
         - Fraud detection metrics
+        
+        The payload is tagged with its tally and event versions; If-None-Match gets a 304.
         """
         try:
             # Verify ownership
-            event = get_object_or_404(Event, id=event_id, creator=request.user)
+            if not Event.objects.filter(id=event_id, creator=request.user).exists():
+                return Response({
+                    "status": "error",
+                    "message": "Event not found"
+                }, status=status.HTTP_404_NOT_FOUND)
             
-            # Get or create analytics record
-            analytics, _ = EventAnalytics.objects.get_or_create(event=event)
-            analytics.update_from_votes()
+            entry = get_dashboard(event_id, base_url=request.build_absolute_uri('/'))
+            etag = f'"dashboard-{event_id}-{entry["version"]}-{entry["event_version"]}"'
             
-            # Build comprehensive response
-            response_data = {
-                "status": "success",
-                "data": {
-                    "event_overview": EventAnalyticsSerializer(analytics).data,
-                    "contestants": self._get_contestant_analytics(event),
-                    "vote_timeline": self._get_vote_timeline(event),
-                    "device_breakdown": self._get_device_breakdown(event),
-                    "geographic_breakdown": self._get_geographic_breakdown(event),
-                    "fraud_summary": self._get_fraud_summary(analytics),
-                    "revenue_summary": self._get_revenue_summary(event),
-                }
-            }
+            if etag in parse_etags(request.headers.get('If-None-Match', '')):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = Response({
+                    "status": "success",
+                    "data": entry['payload'],
+                }, status=status.HTTP_200_OK)
             
-            return Response(response_data, status=status.HTTP_200_OK)
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
         
         except Exception as e:
             logger.error(f"Error fetching analytics dashboard: {e}")
@@ -67,99 +93,6 @@ class EventAnalyticsDashboard(APIView):
                 "status": "error",
                 "message": "Error fetching analytics"
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    def _get_contestant_analytics(self, event):
-        """Get analytics for all contestants"""
-        contestant_stats = event.contestant_analytics.all().order_by('-total_votes')
-        
-        # Recalculate ranks
-        for idx, stat in enumerate(contestant_stats, 1):
-            stat.vote_rank = idx
-            stat.save()
-        
-        return ContestantAnalyticsSerializer(
-            contestant_stats,
-            many=True,
-            context={'request': self.request}
-        ).data
-    
-    def _get_vote_timeline(self, event):
-        """Get vote time-series for last 24 hours"""
-        now = timezone.now()
-        last_24h = now - timedelta(hours=24)
-        
-        time_series = event.vote_time_series.filter(
-            timestamp__gte=last_24h
-        ).order_by('timestamp')
-        
-        return VoteTimeSeriesSerializer(time_series, many=True).data
-    
-    def _get_device_breakdown(self, event):
-        """Get device type breakdown"""
-        devices = DemographicData.objects.filter(
-            event=event
-        ).values('device_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
-        total_records = sum(d['count'] for d in devices)
-        
-        return [
-            {
-                'device_type': d['device_type'] or 'unknown',
-                'votes': d['count'],
-                'percentage': (d['count'] / total_records * 100) if total_records > 0 else 0,
-            }
-            for d in devices
-        ]
-    
-    def _get_geographic_breakdown(self, event):
-        """Get geographic breakdown (top 10 countries)"""
-        locations = DemographicData.objects.filter(
-            event=event,
-            country__isnull=False
-        ).exclude(
-            country=''
-        ).values('country').annotate(
-            votes=Count('id')
-        ).order_by('-votes')[:10]
-        
-        return [
-            {
-                'country': d['country'],
-                'votes': d['votes'],
-            }
-            for d in locations
-        ]
-    
-    def _get_fraud_summary(self, analytics):
-        """Get fraud detection summary"""
-        return {
-            'flagged_votes': analytics.flagged_votes,
-            'quarantined_votes': analytics.quarantined_votes,
-            'fraud_detection_rate': round(analytics.fraud_detection_rate, 2),
-        }
-    
-    def _get_revenue_summary(self, event):
-        """Get revenue breakdown by payment status"""
-        votes = Vote.objects.filter(event=event)
-        
-        completed = votes.filter(payment_status='completed').aggregate(
-            total=Sum('vote_amount')
-        )['total'] or 0
-        pending = votes.filter(payment_status='pending').aggregate(
-            total=Sum('vote_amount')
-        )['total'] or 0
-        failed = votes.filter(payment_status='failed').aggregate(
-            total=Sum('vote_amount')
-        )['total'] or 0
-        
-        return {
-            'completed': float(completed),
-            'pending': float(pending),
-            'failed': float(failed),
-            'total': float(completed + pending + failed),
-        }
 
 
 class LiveVoteCounter(APIView):
@@ -180,33 +113,22 @@ class LiveVoteCounter(APIView):
             event = get_object_or_404(Event, id=event_id, creator=request.user)
             now = timezone.now()
             
-            # Get all completed votes
-            all_votes = Vote.objects.filter(event=event, payment_status='completed')
-            total = all_votes.aggregate(total=Sum('number_of_votes'))['total'] or 0
-            
-            # Calculate votes in different time windows
-            last_minute = now - timedelta(minutes=1)
-            last_hour = now - timedelta(hours=1)
-            last_24h = now - timedelta(hours=24)
-            
-            votes_last_minute = all_votes.filter(
-                created_at__gte=last_minute
-            ).aggregate(total=Sum('number_of_votes'))['total'] or 0
-            
-            votes_last_hour = all_votes.filter(
-                created_at__gte=last_hour
-            ).aggregate(total=Sum('number_of_votes'))['total'] or 0
-            
-            votes_last_24h = all_votes.filter(
-                created_at__gte=last_24h
-            ).aggregate(total=Sum('number_of_votes'))['total'] or 0
+            # Running total is kept by the analytics engine; windows come from the minute buckets
+            if counters.enabled():
+                total = counters.event_totals(event.id).total_votes
+            else:
+                total = EventAnalytics.objects.filter(event=event).values_list('total_votes', flat=True).first() or 0
+            windows = live_window_totals(event.id)
+            votes_last_minute = windows['last_minute']
+            votes_last_hour = windows['last_hour']
+            votes_last_24h = windows['last_24h']
             
-            # Get current leader
-            leader = event.contestant_analytics.first()
+            # Current leader from the cached standings (no sort per request)
+            leader = next(iter(standings.top(event.id, 1)), None)
             leader_data = {
-                'name': leader.contestant.name,
-                'votes': leader.total_votes,
-                'photo': leader.contestant.photo.url if leader.contestant.photo else None,
+                'name': leader['name'],
+                'votes': leader['votes'],
+                'photo': leader['photo'],
             } if leader else None
             
             # Calculate velocity (votes per minute)
@@ -236,45 +158,78 @@ class LiveVoteCounter(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class VoteTimeline(APIView):
+    """Vote time series for charts, from the minute/hour/day rollups"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, event_id):
+        """
+        Query params:
+        - start, end: ISO datetimes (default: the last 24 hours)
+        - max_points: upper bound on buckets (default: 500); picks the resolution
+        """
+        try:
+            event = get_object_or_404(Event, id=event_id, creator=request.user)
+            end = parse_datetime(request.query_params.get('end', '')) or timezone.now()
+            start = parse_datetime(request.query_params.get('start', '')) or end - timedelta(hours=24)
+            try:
+                max_points = max(1, int(request.query_params.get('max_points', DEFAULT_MAX_POINTS)))
+            except ValueError:
+                max_points = DEFAULT_MAX_POINTS
+            if timezone.is_naive(start) or timezone.is_naive(end) or start >= end:
+                return Response({
+                    'status': 'error',
+                    'message': 'Invalid time range'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            resolution, points = vote_series(event.id, start, end, max_points=max_points)
+            return Response({
+                'status': 'success',
+                'resolution': resolution,
+                'data': [
+                    {**point, 'timestamp': point['timestamp'].isoformat(), 'revenue': float(point['revenue'])}
+                    for point in points
+                ]
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            logger.error(f"Error fetching vote timeline: {e}")
+            return Response({
+                'status': 'error',
+                'message': 'Error fetching timeline'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class ContestantLeaderboard(APIView):
     """Get contestant leaderboard with rankings"""
     permission_classes = [IsAuthenticated]
     
     def get(self, request, event_id):
         """
-        Get contestant leaderboard
+        Get contestant leaderboards, ranked within each category
         
         Query params:
-        - limit: number of results (default: 10)
+        - limit: number of results per category (default: 10, at most MAX_RESULTS_LIMIT)
         - sort_by: 'votes', 'revenue', 'momentum' (default: 'votes')
+        - category: only this category id
         """
         try:
             event = get_object_or_404(Event, id=event_id, creator=request.user)
-            limit = request.query_params.get('limit', 10)
-            sort_by = request.query_params.get('sort_by', 'total_votes')
-            
-            # Map sort parameter to field name
-            sort_field = {
-                'votes': '-total_votes',
-                'revenue': '-total_revenue',
-                'momentum': '-momentum',
-            }.get(sort_by, '-total_votes')
-            
-            # Get contestant analytics
-            leaderboard = event.contestant_analytics.order_by(sort_field)[:int(limit)]
+            limit = _results_limit(request)
+            if limit is None:
+                return Response({
+                    'status': 'error',
+                    'message': 'Invalid limit'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            sort_field = SORT_FIELDS.get(request.query_params.get('sort_by'), 'total_votes')
+            category = request.query_params.get('category')
             
-            data = []
-            for idx, analytics in enumerate(leaderboard, 1):
-                data.append({
-                    'rank': idx,
-                    'contestant_id': analytics.contestant.id,
-                    'name': analytics.contestant.name,
-                    'photo': analytics.contestant.photo.url if analytics.contestant.photo else None,
-                    'total_votes': analytics.total_votes,
-                    'total_revenue': float(analytics.total_revenue),
-                    'percentage_of_total': round(analytics.percentage_of_total, 2),
-                    'momentum': round(analytics.momentum, 2),
-                })
+            # Ranked by one window query and cached per tally/event version
+            data = [
+                {**entry, 'contestants': entry['contestants'][:limit]}
+                for entry in get_leaderboard(event.id, sort_field)
+                if category is None or str(entry['category_id']) == category
+            ]
             
             return Response({
                 'status': 'success',
@@ -289,30 +244,87 @@ class ContestantLeaderboard(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class ContestantStandings(APIView):
+    """Ranked standings from the cached per-event structure, without sorting in the database"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, event_id):
+        """
+        Query params:
+        - limit: number of results per category (default: 10, at most MAX_RESULTS_LIMIT)
+        - category: only this category id
+        - contestant: also return this contestant's rank and votes behind the leader
+        """
+        try:
+            event = get_object_or_404(Event, id=event_id, creator=request.user)
+            limit = _results_limit(request)
+            contestant = request.query_params.get('contestant')
+            if limit is None or (contestant is not None and not contestant.isdigit()):
+                return Response({
+                    'status': 'error',
+                    'message': 'Invalid limit or contestant'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            category = request.query_params.get('category')
+            
+            data = {
+                'leaders': standings.top(event.id, limit),
+                'categories': [
+                    {'category_id': category_id, 'contestants': standings.top(event.id, limit, category_id)}
+                    for category_id in standings.categories(event.id)
+                    if category is None or str(category_id) == category
+                ],
+            }
+            if contestant is not None:
+                data['contestant'] = standings.standing(event.id, int(contestant))
+            
+            return Response({
+                'status': 'success',
+                'data': data
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            logger.error(f"Error fetching standings: {e}")
+            return Response({
+                'status': 'error',
+                'message': 'Error fetching standings'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class AnalyticsExport(APIView):
     """Export analytics data"""
     permission_classes = [IsAuthenticated]
     
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= names the export format here, not a DRF renderer
+        return super().perform_content_negotiation(request, force=True)
+    
     def get(self, request, event_id):
         """
-        Export analytics as CSV or JSON
+        Export analytics as CSV, NDJSON or JSON
         
         Query params:
-        - format: 'csv' or 'json' (default: 'json')
-        - data_type: 'summary', 'votes', 'contestants', 'timeline' (default: 'summary')
+        - format: 'csv', 'ndjson', 'parquet' or 'json' (default: 'json')
+        - data_type: 'summary', 'votes', 'contestants', 'timeline', 'audit'
+          (default: 'summary' for JSON, 'votes' otherwise)
+        
+        Row data types are streamed (NDJSON when format is 'json'); 'summary' is JSON only.
+        Parquet covers 'votes' (with fraud detection) and 'audit', and needs pyarrow.
         """
         try:
-            import csv
-            from io import StringIO
-            
             event = get_object_or_404(Event, id=event_id, creator=request.user)
             format_type = request.query_params.get('format', 'json')
-            data_type = request.query_params.get('data_type', 'summary')
+            data_type = request.query_params.get('data_type', 'summary' if format_type == 'json' else 'votes')
             
-            if format_type == 'csv':
-                return self._export_csv(event, data_type)
-            else:
-                return self._export_json(event, data_type)
+            if format_type == 'parquet':
+                return self._export_parquet(event, data_type)
+            if data_type in EXPORTS:
+                return self._export_stream(event, data_type, 'ndjson' if format_type == 'json' else format_type)
+            if data_type != 'summary' or format_type != 'json':
+                return Response({
+                    'status': 'error',
+                    'message': 'Unsupported export'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            return self._export_json(event)
         
         except Exception as e:
             logger.error(f"Error exporting analytics: {e}")
@@ -321,23 +333,65 @@ class AnalyticsExport(APIView):
                 'message': 'Error exporting analytics'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    def _export_csv(self, event, data_type):
-        """Export as CSV"""
-        from django.http import HttpResponse
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="analytics_{event.id}.csv"'
+    def _export_stream(self, event, data_type, format_type):
+        """Stream CSV or NDJSON rows"""
+        if format_type not in EXPORT_FORMATS:
+            return Response({
+                'status': 'error',
+                'message': 'Unsupported export format'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Implementation depends on data_type
+        response = StreamingHttpResponse(stream_export(event, data_type, format_type), content_type=EXPORT_FORMATS[format_type])
+        response['Content-Disposition'] = f'attachment; filename="{data_type}_{event.id}.{format_type}"'
         return response
     
-    def _export_json(self, event, data_type):
-        """Export as JSON"""
-        # Get analytics data
-        analytics, _ = EventAnalytics.objects.get_or_create(event=event)
-        analytics.update_from_votes()
+    def _export_parquet(self, event, data_type):
+        """Write a Parquet file to a temporary file and send it"""
+        if data_type not in COLUMNAR_TABLES:
+            return Response({
+                'status': 'error',
+                'message': 'Unsupported export'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        output = tempfile.TemporaryFile()
+        try:
+            write_parquet(event, output, table=data_type)
+        except ColumnarExportUnavailable as e:
+            output.close()
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=status.HTTP_501_NOT_IMPLEMENTED)
+        output.seek(0)
+        return FileResponse(
+            output, as_attachment=True, filename=f"{data_type}_{event.id}.parquet",
+            content_type='application/vnd.apache.parquet'
+        )
+    
+    def _export_json(self, event):
+        """Export the summary as JSON (read-only: the engine keeps the totals current)"""
+        analytics = counters.event_totals(event.id)
         
         return Response({
             'status': 'success',
             'data': EventAnalyticsSerializer(analytics).data
         }, status=status.HTTP_200_OK)
+
+
+async def live_tally_stream(request, event_id):
+    """
+    Server-Sent Events stream of the public tally of a published event.
+    Sends a snapshot on connect, then deltas as votes complete. Needs an ASGI
+    server (see PageantryVoting/asgi.py) so connections do not hold a worker.
+    """
+    published = await sync_to_async(lambda: get_catalog().is_published(event_id))()
+    if not published:
+        return JsonResponse({
+            "status": "error",
+            "message": "Event not found"
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    response = StreamingHttpResponse(tally_events(event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
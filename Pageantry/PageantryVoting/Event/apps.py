@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EventConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Event'
+
+    def ready(self):
+        """Initialize signals when app is ready"""
+        import Event.signals
@@ -0,0 +1,144 @@
+"""
+Event and Contestant Autocomplete
+- In-process sorted array of normalized name keys; the keys starting with a
+  prefix form one contiguous range, bounded with two bisects and ranked with a heap
+- Every word start of a name is a key, so "bea" finds "Miss Ama Beauty"
+- Watches the 'events' version (one cache read per CHECK_INTERVAL) and reloads
+  only the events whose own version changed
+"""
+
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import namedtuple
+
+from .models import Event, EventCategoryContestant
+from .versions import get_version, get_versions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+CHECK_INTERVAL = 1.0
+PREFIX_END = chr(0x10FFFF)
+
+Suggestion = namedtuple('Suggestion', ['type', 'id', 'event_id', 'name', 'event_name'])
+
+
+def normalize(text):
+    """Casefolded, accent-free text with single spaces"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def name_keys(name):
+    """The normalized name from each word start onwards"""
+    words = normalize(name).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class AutocompleteIndex:
+    """Sorted (key, rank, suggestion) rows over published events and their contestants"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.version = None
+        self.checked_at = None
+        self.event_versions = {}
+        self.suggestions = {}  # event_id -> [Suggestion]
+        self.arrays = ([], [])  # (sorted keys, rows), replaced as one object
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Reload changed events if the 'events' version moved (checked at most once per interval)"""
+        now = self.clock()
+        if self.checked_at is not None and now - self.checked_at < CHECK_INTERVAL:
+            return
+        self.checked_at = now
+
+        version = get_version('events')
+        if version == self.version:
+            return
+
+        with self._lock:
+            if version == self.version:
+                return
+            published = set(Event.objects.filter(published=True).values_list('id', flat=True))
+            versions = get_versions([('event', event_id) for event_id in published])
+            changed = {
+                event_id for event_id in published
+                if versions[('event', event_id)] != self.event_versions.get(event_id)
+            }
+            removed = set(self.suggestions) - published
+
+            if changed or removed:
+                suggestions = dict(self.suggestions)
+                for event_id in removed:
+                    suggestions.pop(event_id, None)
+                    self.event_versions.pop(event_id, None)
+                suggestions.update(self._load(changed))
+                for event_id in changed:
+                    self.event_versions[event_id] = versions[('event', event_id)]
+                self._swap(suggestions)
+                logger.debug(f"Autocomplete reloaded {len(changed)} events, dropped {len(removed)}")
+
+            self.version = version
+
+    def _load(self, event_ids):
+        """Suggestions for the given events (two queries)"""
+        loaded = {event_id: [] for event_id in event_ids}
+        if not event_ids:
+            return loaded
+
+        names = dict(Event.objects.filter(id__in=event_ids).values_list('id', 'name'))
+        for event_id, name in names.items():
+            loaded[event_id].append(Suggestion('event', event_id, event_id, name, name))
+
+        contestants = EventCategoryContestant.objects.filter(
+            category__event_id__in=event_ids
+        ).values_list('id', 'name', 'category__event_id')
+        for contestant_id, name, event_id in contestants:
+            loaded[event_id].append(Suggestion('contestant', contestant_id, event_id, name, names.get(event_id)))
+        return loaded
+
+    def _swap(self, suggestions):
+        # Full names rank above matches inside a name; events above contestants; shorter names first
+        rows = sorted(
+            (key, (position > 0, suggestion.type != 'event', len(suggestion.name)), suggestion)
+            for event_suggestions in suggestions.values()
+            for suggestion in event_suggestions
+            for position, key in enumerate(name_keys(suggestion.name))
+        )
+        self.suggestions = suggestions
+        self.arrays = ([row[0] for row in rows], rows)
+
+    def complete(self, prefix, limit=DEFAULT_LIMIT):
+        """Top `limit` suggestions whose name (or a word in it) starts with `prefix`"""
+        self.refresh()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        keys, rows = self.arrays
+        # Every key starting with the prefix sorts below prefix + the highest code point
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + PREFIX_END, start)
+        matches = {}
+        for _, rank, suggestion in rows[start:end]:
+            identity = (suggestion.type, suggestion.id)
+            if identity not in matches or rank < matches[identity][0]:
+                matches[identity] = (rank, suggestion)
+
+        best = heapq.nsmallest(limit, matches.values(), key=lambda match: (match[0], match[1].name))
+        return [suggestion for _, suggestion in best]
+
+
+_index = AutocompleteIndex()
+
+
+def get_autocomplete_index():
+    return _index
@@ -0,0 +1,74 @@
+"""
+Published Event Catalog
+- Immutable in-process snapshot of every contestant in a published event
+- Lets the vote hot path validate event/contestant membership without queries
+- Rebuilt with two queries whenever the shared catalog version changes
+"""
+
+import logging
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.db import transaction
+
+from .models import Event, EventCategoryContestant
+from .versions import get_version, bump_version
+
+logger = logging.getLogger(__name__)
+
+CatalogEntry = namedtuple('CatalogEntry', [
+    'contestant_id', 'category_id', 'event_id', 'amount_per_vote',
+    'start_time', 'end_time', 'vote_rate_limits',
+])
+
+
+class PublishedCatalog:
+    """A read-only snapshot tagged with the catalog version it was built from"""
+
+    def __init__(self, version, entries, event_ids):
+        self.version = version
+        self.contestants = MappingProxyType({entry.contestant_id: entry for entry in entries})
+        self.event_ids = frozenset(event_ids)
+
+    @classmethod
+    def build(cls, version):
+        rows = EventCategoryContestant.objects.filter(
+            category__event__published=True
+        ).values_list(
+            'id', 'category_id', 'category__event_id', 'category__event__amount_per_vote',
+            'category__event__start_time', 'category__event__end_time',
+            'category__event__vote_rate_limits',
+        )
+        event_ids = Event.objects.filter(published=True).values_list('id', flat=True)
+        return cls(version, [CatalogEntry(*row) for row in rows], event_ids)
+
+    def lookup(self, contestant_id):
+        return self.contestants.get(contestant_id)
+
+    def is_published(self, event_id):
+        return event_id in self.event_ids
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Current snapshot; costs one cache read unless the catalog changed"""
+    global _catalog
+    version = get_version('catalog')
+    catalog = _catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    with _catalog_lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = PublishedCatalog.build(version)
+            logger.debug(f"Rebuilt published catalog at version {version}")
+        return _catalog
+
+
+def invalidate_catalog():
+    """Bump the catalog version once the current transaction commits"""
+    transaction.on_commit(lambda: bump_version('catalog'))
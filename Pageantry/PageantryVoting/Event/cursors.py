@@ -0,0 +1,75 @@
+"""
+Keyset Pagination
+- Pages of published events ordered by (start_time DESC, id DESC), events
+  without a start time last
+- The cursor is an opaque token holding the sort key of the last row served,
+  so every page is an index range scan regardless of depth
+"""
+
+import base64
+import json
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+ORDERING = (F('start_time').desc(nulls_last=True), '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(event):
+    """Token for an Event instance or a .values() row"""
+    if isinstance(event, dict):
+        start_time, event_id = event['start_time'], event['id']
+    else:
+        start_time, event_id = event.start_time, event.id
+    key = {'s': start_time.isoformat() if start_time else None, 'i': event_id}
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        start_time = parse_datetime(key['s']) if key['s'] is not None else None
+        if key['s'] is not None and start_time is None:
+            raise ValueError(key['s'])
+        return start_time, int(key['i'])
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(f"Invalid cursor: {token}") from e
+
+
+def after_cursor(start_time, event_id):
+    """Rows that sort after (start_time, event_id) in ORDERING"""
+    if start_time is None:
+        return Q(start_time__isnull=True, id__lt=event_id)
+    return (
+        Q(start_time__lt=start_time)
+        | Q(start_time=start_time, id__lt=event_id)
+        | Q(start_time__isnull=True)
+    )
+
+
+def page_size(value):
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Returns (rows, next_cursor); next_cursor is None on the last page (works on .values() querysets too)"""
+    queryset = queryset.order_by(*ORDERING)
+    if cursor:
+        queryset = queryset.filter(after_cursor(*decode_cursor(cursor)))
+
+    # One extra row tells whether another page exists
+    rows = list(queryset[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,86 @@
+"""
+Fast Read-only Serializers
+- Plain-dict serialization of published events for the hot public endpoints
+- Rows come from .values(); scalar formatting reuses single DRF field instances
+  so the JSON is byte-identical to EventSerializer (shallow: without contestants)
+- Three queries for any number of events (two when shallow)
+"""
+
+from rest_framework import serializers
+
+from .models import Event, EventCategory, EventCategoryContestant
+
+EVENT_VALUES = (
+    'id', 'name', 'amount_per_vote', 'bio', 'banner',
+    'start_time', 'end_time', 'published', 'creator__username',
+)
+
+# Scalar fields as EventSerializer builds them from the model fields
+_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+_datetime = serializers.DateTimeField()
+banner_storage = Event._meta.get_field('banner').storage
+photo_storage = EventCategoryContestant._meta.get_field('photo').storage
+
+
+def _image_url(storage, name, request):
+    """ImageField.to_representation for a stored file name"""
+    if not name:
+        return None
+    url = storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _datetime_value(value):
+    return _datetime.to_representation(value) if value is not None else None
+
+
+def event_rows(queryset):
+    """The .values() rows serialize_events expects, in queryset order"""
+    return list(queryset.values(*EVENT_VALUES))
+
+
+def serialize_events(rows, request=None, shallow=False):
+    """Serialize event rows with their categories (and contestants unless shallow)"""
+    event_ids = [row['id'] for row in rows]
+    categories = {event_id: [] for event_id in event_ids}
+    if not event_ids:
+        return []
+
+    by_category = {}
+    category_rows = EventCategory.objects.filter(event_id__in=event_ids).order_by('id').values('id', 'name', 'event_id')
+    for category in category_rows:
+        data = {'id': category['id'], 'name': category['name']}
+        if not shallow:
+            data['contestants'] = by_category[category['id']] = []
+        categories[category['event_id']].append(data)
+
+    if not shallow and by_category:
+        contestant_rows = EventCategoryContestant.objects.filter(
+            category_id__in=list(by_category)
+        ).order_by('id').values('id', 'name', 'bio', 'hobby', 'photo', 'category_id')
+        for contestant in contestant_rows:
+            by_category[contestant['category_id']].append({
+                'id': contestant['id'],
+                'name': contestant['name'],
+                'bio': contestant['bio'],
+                'hobby': contestant['hobby'],
+                'photo': _image_url(photo_storage, contestant['photo'], request),
+            })
+
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'amount_per_vote': _amount.to_representation(row['amount_per_vote']),
+            'bio': row['bio'],
+            'banner': _image_url(banner_storage, row['banner'], request),
+            'start_time': _datetime_value(row['start_time']),
+            'end_time': _datetime_value(row['end_time']),
+            'published': row['published'],
+            'categories': categories[row['id']],
+            'creator': row['creator__username'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,189 @@
+"""
+Per-voter Feature Store
+- Rolling features used by fraud scoring, keyed by voter_identifier
+- Updated incrementally when a vote is written, read with a single get_many;
+  updates merge into the current cache entries under a per-voter lock, so
+  concurrent votes of one voter are all counted
+- Hydrated from the Vote table only when the cache has no entry for the voter,
+  leaving out the vote being scored or recorded (it is added by record())
+"""
+
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .models import Vote
+
+logger = logging.getLogger(__name__)
+
+
+class VoterFeatureStore:
+    """
+    Two cache entries per voter:
+    - voter-wide: last vote timestamp and the sizes of the most recent transactions
+    - per event: per-minute vote sums (for the rolling window) and per-contestant counts
+    """
+
+    KEY_PREFIX = 'voterfeatures'
+    RECENT_TRANSACTIONS = 10
+    WINDOW_MINUTES = 15
+    VOTER_TIMEOUT = 86400 * 30
+    EVENT_TIMEOUT = 86400 * 7
+    LOCK_TIMEOUT = 5
+    LOCK_ATTEMPTS = 20
+    LOCK_WAIT = 0.005
+
+    def __init__(self, voter_identifier, event_id, clock=time.time, exclude_vote_id=None):
+        self.voter_identifier = voter_identifier
+        self.event_id = event_id
+        self.clock = clock
+        self.exclude_vote_id = exclude_vote_id
+        self.voter_key = f"{self.KEY_PREFIX}:{voter_identifier}"
+        self.event_key = f"{self.KEY_PREFIX}:{voter_identifier}:{event_id}"
+        self._voter = None
+        self._event = None
+
+    def load(self):
+        """Fetch both entries in one round trip, hydrating missing ones from the database"""
+        if self._voter is not None:
+            return self
+
+        entries = cache.get_many([self.voter_key, self.event_key])
+        self._voter = entries.get(self.voter_key)
+        self._event = entries.get(self.event_key)
+
+        # Only fill in missing entries: never overwrite ones a concurrent record() just merged
+        if self._voter is None:
+            self._voter = self._hydrate_voter(self.exclude_vote_id)
+            cache.add(self.voter_key, self._voter, timeout=self.VOTER_TIMEOUT)
+        if self._event is None:
+            self._event = self._hydrate_event(self.exclude_vote_id)
+            cache.add(self.event_key, self._event, timeout=self.EVENT_TIMEOUT)
+        return self
+
+    # Features
+
+    def recent_votes(self):
+        """Votes cast for this event within the rolling window"""
+        self.load()
+        cutoff = self._minute(self.clock()) - self.WINDOW_MINUTES
+        return sum(votes for minute, votes in self._event['minutes'].items() if minute >= cutoff)
+
+    def last_vote_at(self):
+        """Unix timestamp of the voter's latest vote (any event), or None"""
+        self.load()
+        return self._voter['last_vote_at']
+
+    def transaction_count(self):
+        """Number of transactions in the recent history (capped at RECENT_TRANSACTIONS)"""
+        self.load()
+        return len(self._voter['recent_sizes'])
+
+    def mean_votes_per_transaction(self):
+        self.load()
+        sizes = self._voter['recent_sizes']
+        return sum(sizes) / len(sizes) if sizes else 0
+
+    def max_contestant_count(self):
+        """Highest number of vote transactions for a single contestant in this event"""
+        self.load()
+        return max(self._event['contestants'].values(), default=0)
+
+    # Updates
+
+    def record(self, contestant_id, number_of_votes, at=None, vote_id=None):
+        """Fold a newly written vote into the current cache entries (not the snapshot read for scoring)"""
+        at = at or self.clock()
+        minute = self._minute(at)
+        exclude = vote_id or self.exclude_vote_id
+
+        with self._locked():
+            entries = cache.get_many([self.voter_key, self.event_key])
+            voter = entries.get(self.voter_key) or self._hydrate_voter(exclude)
+            event = entries.get(self.event_key) or self._hydrate_event(exclude)
+
+            sizes = voter['recent_sizes']
+            sizes.insert(0, number_of_votes)
+            del sizes[self.RECENT_TRANSACTIONS:]
+            voter['last_vote_at'] = at
+
+            cutoff = minute - self.WINDOW_MINUTES
+            minutes = {m: v for m, v in event['minutes'].items() if m >= cutoff}
+            minutes[minute] = minutes.get(minute, 0) + number_of_votes
+            event['minutes'] = minutes
+
+            contestants = event['contestants']
+            contestants[contestant_id] = contestants.get(contestant_id, 0) + 1
+
+            cache.set(self.voter_key, voter, timeout=self.VOTER_TIMEOUT)
+            cache.set(self.event_key, event, timeout=self.EVENT_TIMEOUT)
+        self._voter, self._event = voter, event
+
+    @contextmanager
+    def _locked(self):
+        """Per-voter lock around read-merge-write; proceeds unlocked if a holder overstays"""
+        lock_key = f"{self.voter_key}:lock"
+        token = uuid.uuid4().hex
+        acquired = False
+        for _ in range(self.LOCK_ATTEMPTS):
+            acquired = cache.add(lock_key, token, timeout=self.LOCK_TIMEOUT)
+            if acquired:
+                break
+            time.sleep(self.LOCK_WAIT)
+        if not acquired:
+            logger.warning(f"Feature store lock busy for {self.voter_identifier}; merging without it")
+        try:
+            yield
+        finally:
+            if acquired and cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    # Hydration
+
+    def _votes(self, exclude_vote_id):
+        votes = Vote.objects.filter(voter_identifier=self.voter_identifier)
+        return votes.exclude(pk=exclude_vote_id) if exclude_vote_id else votes
+
+    def _hydrate_voter(self, exclude_vote_id=None):
+        history = list(
+            self._votes(exclude_vote_id)
+            .order_by('-created_at')
+            .values_list('number_of_votes', 'created_at')[:self.RECENT_TRANSACTIONS]
+        )
+        return {
+            'last_vote_at': history[0][1].timestamp() if history else None,
+            'recent_sizes': [size for size, _ in history],
+        }
+
+    def _hydrate_event(self, exclude_vote_id=None):
+        now = self.clock()
+        minute = self._minute(now)
+        rows = self._votes(exclude_vote_id).filter(event_id=self.event_id).values('contestant_id').annotate(
+            count=Count('id'),
+            recent=Sum('number_of_votes', filter=Q(created_at__gte=_from_timestamp(now - self.WINDOW_MINUTES * 60))),
+        )
+
+        contestants = {}
+        recent = 0
+        for row in rows:
+            contestants[row['contestant_id']] = row['count']
+            recent += row['recent'] or 0
+
+        # The hydrated window total is attributed to the current minute
+        return {
+            'minutes': {minute: recent} if recent else {},
+            'contestants': contestants,
+        }
+
+    @staticmethod
+    def _minute(timestamp):
+        return int(timestamp // 60)
+
+
+def _from_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
@@ -0,0 +1,405 @@
+"""
+Vote Ingestion
+- Shared builders for the fraud detection and audit rows written with every vote
+- Optional write-behind buffer that batches accepted votes into bulk inserts
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+
+from .models import Vote, VoteFraudDetection, VoteAuditLog
+from .security import VoteIntegrityValidator, VoteSecurityManager, sign_vote
+from .signals import votes_bulk_created
+
+logger = logging.getLogger(__name__)
+
+# Database unreachable: worth retrying the same records later
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+# VoteFraudDetection check field -> rule whose result it records
+CHECK_RULES = {
+    'velocity_check_passed': 'velocity',
+    'behavioral_check_passed': 'behavioral_anomalies',
+    'geographic_check_passed': 'geographic_anomalies',
+    'ip_reputation_passed': 'ip_reputation',
+    'email_reputation_passed': 'email_reputation',
+}
+
+
+def build_fraud_detection(vote, device_fingerprint, risk_score, fraud_flags, evaluated_rules=None):
+    """
+    Unsaved VoteFraudDetection for a vote that already has a primary key.
+    Checks whose rule is not in evaluated_rules are stored as None (not evaluated);
+    evaluated_rules=None means every rule ran.
+    """
+    vote_data = {
+        'vote_id': vote.id,
+        'contestant_id': vote.contestant_id,
+        'event_id': vote.event_id,
+        'number_of_votes': vote.number_of_votes,
+        'voter_email': vote.voter_email
+    }
+    is_suspicious = risk_score >= VoteSecurityManager.SUSPICIOUS_VOTE_THRESHOLD
+    passed = {
+        'velocity_check_passed': 'velocity_check' not in str(fraud_flags),
+        'behavioral_check_passed': 'abnormal_voting' not in str(fraud_flags),
+        'geographic_check_passed': 'impossible_travel' not in str(fraud_flags),
+        'ip_reputation_passed': 'blacklisted_ip' not in fraud_flags and 'high_abuse_ip' not in str(fraud_flags),
+        'email_reputation_passed': 'disposable_email' not in fraud_flags,
+    }
+    if evaluated_rules is not None:
+        passed = {field: value if CHECK_RULES[field] in evaluated_rules else None for field, value in passed.items()}
+
+    return VoteFraudDetection(
+        vote=vote,
+        device_fingerprint=device_fingerprint or '',
+        risk_score=risk_score,
+        fraud_flags=fraud_flags,
+        is_suspicious=is_suspicious,
+        is_quarantined=is_suspicious,
+        request_signature=sign_vote(vote.id, vote.event_id, vote.voter_ip),
+        vote_integrity_hash=VoteIntegrityValidator.create_vote_hash(vote_data),
+        **passed
+    )
+
+
+def build_audit_logs(vote, is_valid, error_message, risk_score, fraud_flags):
+    """Unsaved audit log rows describing how a new vote was received"""
+    logs = [
+        VoteAuditLog(
+            vote=vote,
+            action='vote_created',
+            description=f'Vote created with {vote.number_of_votes} votes. Risk Score: {risk_score}',
+            actor='system',
+            ip_address=vote.voter_ip,
+            metadata={
+                'fraud_flags': fraud_flags,
+                'risk_score': risk_score,
+                'number_of_votes': vote.number_of_votes
+            }
+        )
+    ]
+
+    if not is_valid:
+        logs.append(VoteAuditLog(
+            vote=vote,
+            action='fraud_detected',
+            description=error_message,
+            actor='system',
+            ip_address=vote.voter_ip,
+            metadata={'risk_score': risk_score, 'fraud_flags': fraud_flags}
+        ))
+    elif risk_score > 0:
+        logs.append(VoteAuditLog(
+            vote=vote,
+            action='vote_flagged',
+            description=f'Vote flagged for review - Risk Score: {risk_score}',
+            actor='system',
+            ip_address=vote.voter_ip,
+            metadata={'fraud_flags': fraud_flags}
+        ))
+
+    return logs
+
+
+class VoteIngestionBuffer:
+    """
+    Write-behind buffer for validated votes.
+
+    Records are appended to the process's current spool segment before a ticket is
+    handed back. Appends are group-committed: concurrent submitters queue their
+    records and whoever holds the sync lock writes and fsyncs all of them at once.
+    Records are flushed every `flush_interval_ms` or `max_batch` records, at most
+    `max_batch` per bulk_create. Each flush rotates to a new segment, and a segment
+    is deleted once none of its records are pending, so spools are never rewritten.
+    Segments left behind by dead processes are replayed on start; tickets are unique
+    on Vote so a replay never duplicates rows.
+    A failing batch is bisected until the records that cannot be written are found;
+    those go to the dead-letter spool so they never block the votes behind them.
+    Connection errors keep the batch pending for the next flush instead.
+    """
+
+    def __init__(self, spool_dir, flush_interval_ms=200, max_batch=500):
+        self.spool_dir = Path(spool_dir)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.dead_letter_path = self.spool_dir / 'dead-letter.jsonl'
+        # (segment, record) in submission order; records waiting for their fsync sit in _queued
+        self._pending = []
+        self._queued = []
+        self._submitted = 0
+        self._synced = 0
+        self._segment = 0
+        self._segment_records = {}  # segment -> records not yet written or dead-lettered
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Replay orphaned spools and start the background flusher"""
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.replay_orphaned_spools()
+        self._thread = threading.Thread(target=self._run, name='vote-ingestion', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Flush whatever is left; anything that fails stays in the spool for replay"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def submit(self, record):
+        """Durably accept a vote record and return its ticket"""
+        record = dict(record, ticket=str(uuid.uuid4()))
+        with self._lock:
+            self._queued.append(record)
+            self._submitted += 1
+            sequence = self._submitted
+
+        self._sync(sequence)
+
+        with self._lock:
+            pending = len(self._pending)
+        if pending >= self.max_batch:
+            self._wakeup.set()
+        return record['ticket']
+
+    def _sync(self, sequence):
+        """Write and fsync every queued record, unless an earlier group commit already covered `sequence`"""
+        with self._sync_lock:
+            if self._synced >= sequence:
+                return
+
+            with self._lock:
+                records, self._queued = self._queued, []
+                submitted = self._submitted
+                segment = self._segment
+                # Counted before the write so a flush never deletes the segment under us
+                self._segment_records[segment] = self._segment_records.get(segment, 0) + len(records)
+
+            try:
+                self.spool_dir.mkdir(parents=True, exist_ok=True)
+                with open(self._segment_path(segment), 'a', encoding='utf-8') as spool:
+                    spool.write(''.join(json.dumps(record, default=str) + '\n' for record in records))
+                    spool.flush()
+                    os.fsync(spool.fileno())
+            except OSError:
+                # Not durable: requeue for the next group commit and fail this submitter
+                with self._lock:
+                    self._queued[:0] = records
+                    self._segment_records[segment] -= len(records)
+                raise
+
+            with self._lock:
+                self._pending.extend((segment, record) for record in records)
+                self._synced = submitted
+
+    def is_pending(self, ticket):
+        with self._lock:
+            return any(record['ticket'] == ticket for _, record in self._pending)
+
+    def flush(self):
+        """Write pending records, max_batch at a time; returns the number of votes inserted"""
+        inserted = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    entries = self._pending[:self.max_batch]
+                    if entries and self._segment_records.get(self._segment):
+                        self._segment += 1  # the batch's segment is closed and deleted once it drains
+                batch = [record for _, record in entries]
+                if not batch:
+                    return inserted
+
+                try:
+                    written, rejected = self._write_isolating(batch)
+                except TRANSIENT_ERRORS as e:
+                    logger.error(f"Vote ingestion flush failed, {len(batch)} records kept in spool: {e}", exc_info=True)
+                    return inserted
+                if rejected:
+                    self._dead_letter(rejected)
+
+                # Only flush() removes from _pending and submit() only appends, so the batch is still the head
+                with self._lock:
+                    del self._pending[:len(entries)]
+                    for segment, _ in entries:
+                        self._segment_records[segment] -= 1
+                    drained = [
+                        segment for segment, count in self._segment_records.items()
+                        if count == 0 and segment != self._segment
+                    ]
+                    for segment in drained:
+                        del self._segment_records[segment]
+                for segment in drained:
+                    self._segment_path(segment).unlink(missing_ok=True)
+                inserted += written
+
+    def _write_isolating(self, records):
+        """
+        write_batch, bisecting a failed batch down to the records that fail on their
+        own; returns (votes inserted, rejected records). Connection errors propagate.
+        """
+        try:
+            return self.write_batch(records), []
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception as e:
+            if len(records) == 1:
+                records[0]['error'] = str(e)
+                logger.error(f"Vote ingestion record {records[0].get('ticket')} rejected: {e}", exc_info=True)
+                return 0, records
+            middle = len(records) // 2
+            first_written, first_rejected = self._write_isolating(records[:middle])
+            second_written, second_rejected = self._write_isolating(records[middle:])
+            return first_written + second_written, first_rejected + second_rejected
+
+    def _dead_letter(self, records):
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as spool:
+            for record in records:
+                spool.write(json.dumps(record, default=str) + '\n')
+            spool.flush()
+            os.fsync(spool.fileno())
+
+    @staticmethod
+    def write_batch(records):
+        """Insert votes, fraud detections and audit logs for a batch of records"""
+        tickets = [uuid.UUID(record['ticket']) for record in records]
+        existing = set(Vote.objects.filter(ingestion_ticket__in=tickets).values_list('ingestion_ticket', flat=True))
+        records = [r for r in records if uuid.UUID(r['ticket']) not in existing]
+        if not records:
+            return 0
+
+        with transaction.atomic():
+            votes = Vote.objects.bulk_create([
+                Vote(
+                    ingestion_ticket=record['ticket'],
+                    contestant_id=record['vote']['contestant_id'],
+                    event_id=record['vote']['event_id'],
+                    voter_ip=record['vote']['voter_ip'],
+                    voter_email=record['vote']['voter_email'],
+                    voter_identifier=record['vote']['voter_identifier'],
+                    number_of_votes=record['vote']['number_of_votes'],
+                    vote_amount=Decimal(record['vote']['vote_amount']),
+                    payment_status='pending'
+                )
+                for record in records
+            ])
+
+            fraud_detections = []
+            audit_logs = []
+            for vote, record in zip(votes, records):
+                fraud = record['fraud']
+                fraud_detections.append(build_fraud_detection(
+                    vote, fraud['device_fingerprint'], fraud['risk_score'], fraud['fraud_flags'],
+                    fraud.get('evaluated_rules')
+                ))
+                audit_logs.extend(build_audit_logs(
+                    vote, fraud['is_valid'], fraud['error_message'], fraud['risk_score'], fraud['fraud_flags']
+                ))
+
+            VoteFraudDetection.objects.bulk_create(fraud_detections)
+            VoteAuditLog.objects.bulk_create(audit_logs)
+            votes_bulk_created.send(sender=Vote, votes=votes, fraud_detections=fraud_detections)
+
+        return len(votes)
+
+    def replay_orphaned_spools(self):
+        """Ingest spool files written by processes that are no longer running"""
+        for path in self.spool_dir.glob('votes-*.jsonl'):
+            if self._owner_alive(path):
+                continue
+
+            claimed = path.with_suffix(f'.replay-{os.getpid()}')
+            try:
+                path.rename(claimed)
+            except OSError:
+                continue  # another process claimed it first
+
+            records = []
+            with open(claimed, encoding='utf-8') as spool:
+                for line in spool:
+                    if line.strip():
+                        records.append(json.loads(line))
+
+            try:
+                inserted = 0
+                for start in range(0, len(records), self.max_batch):
+                    written, rejected = self._write_isolating(records[start:start + self.max_batch])
+                    if rejected:
+                        self._dead_letter(rejected)
+                    inserted += written
+                claimed.unlink()
+                logger.info(f"Replayed {inserted} buffered votes from {path.name}")
+            except Exception as e:
+                # Already written records are skipped by ticket on the next replay
+                claimed.rename(path)
+                logger.error(f"Replaying {path.name} failed: {e}", exc_info=True)
+
+    def _segment_path(self, segment):
+        return self.spool_dir / f"votes-{os.getpid()}-{segment}.jsonl"
+
+    def spool_segments(self):
+        """This process's spool segments, oldest first"""
+        paths = self.spool_dir.glob(f"votes-{os.getpid()}-*.jsonl")
+        return sorted(paths, key=lambda path: int(path.stem.rsplit('-', 1)[1]))
+
+    @staticmethod
+    def _owner_alive(path):
+        """Spools are named votes-<pid>-<segment>.jsonl (votes-<pid>.jsonl before segments)"""
+        try:
+            pid = int(path.stem.split('-')[1])
+            os.kill(pid, 0)
+        except (ValueError, IndexError, ProcessLookupError):
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def ingestion_mode():
+    return getattr(settings, 'VOTE_INGESTION_MODE', 'direct')
+
+
+def get_ingestion_buffer():
+    """Process-wide buffer, started on first use"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                buffer = VoteIngestionBuffer(
+                    spool_dir=settings.VOTE_INGESTION_SPOOL_DIR,
+                    flush_interval_ms=settings.VOTE_INGESTION_FLUSH_INTERVAL_MS,
+                    max_batch=settings.VOTE_INGESTION_MAX_BATCH,
+                )
+                buffer.start()
+                _buffer = buffer
+    return _buffer
@@ -0,0 +1,72 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from Event.fast_serializers import event_rows, serialize_events
+from Event.models import Event, EventCategory, EventCategoryContestant
+from Event.serializers import EventSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time EventSerializer against the fast serializers on a synthetic event tree (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=5)
+        parser.add_argument('--contestants', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        user = get_user_model().objects.create(username='benchmark-serializers')
+        events = Event.objects.bulk_create(
+            Event(creator=user, name=f'Benchmark {i}', bio='Synthetic', published=True, amount_per_vote='1.50')
+            for i in range(options['events'])
+        )
+        categories = EventCategory.objects.bulk_create(
+            EventCategory(event=event, name=f'Category {j}')
+            for event in events for j in range(options['categories'])
+        )
+        EventCategoryContestant.objects.bulk_create(
+            EventCategoryContestant(category=category, name=f'Contestant {k}', photo=f'contestants_photos/{k}.jpg')
+            for category in categories for k in range(options['contestants'])
+        )
+
+        request = RequestFactory().get('/event/published/')
+        ids = [event.id for event in events]
+
+        def drf():
+            queryset = Event.objects.filter(id__in=ids).order_by('id').select_related('creator').prefetch_related(
+                'eventcategory_set', 'eventcategory_set__contestants'
+            )
+            return EventSerializer(queryset, many=True, context={'request': request}).data
+
+        def fast():
+            return serialize_events(event_rows(Event.objects.filter(id__in=ids).order_by('id')), request=request)
+
+        renderer = JSONRenderer()
+        identical = renderer.render(drf()) == renderer.render(fast())
+        self.stdout.write(f"{len(events)} events, {len(categories)} categories; identical JSON: {identical}")
+
+        for label, build in (('EventSerializer', drf), ('fast_serializers', fast)):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                renderer.render(build())
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(f"{label:<18} best {min(timings) * 1000:8.1f} ms  mean {sum(timings) / len(timings) * 1000:8.1f} ms")
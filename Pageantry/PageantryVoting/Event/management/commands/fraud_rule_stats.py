@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from Event.rules import FraudRuleEngine, rule_stats
+
+
+class Command(BaseCommand):
+    help = "Show per-rule latency, hit rate and short-circuit counts for the fraud rule engine"
+
+    def handle(self, *args, **options):
+        rules = FraudRuleEngine().ordered_rules()
+        report = rule_stats.snapshot([rule.name for rule in rules])
+
+        self.stdout.write(f"{'rule':<22} {'cost':<7} {'calls':>8} {'skipped':>8} {'hit rate':>9} {'mean ms':>9}")
+        for rule in rules:
+            stats = report[rule.name]
+            self.stdout.write(
+                f"{rule.name:<22} {rule.cost:<7} {stats['calls']:>8} {stats['skipped']:>8} "
+                f"{stats['hit_rate']:>9.1%} {stats['mean_ms']:>9.3f}"
+            )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from Event.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search documents of all published events (normally kept up to date by signals)"
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(f"Reindexed {count} events")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Event', '0012_emailreputation_ipreputation_voteauditlog_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='ingestion_ticket',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Event', '0013_vote_ingestion_ticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='vote_rate_limits',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Event', '0014_event_vote_rate_limits'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['voter_identifier', 'created_at'], name='Event_vote_voter_i_4052b5_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Event', '0015_vote_voter_identifier_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['published', '-start_time', '-id'], name='Event_event_publish_d65456_idx'),
+        ),
+    ]
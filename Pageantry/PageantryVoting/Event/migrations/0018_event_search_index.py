@@ -0,0 +1,106 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE event_search_fts USING fts5(
+        name, bio, categories, contestants,
+        content='{table}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER event_search_ai AFTER INSERT ON "{table}" BEGIN
+        INSERT INTO event_search_fts(rowid, name, bio, categories, contestants)
+        VALUES (new.id, new.name, new.bio, new.categories, new.contestants);
+    END
+    """,
+    """
+    CREATE TRIGGER event_search_ad AFTER DELETE ON "{table}" BEGIN
+        INSERT INTO event_search_fts(event_search_fts, rowid, name, bio, categories, contestants)
+        VALUES ('delete', old.id, old.name, old.bio, old.categories, old.contestants);
+    END
+    """,
+    """
+    CREATE TRIGGER event_search_au AFTER UPDATE ON "{table}" BEGIN
+        INSERT INTO event_search_fts(event_search_fts, rowid, name, bio, categories, contestants)
+        VALUES ('delete', old.id, old.name, old.bio, old.categories, old.contestants);
+        INSERT INTO event_search_fts(rowid, name, bio, categories, contestants)
+        VALUES (new.id, new.name, new.bio, new.categories, new.contestants);
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS event_search_au",
+    "DROP TRIGGER IF EXISTS event_search_ad",
+    "DROP TRIGGER IF EXISTS event_search_ai",
+    "DROP TABLE IF EXISTS event_search_fts",
+]
+
+# Must match the SearchVector built in Event/search.py for the index to be used
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX event_search_vector_idx ON "{table}" USING GIN ((
+        setweight(to_tsvector('english'::regconfig, COALESCE(name, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, COALESCE(contestants, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, COALESCE(categories, '')), 'C') ||
+        setweight(to_tsvector('english'::regconfig, COALESCE(bio, '')), 'D')
+    ))
+    """,
+    'CREATE INDEX event_search_name_trgm_idx ON "{table}" USING GIN (name gin_trgm_ops)',
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS event_search_name_trgm_idx",
+    "DROP INDEX IF EXISTS event_search_vector_idx",
+]
+
+
+def _run(statements, apps, schema_editor):
+    table = apps.get_model('Event', 'EventSearchDocument')._meta.db_table
+    for statement in statements:
+        schema_editor.execute(statement.format(table=table))
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(SQLITE_FORWARD, apps, schema_editor)
+    elif vendor == 'postgresql':
+        _run(POSTGRES_FORWARD, apps, schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(SQLITE_REVERSE, apps, schema_editor)
+    elif vendor == 'postgresql':
+        _run(POSTGRES_REVERSE, apps, schema_editor)
+
+
+def index_published_events(apps, schema_editor):
+    Event = apps.get_model('Event', 'Event')
+    EventSearchDocument = apps.get_model('Event', 'EventSearchDocument')
+    for event in Event.objects.filter(published=True).prefetch_related('eventcategory_set__contestants'):
+        categories = list(event.eventcategory_set.all())
+        EventSearchDocument.objects.update_or_create(event=event, defaults={
+            'name': event.name,
+            'bio': event.bio,
+            'categories': '\n'.join(category.name for category in categories),
+            'contestants': '\n'.join(
+                contestant.name for category in categories for contestant in category.contestants.all()
+            ),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Event', '0017_eventsearchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(index_published_events, migrations.RunPython.noop),
+    ]
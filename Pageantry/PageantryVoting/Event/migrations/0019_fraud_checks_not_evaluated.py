@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Event', '0018_event_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='votefrauddetection',
+            name='behavioral_check_passed',
+            field=models.BooleanField(default=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='votefrauddetection',
+            name='email_reputation_passed',
+            field=models.BooleanField(default=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='votefrauddetection',
+            name='geographic_check_passed',
+            field=models.BooleanField(default=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='votefrauddetection',
+            name='ip_reputation_passed',
+            field=models.BooleanField(default=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='votefrauddetection',
+            name='velocity_check_passed',
+            field=models.BooleanField(default=True, null=True),
+        ),
+    ]
@@ -13,12 +13,16 @@ class Event(models.Model):
     start_time =models.DateTimeField(blank=True, null=True)
     end_time =models.DateTimeField(blank=True, null=True)
     published = models.BooleanField(blank=True, default=False)
+    vote_rate_limits = models.JSONField(default=dict, blank=True)  # Overrides for ratelimit.DEFAULT_LIMITS, e.g. {"ip_hour": 50}
  
 
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['creator', 'name'], condition=models.Q(published=False), name='unique_unpublished_event_by_creator')
         ]
+        indexes = [
+            models.Index(fields=['published', '-start_time', '-id']),  # keyset pagination of published events
+        ]
         
     def __str__(self):
         return f"{self.name} by {self.creator and self.creator.username}"
@@ -56,6 +60,13 @@ class EventCategoryContestant(models.Model):
 
 class Vote(models.Model):
     """Track individual votes for contestants in published events"""
+    # Fields the analytics aggregates depend on; their loaded values are remembered
+    # so a save can tell which of them really changed
+    TRACKED_FIELDS = (
+        'event_id', 'contestant_id', 'voter_email', 'number_of_votes',
+        'vote_amount', 'payment_status', 'created_at',
+    )
+    
     contestant = models.ForeignKey('EventCategoryContestant', on_delete=models.CASCADE, related_name='votes')
     event = models.ForeignKey('Event', on_delete=models.CASCADE, related_name='votes')
     voter_ip = models.GenericIPAddressField()  # Track by IP address for rate limiting
@@ -74,6 +85,7 @@ class Vote(models.Model):
         default='pending'
     )
     payment_reference = models.CharField(max_length=255, blank=True, null=True)  # Payment transaction ID
+    ingestion_ticket = models.UUIDField(blank=True, null=True, unique=True, editable=False)  # Ticket issued by buffered ingestion
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -83,11 +95,46 @@ class Vote(models.Model):
             models.Index(fields=['voter_ip', 'event']),
             models.Index(fields=['voter_email', 'event']),
             models.Index(fields=['contestant', 'created_at']),
+            models.Index(fields=['voter_identifier', 'created_at']),
         ]
     
     def __str__(self):
         return f"{self.number_of_votes} votes for {self.contestant.name} by {self.voter_email or self.voter_ip}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_state()
+        return instance
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._remember_state()
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_state()
+    
+    def _remember_state(self):
+        # Unknown when a tracked field was deferred (e.g. loaded with .only())
+        deferred = self.get_deferred_fields()
+        self._loaded_state = None if deferred.intersection(self.TRACKED_FIELDS) else self.tracked_state()
+    
+    def tracked_state(self):
+        return {field: getattr(self, field) for field in self.TRACKED_FIELDS}
+    
+    @property
+    def loaded_state(self):
+        """Tracked values as last loaded or saved (None for new or partially loaded votes)"""
+        return getattr(self, '_loaded_state', None)
+    
+    def changed_fields(self):
+        """Tracked fields changed since the vote was loaded or saved (None if unknown)"""
+        loaded = self.loaded_state
+        if loaded is None:
+            return None
+        return {field for field, value in self.tracked_state().items() if loaded[field] != value}
+    
     def calculate_total_cost(self):
         """Calculate total cost based on number of votes and amount per vote"""
         return self.number_of_votes * self.event.amount_per_vote
@@ -101,11 +148,12 @@ class VoteFraudDetection(models.Model):
     fraud_flags = models.JSONField(default=list, blank=True)  # List of fraud indicators
     is_quarantined = models.BooleanField(default=False)  # If vote is under review
     is_suspicious = models.BooleanField(default=False)  # If vote is flagged as suspicious
-    velocity_check_passed = models.BooleanField(default=True)
-    behavioral_check_passed = models.BooleanField(default=True)
-    geographic_check_passed = models.BooleanField(default=True)
-    ip_reputation_passed = models.BooleanField(default=True)
-    email_reputation_passed = models.BooleanField(default=True)
+    # None: the check was skipped once the verdict was decided (see rules.FraudRuleEngine)
+    velocity_check_passed = models.BooleanField(null=True, default=True)
+    behavioral_check_passed = models.BooleanField(null=True, default=True)
+    geographic_check_passed = models.BooleanField(null=True, default=True)
+    ip_reputation_passed = models.BooleanField(null=True, default=True)
+    email_reputation_passed = models.BooleanField(null=True, default=True)
     request_signature = models.CharField(max_length=255, blank=True)  # HMAC signature of vote
     vote_integrity_hash = models.CharField(max_length=255, blank=True)  # SHA256 hash for integrity
     created_at = models.DateTimeField(auto_now_add=True)
@@ -181,4 +229,16 @@ class EmailReputation(models.Model):
     last_checked = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.email} - Valid: {self.is_valid}"
\ No newline at end of file
+        return f"{self.email} - Valid: {self.is_valid}"
+
+class EventSearchDocument(models.Model):
+    """Denormalized search text for a published event (indexed by the full-text search backend, see search.py)"""
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, related_name='search_document')
+    name = models.CharField(max_length=25)
+    bio = models.TextField(blank=True)
+    categories = models.TextField(blank=True)  # Category names, one per line
+    contestants = models.TextField(blank=True)  # Contestant names, one per line
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Search document for {self.name}"
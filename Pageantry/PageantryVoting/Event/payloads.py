@@ -0,0 +1,82 @@
+"""
+Versioned Payload Cache
+- Serialized responses cached under the version of the data they were built from;
+  a mutation bumps the version, so stale entries are never read again and expire
+- Single-flight: on a miss only the worker holding the build lock serializes,
+  the others wait briefly for its result
+"""
+
+import hashlib
+import logging
+import time
+import uuid
+
+from django.core.cache import cache
+
+from .fast_serializers import event_rows, serialize_events
+from .models import Event
+from .versions import get_version
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_TIMEOUT = 3600
+LOCK_TIMEOUT = 10
+WAIT_SECONDS = 2.0
+POLL_SECONDS = 0.05
+
+_MISSING = object()
+
+
+def single_flight(key, build, clock=time.monotonic, sleep=time.sleep):
+    """
+    Cached value for `key`, building it with `build()` when missing.
+    `build()` may return None (nothing to cache, e.g. not found).
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f"{key}:building"
+    token = uuid.uuid4().hex
+    acquired = cache.add(lock_key, token, timeout=LOCK_TIMEOUT)
+    if not acquired:
+        deadline = clock() + WAIT_SECONDS
+        while clock() < deadline:
+            sleep(POLL_SECONDS)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        logger.warning(f"Timed out waiting for {key}; building it here")
+
+    try:
+        value = build()
+        if value is not None:
+            cache.set(key, value, timeout=PAYLOAD_TIMEOUT)
+        return value
+    finally:
+        # Only the builder releases the lock, and only while it still holds it
+        if acquired and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def event_detail_version(event_id):
+    return get_version('event', event_id)
+
+
+def event_detail_etag(event_id, version):
+    return f'"event-{event_id}-{version}"'
+
+
+def get_event_detail(event_id, request, version):
+    """Serialized published event tree for a version (None if it is not published)"""
+    # Image URLs are absolute, so entries are kept per site root
+    site = hashlib.md5(request.build_absolute_uri('/').encode()).hexdigest()[:12]
+    key = f"eventdetail:{event_id}:{version}:{site}"
+
+    def build():
+        rows = event_rows(Event.objects.filter(id=event_id, published=True))
+        if not rows:
+            return None
+        return serialize_events(rows, request=request)[0]
+
+    return single_flight(key, build)
@@ -0,0 +1,155 @@
+"""
+Vote Rate Limiting
+- Sliding-window counters kept in the shared cache with atomic incr
+- acquire() counts a request before comparing, so concurrent requests cannot
+  all pass the same check; release() takes a rejected request back out
+- Every window is estimated from the current and previous fixed bucket
+  (previous bucket weighted by how much of it still overlaps the window)
+- Limits can be overridden per event through Event.vote_rate_limits
+"""
+
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = {
+    'hour': 3600,
+    'day': 86400,
+}
+
+# Limit names are "<scope>_<window>", e.g. "ip_hour"
+DEFAULT_LIMITS = {
+    'ip_hour': 100,
+    'ip_day': 500,
+    'email_hour': 50,
+    'email_day': 200,
+}
+
+
+def resolve_limits(overrides=None):
+    """Merge per-event overrides over the defaults, ignoring unknown or invalid entries"""
+    limits = dict(DEFAULT_LIMITS)
+    for name, value in (overrides or {}).items():
+        if name not in limits:
+            logger.warning(f"Ignoring unknown rate limit '{name}'")
+            continue
+        try:
+            limits[name] = int(value)
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring invalid rate limit {name}={value!r}")
+    return limits
+
+
+class SlidingWindowLimiter:
+    """
+    Per-event sliding-window limiter.
+
+    Counters are plain integers so they can be bumped with cache.incr, which is
+    atomic on shared backends (Redis, Memcached) and therefore correct across
+    worker processes. All windows are read with a single get_many.
+    """
+
+    KEY_PREFIX = 'ratelimit'
+
+    def __init__(self, event_id, identities, limits=None, clock=time.time):
+        # identities: {'ip': '1.2.3.4', 'email': 'a@b.com'}; empty identities are skipped
+        self.event_id = event_id
+        self.identities = {scope: value for scope, value in identities.items() if value}
+        self.limits = resolve_limits(limits)
+        self.clock = clock
+        self.held = {}  # bucket key -> votes counted by acquire() or hit()
+
+    def _windows(self):
+        for name, limit in self.limits.items():
+            scope, window = name.split('_', 1)
+            if scope in self.identities:
+                yield name, scope, window, limit
+
+    def _key(self, scope, window, bucket):
+        return f"{self.KEY_PREFIX}:{self.event_id}:{scope}:{self.identities[scope]}:{window}:{bucket}"
+
+    def usage(self):
+        """Estimated number of votes in every window, keyed by limit name"""
+        now = self.clock()
+        plan = {}
+        for name, scope, window, _ in self._windows():
+            size = WINDOW_SECONDS[window]
+            bucket = int(now // size)
+            overlap = 1 - (now % size) / size
+            plan[name] = (self._key(scope, window, bucket), self._key(scope, window, bucket - 1), overlap)
+
+        keys = [key for current, previous, _ in plan.values() for key in (current, previous)]
+        counts = cache.get_many(keys) if keys else {}
+
+        return {
+            name: counts.get(current, 0) + int(counts.get(previous, 0) * overlap)
+            for name, (current, previous, overlap) in plan.items()
+        }
+
+    def exceeded(self, amount):
+        """Limits that `amount` more votes would exceed: {name: current_usage}"""
+        usage = self.usage()
+        return {
+            name: usage[name]
+            for name, _, _, limit in self._windows()
+            if usage[name] + amount > limit
+        }
+
+    def acquire(self, amount):
+        """
+        Count `amount` votes against every window, then compare: returns the
+        limits now exceeded as {name: usage before this request}
+        """
+        now = self.clock()
+        counted = {}
+        previous = {}
+        for name, scope, window, _ in self._windows():
+            size = WINDOW_SECONDS[window]
+            bucket = int(now // size)
+            key = self._key(scope, window, bucket)
+            counted[name] = self._incr(key, amount, size * 2)
+            self.held[key] = self.held.get(key, 0) + amount
+            previous[name] = (self._key(scope, window, bucket - 1), 1 - (now % size) / size)
+
+        counts = cache.get_many([key for key, _ in previous.values()]) if previous else {}
+        usage = {
+            name: counted[name] + int(counts.get(key, 0) * overlap)
+            for name, (key, overlap) in previous.items()
+        }
+        return {
+            name: usage[name] - amount
+            for name, _, _, limit in self._windows()
+            if usage[name] > limit
+        }
+
+    def hit(self, amount):
+        """Count `amount` votes against every window"""
+        now = self.clock()
+        for name, scope, window, _ in self._windows():
+            size = WINDOW_SECONDS[window]
+            key = self._key(scope, window, int(now // size))
+            self._incr(key, amount, size * 2)
+            self.held[key] = self.held.get(key, 0) + amount
+
+    def release(self):
+        """Take back every vote this limiter counted (the request was rejected)"""
+        for key, amount in self.held.items():
+            try:
+                cache.decr(key, amount)
+            except ValueError:
+                # Bucket expired: nothing left to take back
+                pass
+        self.held = {}
+
+    def _incr(self, key, amount, timeout):
+        # Keep the bucket alive while it can still be the "previous" bucket
+        cache.add(key, 0, timeout=timeout)
+        try:
+            return cache.incr(key, amount)
+        except ValueError:
+            # Expired between add and incr
+            cache.add(key, amount, timeout=timeout)
+            return amount
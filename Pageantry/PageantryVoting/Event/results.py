@@ -0,0 +1,78 @@
+"""
+Event Results
+- Every category and contestant of an event with vote-weighted totals
+  (completed payments only) from one grouped query
+- Cached per event, keyed by the tally version (votes) and the catalog
+  version (names, photos, categories)
+"""
+
+import logging
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db.models import F, Q, Sum
+
+from .models import Event, EventCategory
+from .versions import get_version
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'results'
+CACHE_TIMEOUT = 86400
+
+COMPLETED = Q(contestants__votes__payment_status='completed')
+
+
+def build_results(event_id):
+    """Results payload for a published event, or None if it is not published"""
+    event = Event.objects.filter(id=event_id, published=True).values('id', 'name').first()
+    if event is None:
+        return None
+
+    # LEFT JOINs from the category side keep categories without contestants
+    rows = EventCategory.objects.filter(event_id=event_id).values(
+        'id', 'name',
+        'contestants__id', 'contestants__name', 'contestants__bio',
+        'contestants__hobby', 'contestants__photo',
+    ).annotate(
+        vote_count=Sum('contestants__votes__number_of_votes', filter=COMPLETED),
+        total_votes_amount=Sum('contestants__votes__vote_amount', filter=COMPLETED),
+    ).order_by('id', F('vote_count').desc(nulls_last=True), 'contestants__id')
+
+    categories = {}
+    for row in rows:
+        category = categories.setdefault(row['id'], {
+            'id': row['id'],
+            'name': row['name'],
+            'contestants': [],
+        })
+        if row['contestants__id'] is None:
+            continue
+        photo = row['contestants__photo']
+        category['contestants'].append({
+            'id': row['contestants__id'],
+            'name': row['contestants__name'],
+            'bio': row['contestants__bio'],
+            'hobby': row['contestants__hobby'],
+            'photo': default_storage.url(photo) if photo else None,
+            'category': row['id'],
+            'vote_count': row['vote_count'] or 0,
+            'total_votes_amount': row['total_votes_amount'] or 0,
+        })
+
+    return {
+        "event_id": event['id'],
+        "event_name": event['name'],
+        "categories": list(categories.values()),
+    }
+
+
+def get_results(event_id):
+    """Cached results for the current tally and catalog versions"""
+    key = f"{KEY_PREFIX}:{event_id}:{get_version('tally', event_id)}:{get_version('catalog')}"
+    results = cache.get(key)
+    if results is None:
+        results = build_results(event_id)
+        if results is not None:
+            cache.set(key, results, timeout=CACHE_TIMEOUT)
+    return results
@@ -0,0 +1,176 @@
+"""
+Fraud Rule Engine
+- Every fraud check is a rule that declares its cost class and the most risk it can add
+- Rules run cheapest first and evaluation stops as soon as the verdict is decided;
+  rules with side effects (always=True, e.g. recording device history) still run
+- Per-rule latency and hit rate are accumulated for tuning
+"""
+
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Cost classes, cheapest first
+COST_HEADER = 'header'  # request headers only
+COST_CACHE = 'cache'    # shared cache reads
+COST_DB = 'db'          # database queries
+COST_ORDER = {COST_HEADER: 0, COST_CACHE: 1, COST_DB: 2}
+
+
+class FraudRule:
+    """
+    A single fraud check. Subclasses implement evaluate(manager), which adds to
+    manager.risk_score and manager.fraud_flags like the VoteSecurityManager checks.
+    """
+    name = None
+    cost = COST_DB
+    max_score = 100
+    always = False  # has side effects later votes depend on: never short-circuited
+
+    def evaluate(self, manager):
+        raise NotImplementedError
+
+
+class CheckRule(FraudRule):
+    """Rule backed by one of VoteSecurityManager's _check_* methods"""
+
+    def __init__(self, name, method, cost, max_score, always=False):
+        self.name = name
+        self.method = method
+        self.cost = cost
+        self.max_score = max_score
+        self.always = always
+
+    def evaluate(self, manager):
+        getattr(manager, self.method)()
+
+
+_registry = []
+
+
+def register_rule(rule):
+    """Add a rule to the default engine; usable as a class decorator for FraudRule subclasses"""
+    instance = rule() if isinstance(rule, type) else rule
+    _registry.append(instance)
+    return rule
+
+
+for _rule in [
+    CheckRule('suspicious_markers', '_check_suspicious_markers', COST_HEADER, 80),
+    CheckRule('geographic_anomalies', '_check_geographic_anomalies', COST_HEADER, 0),
+    CheckRule('rate_limits', '_check_rate_limits', COST_CACHE, 90),
+    CheckRule('ip_reputation', '_check_ip_reputation', COST_CACHE, 85),
+    CheckRule('behavioral_anomalies', '_check_behavioral_anomalies', COST_CACHE, 45),
+    CheckRule('velocity', '_check_velocity', COST_CACHE, 30),
+    CheckRule('voting_patterns', '_detect_voting_patterns', COST_CACHE, 25),
+    CheckRule('email_reputation', '_check_email_reputation', COST_CACHE, 25),
+    CheckRule('device_fingerprint', '_check_device_fingerprint', COST_CACHE, 15, always=True),
+]:
+    register_rule(_rule)
+
+
+class RuleStats:
+    """
+    Per-rule counters. Accumulated in-process and folded into the shared cache
+    every FLUSH_EVERY evaluations so all workers contribute to the same totals.
+    """
+
+    KEY_PREFIX = 'fraudrules'
+    FIELDS = ('calls', 'hits', 'skipped', 'micros')
+    FLUSH_EVERY = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = {}
+        self._pending = 0
+
+    def record(self, name, field, amount=1):
+        with self._lock:
+            counters = self._local.setdefault(name, dict.fromkeys(self.FIELDS, 0))
+            counters[field] += amount
+            if field == 'calls':
+                self._pending += 1
+                if self._pending >= self.FLUSH_EVERY:
+                    self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        for name, counters in self._local.items():
+            for field, amount in counters.items():
+                if not amount:
+                    continue
+                key = f"{self.KEY_PREFIX}:{name}:{field}"
+                cache.add(key, 0, timeout=None)
+                try:
+                    cache.incr(key, amount)
+                except ValueError:
+                    cache.set(key, amount, timeout=None)
+        self._local = {}
+        self._pending = 0
+
+    def snapshot(self, names):
+        """Totals per rule with derived hit rate and mean latency"""
+        self.flush()
+        keys = [f"{self.KEY_PREFIX}:{name}:{field}" for name in names for field in self.FIELDS]
+        values = cache.get_many(keys)
+
+        report = {}
+        for name in names:
+            counters = {field: values.get(f"{self.KEY_PREFIX}:{name}:{field}", 0) for field in self.FIELDS}
+            calls = counters['calls']
+            counters['hit_rate'] = counters['hits'] / calls if calls else 0.0
+            counters['mean_ms'] = counters['micros'] / calls / 1000 if calls else 0.0
+            report[name] = counters
+        return report
+
+
+rule_stats = RuleStats()
+
+
+class FraudRuleEngine:
+    """Evaluates rules cheapest first and short-circuits once the verdict is known"""
+
+    def __init__(self, rules=None, stats=rule_stats):
+        self.rules = rules
+        self.stats = stats
+
+    def ordered_rules(self):
+        rules = self.rules if self.rules is not None else _registry
+        return sorted(rules, key=lambda rule: (COST_ORDER.get(rule.cost, len(COST_ORDER)), -rule.max_score))
+
+    def run(self, manager, threshold):
+        """Evaluate rules against a VoteSecurityManager; returns the names that ran"""
+        rules = self.ordered_rules()
+        remaining = sum(rule.max_score for rule in rules)
+        evaluated = []
+        decided = False
+
+        for rule in rules:
+            # Rejected already, or the remaining rules cannot reach the threshold
+            decided = decided or manager.risk_score >= threshold or manager.risk_score + remaining < threshold
+            remaining -= rule.max_score
+            if decided and not rule.always:
+                self.stats.record(rule.name, 'skipped')
+                continue
+
+            before = manager.risk_score
+            started = time.perf_counter()
+            try:
+                rule.evaluate(manager)
+            finally:
+                elapsed = time.perf_counter() - started
+                self.stats.record(rule.name, 'calls')
+                self.stats.record(rule.name, 'micros', int(elapsed * 1_000_000))
+            if manager.risk_score > before:
+                self.stats.record(rule.name, 'hits')
+
+            evaluated.append(rule.name)
+
+        return evaluated
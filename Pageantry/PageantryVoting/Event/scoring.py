@@ -0,0 +1,173 @@
+"""
+Deferred Fraud Scoring
+- Votes are recorded immediately and scored by a background worker pool
+- The request headers the checks need are kept on the vote_created audit log,
+  so a vote can still be scored after a restart
+- The payment callback scores any deferred vote the pool has not reached yet
+  before the vote can be completed; votes scored when cast are left alone
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+from .models import Vote, VoteFraudDetection, VoteAuditLog
+from .catalog import get_catalog
+from .ingestion import build_fraud_detection
+from .security import VoteSecurityManager
+
+logger = logging.getLogger(__name__)
+
+# Request headers read by VoteSecurityManager
+SCORED_META_KEYS = (
+    'HTTP_USER_AGENT', 'HTTP_ACCEPT', 'HTTP_ACCEPT_LANGUAGE', 'HTTP_ACCEPT_ENCODING',
+    'HTTP_REFERER', 'HTTP_X_FORWARDED_FOR', 'REMOTE_ADDR',
+)
+
+
+def scoring_mode():
+    return getattr(settings, 'VOTE_FRAUD_SCORING', 'sync')
+
+
+def snapshot_request_meta(request):
+    """The subset of request.META needed to score a vote later"""
+    return {key: request.META[key] for key in SCORED_META_KEYS if key in request.META}
+
+
+def score_vote(vote, request_meta):
+    """
+    Run the fraud checks for a recorded vote and store the VoteFraudDetection.
+    Idempotent: a vote that already has a fraud detection record is left alone.
+    """
+    existing = VoteFraudDetection.objects.filter(vote=vote).first()
+    if existing:
+        return existing
+
+    # Checks are measured from when the vote was cast, not when the pool reaches it
+    cast_at = vote.created_at.timestamp()
+    security_manager = VoteSecurityManager(
+        SimpleNamespace(META=request_meta), vote.event_id, vote.voter_email, vote.number_of_votes,
+        rate_limits=_event_rate_limits(vote), vote_id=vote.id, at=cast_at
+    )
+    is_valid, error_message, risk_score, fraud_flags = security_manager.validate_vote()
+
+    try:
+        with transaction.atomic():
+            fraud_detection = build_fraud_detection(
+                vote, security_manager.fingerprint, risk_score, fraud_flags, security_manager.evaluated_rules
+            )
+            fraud_detection.save()
+            if not is_valid:
+                VoteAuditLog.objects.create(
+                    vote=vote,
+                    action='fraud_detected',
+                    description=error_message,
+                    actor='fraud_scoring',
+                    ip_address=vote.voter_ip,
+                    metadata={'risk_score': risk_score, 'fraud_flags': fraud_flags}
+                )
+            elif risk_score > 0:
+                VoteAuditLog.objects.create(
+                    vote=vote,
+                    action='vote_flagged',
+                    description=f'Vote flagged for review - Risk Score: {risk_score}',
+                    actor='fraud_scoring',
+                    ip_address=vote.voter_ip,
+                    metadata={'fraud_flags': fraud_flags}
+                )
+    except IntegrityError:
+        # Scored concurrently by the pool and the payment callback
+        return VoteFraudDetection.objects.get(vote=vote)
+
+    security_manager.record_vote(vote.contestant_id, at=cast_at, vote_id=vote.id)
+    return fraud_detection
+
+
+def _event_rate_limits(vote):
+    entry = get_catalog().lookup(vote.contestant_id)
+    return entry.vote_rate_limits if entry else None
+
+
+def deferred_log(vote):
+    """The vote_created audit log of a vote recorded for deferred scoring, or None"""
+    return VoteAuditLog.objects.filter(vote=vote, action='vote_created', metadata__scoring='deferred').first()
+
+
+def ensure_scored(vote):
+    """
+    Make sure a vote recorded for deferred scoring has been scored, waiting for
+    or overtaking the worker pool. Returns None for votes scored when they were
+    cast (or cast before deferred scoring existed): those are never re-scored.
+    """
+    created_log = deferred_log(vote)
+    if created_log is None:
+        return None
+
+    fraud_detection = VoteFraudDetection.objects.filter(vote=vote).first()
+    if fraud_detection:
+        return fraud_detection
+
+    future = get_scoring_pool().pending(vote.id)
+    if future is not None:
+        try:
+            future.result(timeout=settings.VOTE_FRAUD_SCORING_WAIT_SECONDS)
+        except Exception as e:
+            logger.warning(f"Waiting for deferred scoring of vote {vote.id} failed: {e}")
+        fraud_detection = VoteFraudDetection.objects.filter(vote=vote).first()
+        if fraud_detection:
+            return fraud_detection
+
+    return score_vote(vote, created_log.metadata.get('request_meta', {}))
+
+
+class FraudScoringPool:
+    """Thread pool that scores recorded votes off the request path"""
+
+    def __init__(self, max_workers):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fraud-scoring')
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, vote_id, request_meta):
+        future = self.executor.submit(self._score, vote_id, request_meta)
+        with self._lock:
+            self._futures[vote_id] = future
+        future.add_done_callback(lambda _: self._forget(vote_id))
+        return future
+
+    def pending(self, vote_id):
+        with self._lock:
+            return self._futures.get(vote_id)
+
+    def _forget(self, vote_id):
+        with self._lock:
+            self._futures.pop(vote_id, None)
+
+    @staticmethod
+    def _score(vote_id, request_meta):
+        try:
+            vote = Vote.objects.filter(pk=vote_id).first()
+            if vote:
+                score_vote(vote, request_meta)
+        except Exception as e:
+            logger.error(f"Deferred fraud scoring failed for vote {vote_id}: {e}", exc_info=True)
+            raise
+        finally:
+            close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_scoring_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = FraudScoringPool(settings.VOTE_FRAUD_SCORING_WORKERS)
+    return _pool
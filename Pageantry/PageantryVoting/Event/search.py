@@ -0,0 +1,180 @@
+"""
+Published Event Search
+- One EventSearchDocument per published event holds its name, bio, category
+  names and contestant names
+- SQLite: FTS5 table kept in sync with the documents by triggers, ranked by bm25
+- PostgreSQL: weighted tsvector (GIN expression index) ranked by ts_rank, with a
+  trigram match on the name when full-text finds nothing (typos)
+- Documents are rebuilt after commit whenever an event, category or contestant changes
+"""
+
+import logging
+import re
+import threading
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Event, EventCategory, EventSearchDocument
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+# bm25 column weights, in FTS column order: name, bio, categories, contestants
+FTS_WEIGHTS = (10.0, 1.0, 3.0, 5.0)
+TRIGRAM_THRESHOLD = 0.3
+
+_pending = threading.local()
+
+
+# Indexing
+
+def index_event(event_id):
+    """Create, refresh or drop the search document of an event"""
+    event = Event.objects.filter(id=event_id, published=True).prefetch_related('eventcategory_set__contestants').first()
+    if event is None:
+        EventSearchDocument.objects.filter(event_id=event_id).delete()
+        return
+
+    categories = list(event.eventcategory_set.all())
+    EventSearchDocument.objects.update_or_create(event=event, defaults={
+        'name': event.name,
+        'bio': event.bio,
+        'categories': '\n'.join(category.name for category in categories),
+        'contestants': '\n'.join(
+            contestant.name for category in categories for contestant in category.contestants.all()
+        ),
+    })
+
+
+def schedule_reindex(event_id):
+    """Reindex an event once the current transaction commits (once per event per commit)"""
+    if event_id is None:
+        return
+    pending = _pending_events()
+    pending.add(event_id)
+    transaction.on_commit(lambda: _flush(event_id))
+
+
+def _pending_events():
+    if not hasattr(_pending, 'events'):
+        _pending.events = set()
+    return _pending.events
+
+
+def _flush(event_id):
+    pending = _pending_events()
+    if event_id not in pending:
+        return
+    pending.discard(event_id)
+    try:
+        index_event(event_id)
+    except Exception as e:
+        logger.error(f"Search reindex failed for event {event_id}: {e}", exc_info=True)
+
+
+def rebuild_index():
+    """Reindex every event that has or should have a search document"""
+    event_ids = set(Event.objects.filter(published=True).values_list('id', flat=True))
+    event_ids |= set(EventSearchDocument.objects.values_list('event_id', flat=True))
+    for event_id in event_ids:
+        index_event(event_id)
+    return len(event_ids)
+
+
+def event_id_for_category(category_id):
+    return EventCategory.objects.filter(id=category_id).values_list('event_id', flat=True).first()
+
+
+# Querying
+
+def page_size(value):
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def search_events(query, page=1, limit=DEFAULT_PAGE_SIZE):
+    """
+    Ranked ids of published events matching `query`.
+    Returns (event_ids, has_next) for the requested 1-based page.
+    """
+    terms = re.findall(r'\w+', query or '')
+    if not terms:
+        return [], False
+
+    offset = (page - 1) * limit
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        event_ids = _search_sqlite(terms, offset, limit + 1)
+    elif vendor == 'postgresql':
+        event_ids = _search_postgres(' '.join(terms), offset, limit + 1)
+    else:
+        event_ids = _search_fallback(terms, offset, limit + 1)
+
+    return event_ids[:limit], len(event_ids) > limit
+
+
+def _search_sqlite(terms, offset, limit):
+    # Every term must match; the last one as a prefix so results follow the user's typing
+    match = ' '.join(f'"{term}"' for term in terms[:-1])
+    match = f'{match} "{terms[-1]}"*'.strip()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT document.event_id
+            FROM event_search_fts
+            JOIN "{EventSearchDocument._meta.db_table}" AS document ON document.id = event_search_fts.rowid
+            WHERE event_search_fts MATCH %s
+            ORDER BY bm25(event_search_fts, {', '.join(str(weight) for weight in FTS_WEIGHTS)}), document.event_id
+            LIMIT %s OFFSET %s
+            """,
+            [match, limit, offset]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_postgres(text, offset, limit):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+
+    # Same expression as the GIN index created in migration 0018
+    vector = (
+        SearchVector('name', weight='A', config='english')
+        + SearchVector('contestants', weight='B', config='english')
+        + SearchVector('categories', weight='C', config='english')
+        + SearchVector('bio', weight='D', config='english')
+    )
+    search_query = SearchQuery(text, search_type='websearch', config='english')
+    event_ids = list(
+        EventSearchDocument.objects.annotate(rank=SearchRank(vector, search_query))
+        .filter(rank__gt=0)
+        .order_by('-rank', 'event_id')
+        .values_list('event_id', flat=True)[offset:offset + limit]
+    )
+    if event_ids or offset:
+        return event_ids
+
+    return list(
+        EventSearchDocument.objects.annotate(similarity=TrigramSimilarity('name', text))
+        .filter(similarity__gte=TRIGRAM_THRESHOLD)
+        .order_by('-similarity', 'event_id')
+        .values_list('event_id', flat=True)[:limit]
+    )
+
+
+def _search_fallback(terms, offset, limit):
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(name__icontains=term) | Q(bio__icontains=term)
+            | Q(categories__icontains=term) | Q(contestants__icontains=term)
+        )
+    return list(
+        EventSearchDocument.objects.filter(condition)
+        .order_by('event_id')
+        .values_list('event_id', flat=True)[offset:offset + limit]
+    )
@@ -7,12 +7,15 @@ import hashlib
 import hmac
 import json
 import logging
+import time
 from datetime import timedelta
 from functools import wraps
-from django.utils import timezone
 from django.core.cache import cache
 from django.conf import settings
 from .models import Vote, VoteFraudDetection, VoteAuditLog
+from .ratelimit import SlidingWindowLimiter
+from .features import VoterFeatureStore
+from .rules import FraudRuleEngine
 
 logger = logging.getLogger(__name__)
 
@@ -20,24 +23,40 @@ logger = logging.getLogger(__name__)
 class VoteSecurityManager:
     """Advanced security manager for vote validation and fraud detection"""
     
-    # Security constants
-    MAX_VOTES_PER_HOUR_PER_IP = 100
-    MAX_VOTES_PER_DAY_PER_IP = 500
-    MAX_VOTES_PER_HOUR_PER_EMAIL = 50
-    MAX_VOTES_PER_DAY_PER_EMAIL = 200
+    # Security constants (rate limits live in ratelimit.DEFAULT_LIMITS)
     SUSPICIOUS_VOTE_THRESHOLD = 5  # Risk score threshold for flagging
     VELOCITY_CHECK_WINDOW_MINUTES = 15
     MAX_VOTES_PER_WINDOW = 10
     
-    def __init__(self, request, event_id, voter_email, number_of_votes):
+    rule_engine = FraudRuleEngine()
+    
+    RATE_LIMIT_RISK = {
+        'hour': 20,
+        'day': 25,
+    }
+    
+    def __init__(self, request, event_id, voter_email, number_of_votes, rate_limits=None, vote_id=None, at=None):
+        # `at`: Unix timestamp the velocity and behavioral checks are measured from (default: now)
         self.request = request
         self.event_id = event_id
         self.voter_email = voter_email
         self.number_of_votes = number_of_votes
         self.voter_ip = self._get_client_ip()
+        self.rate_limiter = SlidingWindowLimiter(
+            event_id,
+            {'ip': self.voter_ip, 'email': voter_email},
+            limits=rate_limits
+        )
+        # A vote scored after it was written must not count itself in its features
+        self.features = VoterFeatureStore(
+            self._create_voter_identifier(), event_id,
+            clock=time.time if at is None else (lambda: at), exclude_vote_id=vote_id
+        )
         self.fingerprint = None
         self.risk_score = 0
         self.fraud_flags = []
+        self.evaluated_rules = []
+        self.rejected = False
     
     def validate_vote(self):
         """
@@ -45,70 +64,43 @@ class VoteSecurityManager:
         Returns: (is_valid, error_message, risk_score, fraud_flags)
         """
         try:
-            # Run all security checks
-            self._check_rate_limits()
-            self._check_velocity()
-            self._check_device_fingerprint()
-            self._check_behavioral_anomalies()
-            self._check_geographic_anomalies()
-            self._check_ip_reputation()
-            self._check_email_reputation()
-            self._detect_voting_patterns()
-            self._check_suspicious_markers()
+            self.fingerprint = self._generate_device_fingerprint()
+            
+            # Run security checks cheapest first, stopping once the verdict is decided
+            self.evaluated_rules = self.rule_engine.run(self, self.SUSPICIOUS_VOTE_THRESHOLD)
             
             # Determine if vote should be accepted
             if self.risk_score >= self.SUSPICIOUS_VOTE_THRESHOLD:
+                # Rejected votes do not use up the voter's rate limits
+                self.rate_limiter.release()
+                self.rejected = True
                 return False, f"Vote flagged as suspicious (Risk Score: {self.risk_score})", self.risk_score, self.fraud_flags
             
             return True, "", self.risk_score, self.fraud_flags
         
         except Exception as e:
             logger.error(f"Security validation error: {e}", exc_info=True)
+            self.rate_limiter.release()
+            self.rejected = True
             return False, "Security validation error", 100, ["system_error"]
     
     def _check_rate_limits(self):
-        """Check rate limits per IP and email"""
-        cache_key_ip_hour = f"votes:ip:{self.voter_ip}:hour"
-        cache_key_ip_day = f"votes:ip:{self.voter_ip}:day"
-        cache_key_email_hour = f"votes:email:{self.voter_email}:hour"
-        cache_key_email_day = f"votes:email:{self.voter_email}:day"
-        
-        # Check hourly limits
-        ip_votes_hour = cache.get(cache_key_ip_hour, 0)
-        if ip_votes_hour + self.number_of_votes > self.MAX_VOTES_PER_HOUR_PER_IP:
-            self.fraud_flags.append(f"rate_limit_ip_hour:{ip_votes_hour}")
-            self.risk_score += 20
-        
-        # Check daily limits
-        ip_votes_day = cache.get(cache_key_ip_day, 0)
-        if ip_votes_day + self.number_of_votes > self.MAX_VOTES_PER_DAY_PER_IP:
-            self.fraud_flags.append(f"rate_limit_ip_day:{ip_votes_day}")
-            self.risk_score += 25
-        
-        # Email-based rate limiting
-        if self.voter_email:
-            email_votes_hour = cache.get(cache_key_email_hour, 0)
-            if email_votes_hour + self.number_of_votes > self.MAX_VOTES_PER_HOUR_PER_EMAIL:
-                self.fraud_flags.append(f"rate_limit_email_hour:{email_votes_hour}")
-                self.risk_score += 20
-            
-            email_votes_day = cache.get(cache_key_email_day, 0)
-            if email_votes_day + self.number_of_votes > self.MAX_VOTES_PER_DAY_PER_EMAIL:
-                self.fraud_flags.append(f"rate_limit_email_day:{email_votes_day}")
-                self.risk_score += 25
+        """Check sliding-window rate limits per IP and email (counting this vote first)"""
+        for name, current in self.rate_limiter.acquire(self.number_of_votes).items():
+            window = name.split('_', 1)[1]
+            self.fraud_flags.append(f"rate_limit_{name}:{current}")
+            self.risk_score += self.RATE_LIMIT_RISK[window]
+    
+    def record_vote(self, contestant_id, at=None, vote_id=None):
+        """Count a written vote against the rate limit windows and voter features"""
+        # Already counted when the limits were checked; rejected votes are not counted
+        if not self.rate_limiter.held and not self.rejected:
+            self.rate_limiter.hit(self.number_of_votes)
+        self.features.record(contestant_id, self.number_of_votes, at=at, vote_id=vote_id)
     
     def _check_velocity(self):
         """Detect rapid successive voting (bot-like behavior)"""
-        cutoff_time = timezone.now() - timedelta(minutes=self.VELOCITY_CHECK_WINDOW_MINUTES)
-        voter_identifier = self._create_voter_identifier()
-        
-        recent_votes = Vote.objects.filter(
-            voter_identifier=voter_identifier,
-            event_id=self.event_id,
-            created_at__gte=cutoff_time
-        ).aggregate(models.Sum('number_of_votes'))
-        
-        recent_count = recent_votes['number_of_votes__sum'] or 0
+        recent_count = self.features.recent_votes()
         
         if recent_count + self.number_of_votes > self.MAX_VOTES_PER_WINDOW:
             self.fraud_flags.append(f"velocity_check:{recent_count}")
@@ -116,7 +108,6 @@ class VoteSecurityManager:
     
     def _check_device_fingerprint(self):
         """Analyze device fingerprint for anomalies"""
-        self.fingerprint = self._generate_device_fingerprint()
         cache_key = f"fingerprint:{self.fingerprint}:events"
         
         events_voted = cache.get(cache_key, [])
@@ -133,26 +124,17 @@ class VoteSecurityManager:
     
     def _check_behavioral_anomalies(self):
         """Detect unusual voting behavior patterns"""
-        voter_identifier = self._create_voter_identifier()
-        
-        # Get voter's voting history
-        voter_history = Vote.objects.filter(
-            voter_identifier=voter_identifier
-        ).order_by('-created_at')[:10]
+        transactions = self.features.transaction_count()
         
-        if voter_history.exists():
-            # Check voting consistency
-            avg_votes_per_transaction = sum(v.number_of_votes for v in voter_history) / len(voter_history)
-            
+        if transactions:
             # If suddenly voting much more than usual, flag it
-            if self.number_of_votes > avg_votes_per_transaction * 3:
+            if self.number_of_votes > self.features.mean_votes_per_transaction() * 3:
                 self.fraud_flags.append(f"abnormal_voting_volume:{self.number_of_votes}")
                 self.risk_score += 20
             
             # Check time interval pattern
-            if len(voter_history) > 1:
-                prev_vote = voter_history[0]
-                time_diff = (timezone.now() - prev_vote.created_at).total_seconds()
+            if transactions > 1:
+                time_diff = self.features.clock() - self.features.last_vote_at()
                 
                 # Too frequent voting (less than 5 minutes apart)
                 if time_diff < 300:
@@ -205,17 +187,10 @@ class VoteSecurityManager:
     def _detect_voting_patterns(self):
         """Detect suspicious voting patterns within an event"""
         # Check for concentrated voting on single contestant
-        voter_identifier = self._create_voter_identifier()
-        votes_by_contestant = Vote.objects.filter(
-            voter_identifier=voter_identifier,
-            event_id=self.event_id
-        ).values('contestant_id').annotate(count=models.Count('id'))
-        
-        if votes_by_contestant.exists():
-            max_votes_per_contestant = max(v['count'] for v in votes_by_contestant)
-            if max_votes_per_contestant > 50:
-                self.fraud_flags.append(f"concentrated_voting:{max_votes_per_contestant}")
-                self.risk_score += 25
+        max_votes_per_contestant = self.features.max_contestant_count()
+        if max_votes_per_contestant > 50:
+            self.fraud_flags.append(f"concentrated_voting:{max_votes_per_contestant}")
+            self.risk_score += 25
     
     def _check_suspicious_markers(self):
         """Check for various suspicious request markers"""
@@ -328,17 +303,7 @@ class VoteSecurityManager:
         Generate cryptographic signature for vote integrity
         Used to verify vote hasn't been tampered with
         """
-        if secret is None:
-            secret = settings.SECRET_KEY
-        
-        message = f"{vote_id}:{self.event_id}:{self.voter_ip}"
-        signature = hmac.new(
-            secret.encode(),
-            message.encode(),
-            hashlib.sha256
-        ).hexdigest()
-        
-        return signature
+        return sign_vote(vote_id, self.event_id, self.voter_ip, secret)
     
     def verify_vote_signature(self, vote_id, signature, secret=None):
         """Verify vote signature for integrity"""
@@ -346,6 +311,19 @@ class VoteSecurityManager:
         return hmac.compare_digest(signature, expected_signature)
 
 
+def sign_vote(vote_id, event_id, voter_ip, secret=None):
+    """HMAC signature of a vote, usable without the originating request"""
+    if secret is None:
+        secret = settings.SECRET_KEY
+    
+    message = f"{vote_id}:{event_id}:{voter_ip}"
+    return hmac.new(
+        secret.encode(),
+        message.encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+
 class VoteIntegrityValidator:
     """Validate vote data integrity and prevent tampering"""
     
@@ -71,7 +71,7 @@ class VoteSerializer(serializers.ModelSerializer):
 
 
 class ContestantWithVotesSerializer(serializers.ModelSerializer):
-    """Contestant with vote count for leaderboard"""
+    """Contestant with completed vote totals for leaderboard (uses vote_count/total_votes_amount annotations when present)"""
     vote_count = serializers.SerializerMethodField()
     total_votes_amount = serializers.SerializerMethodField()
     
@@ -80,8 +80,13 @@ class ContestantWithVotesSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'bio', 'hobby', 'photo', 'category', 'vote_count', 'total_votes_amount']
     
     def get_vote_count(self, obj):
-        return obj.votes.count()
+        if hasattr(obj, 'vote_count'):
+            return obj.vote_count or 0
+        total = obj.votes.filter(payment_status='completed').aggregate(models.Sum('number_of_votes'))['number_of_votes__sum']
+        return total or 0
     
     def get_total_votes_amount(self, obj):
-        total = obj.votes.aggregate(models.Sum('vote_amount'))['vote_amount__sum']
+        if hasattr(obj, 'total_votes_amount'):
+            return obj.total_votes_amount or 0
+        total = obj.votes.filter(payment_status='completed').aggregate(models.Sum('vote_amount'))['vote_amount__sum']
         return total or 0
\ No newline at end of file
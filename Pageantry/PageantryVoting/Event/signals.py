@@ -1,5 +1,59 @@
-from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import Signal, receiver
 
-@receiver(post_save, Event)
-def assign_user_to_event(sender, instance, created, **kwargs):
-    instanc
\ No newline at end of file
+from .models import Event, EventCategory, EventCategoryContestant
+from .catalog import invalidate_catalog
+from .search import event_id_for_category, schedule_reindex
+from .versions import bump_version
+
+# Sent after buffered ingestion writes votes with bulk_create (which skips post_save).
+# Arguments: votes, fraud_detections
+votes_bulk_created = Signal()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=EventCategory)
+@receiver(post_delete, sender=EventCategory)
+@receiver(post_save, sender=EventCategoryContestant)
+@receiver(post_delete, sender=EventCategoryContestant)
+def invalidate_published_catalog(sender, instance, **kwargs):
+    """Any change to events, categories or contestants invalidates the vote catalog"""
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def reindex_event_search(sender, instance, **kwargs):
+    """Keep the event's search document and version in step with its name, bio and publish state"""
+    _event_changed(instance.id)
+
+
+@receiver(post_save, sender=EventCategory)
+@receiver(post_delete, sender=EventCategory)
+def reindex_category_search(sender, instance, **kwargs):
+    _event_changed(instance.event_id)
+
+
+@receiver(post_save, sender=EventCategoryContestant)
+@receiver(post_delete, sender=EventCategoryContestant)
+def reindex_contestant_search(sender, instance, **kwargs):
+    _event_changed(event_id_for_category(instance.category_id))
+
+
+def _event_changed(event_id):
+    if event_id is None:
+        return
+    schedule_reindex(event_id)
+    transaction.on_commit(lambda: _bump_event_versions(event_id))
+
+
+def _bump_event_versions(event_id):
+    """
+    Per-event version plus an 'events' version that moves on any change; in-process
+    indexes (e.g. autocomplete) watch the latter and reload only the events whose
+    own version moved. The event version is bumped first so it is never behind.
+    """
+    bump_version('event', event_id)
+    bump_version('events')
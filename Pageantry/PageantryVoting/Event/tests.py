@@ -1,3 +1,770 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, models
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from Analytics.models import EventAnalytics
+from .models import Event, EventCategory, EventCategoryContestant, Vote, VoteFraudDetection, VoteAuditLog
+from .ingestion import VoteIngestionBuffer, build_fraud_detection
+from .ratelimit import SlidingWindowLimiter
+from .security import VoteSecurityManager
+from .features import VoterFeatureStore
+from .scoring import deferred_log, score_vote
+from .catalog import get_catalog
+from .autocomplete import AutocompleteIndex, Suggestion
+from .payloads import single_flight
+from .fast_serializers import event_rows, serialize_events
+from .serializers import EventSerializer
+from .rules import COST_CACHE, COST_DB, COST_HEADER, CheckRule, FraudRule, FraudRuleEngine, RuleStats
+
+User = get_user_model()
+
+
+class EventTestMixin:
+    """Shared event/category/contestant fixture"""
+    
+    VOTER_HEADERS = {
+        'HTTP_USER_AGENT': 'Mozilla/5.0',
+        'HTTP_ACCEPT': 'application/json',
+        'HTTP_REFERER': 'http://localhost:5173/vote',
+    }
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='organizer', email='organizer@test.com', password='testpass123')
+        self.event = Event.objects.create(creator=self.user, name='Finale', amount_per_vote=1.00)
+        self.category = EventCategory.objects.create(event=self.event, name='Main')
+        self.contestant = EventCategoryContestant.objects.create(category=self.category, name='Ama')
+    
+    def _cast_vote(self, number_of_votes=1, voter_email='voter@example.org', **headers):
+        return self.client.post(
+            f'/event/{self.event.id}/vote/{self.contestant.id}/',
+            {'voter_email': voter_email, 'number_of_votes': number_of_votes},
+            **{**self.VOTER_HEADERS, **headers}
+        )
+
+
+class VoteIngestionBufferTestCase(EventTestMixin, TestCase):
+    """Test the write-behind vote buffer"""
+    
+    def setUp(self):
+        super().setUp()
+        self.spool_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.spool_dir, ignore_errors=True)
+    
+    def _record(self, risk_score=0):
+        return {
+            'vote': {
+                'contestant_id': self.contestant.id,
+                'event_id': self.event.id,
+                'voter_ip': '10.0.0.1',
+                'voter_email': 'voter@test.com',
+                'voter_identifier': 'abc',
+                'number_of_votes': 2,
+                'vote_amount': '2.00',
+            },
+            'fraud': {
+                'device_fingerprint': 'fp',
+                'risk_score': risk_score,
+                'fraud_flags': [],
+                'is_valid': True,
+                'error_message': '',
+            },
+        }
+    
+    def test_flush_bulk_inserts_all_tables(self):
+        """Buffered votes land in Vote, VoteFraudDetection and VoteAuditLog on flush"""
+        buffer = VoteIngestionBuffer(self.spool_dir)
+        tickets = [buffer.submit(self._record()) for _ in range(3)]
+        tickets.append(buffer.submit(self._record(risk_score=2)))
+        
+        self.assertEqual(sum(len(path.read_text().splitlines()) for path in buffer.spool_segments()), 4)
+        self.assertEqual(Vote.objects.count(), 0)
+        
+        self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(Vote.objects.filter(ingestion_ticket__in=tickets).count(), 4)
+        self.assertEqual(VoteFraudDetection.objects.count(), 4)
+        self.assertEqual(VoteAuditLog.objects.filter(action='vote_created').count(), 4)
+        self.assertEqual(VoteAuditLog.objects.filter(action='vote_flagged').count(), 1)
+        self.assertEqual(buffer.spool_segments(), [])
+        self.assertEqual(EventAnalytics.objects.get(event=self.event).pending_payments, 4)
+    
+    def test_orphaned_spool_is_replayed_once(self):
+        """Spool files of dead processes are ingested, and replays never duplicate votes"""
+        record = dict(self._record(), ticket='6f1c1c4e-8a77-4d0b-9a55-0d7d3c9f0a11')
+        orphan = self.spool_dir / 'votes-999999999.jsonl'
+        orphan.write_text(json.dumps(record) + '\n')
+        
+        buffer = VoteIngestionBuffer(self.spool_dir)
+        buffer.replay_orphaned_spools()
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertFalse(orphan.exists())
+        
+        self.assertEqual(VoteIngestionBuffer.write_batch([record]), 0)
+        self.assertEqual(Vote.objects.count(), 1)
+    
+    def test_waiting_submitters_share_one_fsync(self):
+        buffer = VoteIngestionBuffer(self.spool_dir)
+        with mock.patch('Event.ingestion.os.fsync') as fsync:
+            # Hold the sync lock while three submitters queue up behind it
+            with buffer._sync_lock:
+                threads = [threading.Thread(target=buffer.submit, args=(self._record(),)) for _ in range(3)]
+                for thread in threads:
+                    thread.start()
+                while buffer._submitted < 3:
+                    time.sleep(0.001)
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(fsync.call_count, 1)
+        self.assertEqual(len(buffer.spool_segments()[0].read_text().splitlines()), 3)
+        self.assertEqual(buffer.flush(), 3)
+    
+    def test_flushed_segments_are_deleted_not_rewritten(self):
+        """Votes submitted during a flush go to a new segment; the flushed one is removed"""
+        buffer = VoteIngestionBuffer(self.spool_dir)
+        buffer.submit(self._record())
+        segments_seen = []
+        
+        def write_batch(records):
+            segments_seen.append([path.name for path in buffer.spool_segments()])
+            if len(segments_seen) == 1:
+                buffer.submit(self._record())
+            return VoteIngestionBuffer.write_batch(records)
+        
+        with mock.patch.object(buffer, 'write_batch', side_effect=write_batch):
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(segments_seen[1], [buffer._segment_path(1).name])
+        self.assertEqual(buffer.spool_segments(), [])
+    
+    def test_poison_record_is_dead_lettered(self):
+        """A record that cannot be written is set aside instead of blocking the rest"""
+        buffer = VoteIngestionBuffer(self.spool_dir, max_batch=2)
+        poison = self._record()
+        poison['vote']['vote_amount'] = 'not a number'
+        for record in (self._record(), poison, self._record()):
+            buffer.submit(record)
+        
+        with mock.patch.object(buffer, 'write_batch', wraps=buffer.write_batch) as write_batch:
+            with self.assertLogs('Event.ingestion', 'ERROR'):
+                self.assertEqual(buffer.flush(), 2)
+        self.assertLessEqual(max(len(call.args[0]) for call in write_batch.call_args_list), 2)
+        self.assertEqual(Vote.objects.count(), 2)
+        self.assertEqual(buffer.spool_segments(), [])
+        
+        dead = [json.loads(line) for line in buffer.dead_letter_path.read_text().splitlines()]
+        self.assertEqual([record['vote']['vote_amount'] for record in dead], ['not a number'])
+    
+    def test_connection_errors_keep_the_batch_pending(self):
+        buffer = VoteIngestionBuffer(self.spool_dir)
+        ticket = buffer.submit(self._record())
+        with mock.patch.object(buffer, 'write_batch', side_effect=OperationalError('gone')):
+            with self.assertLogs('Event.ingestion', 'ERROR'):
+                self.assertEqual(buffer.flush(), 0)
+        self.assertTrue(buffer.is_pending(ticket))
+        self.assertFalse(buffer.dead_letter_path.exists())
+        self.assertEqual(buffer.flush(), 1)
+
+
+class SlidingWindowLimiterTestCase(TestCase):
+    """Test the cache-backed sliding-window rate limiter"""
+    
+    def setUp(self):
+        cache.clear()
+        self.now = 3600 * 1000.0
+    
+    def _limiter(self, limits=None, event_id=1):
+        return SlidingWindowLimiter(
+            event_id, {'ip': '10.0.0.1', 'email': 'voter@test.com'},
+            limits=limits, clock=lambda: self.now
+        )
+    
+    def test_hits_are_counted_in_every_window(self):
+        limiter = self._limiter()
+        limiter.hit(30)
+        limiter.hit(30)
+        self.assertEqual(limiter.usage(), {'ip_hour': 60, 'ip_day': 60, 'email_hour': 60, 'email_day': 60})
+        self.assertEqual(limiter.exceeded(1), {'email_hour': 60})
+    
+    def test_previous_bucket_is_weighted_by_overlap(self):
+        limiter = self._limiter()
+        limiter.hit(40)
+        self.now += 3600 * 1.5
+        self.assertEqual(limiter.usage()['ip_hour'], 20)
+    
+    def test_acquire_counts_before_comparing(self):
+        first, second = self._limiter(limits={'ip_hour': 5}), self._limiter(limits={'ip_hour': 5})
+        self.assertNotIn('ip_hour', first.acquire(3))
+        # Checked concurrently with the first request, but sees its votes
+        self.assertEqual(second.acquire(3)['ip_hour'], 3)
+        
+        second.release()
+        self.assertEqual(self._limiter().usage()['ip_hour'], 3)
+        self.assertEqual(second.held, {})
+    
+    def test_rejected_votes_do_not_use_up_the_limit(self):
+        request = SimpleNamespace(META={'REMOTE_ADDR': '10.0.0.1'})
+        rules = FraudRuleEngine([CheckRule('rate_limits', '_check_rate_limits', COST_CACHE, 90)], stats=RuleStats())
+        with mock.patch.object(VoteSecurityManager, 'rule_engine', rules):
+            for accepted in (True, False):
+                manager = VoteSecurityManager(request, 1, 'voter@test.com', 3, rate_limits={'ip_hour': 5})
+                self.assertEqual(manager.validate_vote()[0], accepted)
+                manager.record_vote(contestant_id=1)
+        
+        self.assertEqual(SlidingWindowLimiter(1, {'ip': '10.0.0.1'}).usage()['ip_hour'], 3)
+    
+    def test_limits_are_configurable_per_event(self):
+        strict = self._limiter(limits={'ip_hour': 5})
+        strict.hit(5)
+        self.assertIn('ip_hour', strict.exceeded(1))
+        self.assertEqual(self._limiter(event_id=2).usage()['ip_hour'], 0)
+
+
+class VoterFeatureStoreTestCase(EventTestMixin, TestCase):
+    """Test the per-voter rolling features used by fraud scoring"""
+    
+    def test_features_roll_forward_incrementally(self):
+        now = [1_000_000.0]
+        store = VoterFeatureStore('voter-1', self.event.id, clock=lambda: now[0])
+        store.record(self.contestant.id, 4)
+        store.record(self.contestant.id, 2)
+        
+        reloaded = VoterFeatureStore('voter-1', self.event.id, clock=lambda: now[0])
+        self.assertEqual(reloaded.recent_votes(), 6)
+        self.assertEqual(reloaded.mean_votes_per_transaction(), 3)
+        self.assertEqual(reloaded.max_contestant_count(), 2)
+        self.assertEqual(reloaded.last_vote_at(), now[0])
+        
+        now[0] += 16 * 60
+        self.assertEqual(VoterFeatureStore('voter-1', self.event.id, clock=lambda: now[0]).recent_votes(), 0)
+    
+    def test_concurrent_records_are_all_counted(self):
+        first = VoterFeatureStore('voter-1', self.event.id).load()
+        second = VoterFeatureStore('voter-1', self.event.id).load()
+        first.record(self.contestant.id, 3)
+        second.record(self.contestant.id, 4)  # loaded before the first record
+        
+        reloaded = VoterFeatureStore('voter-1', self.event.id)
+        self.assertEqual(reloaded.recent_votes(), 7)
+        self.assertEqual(reloaded.transaction_count(), 2)
+    
+    def test_hydration_leaves_out_the_vote_being_recorded(self):
+        vote = Vote.objects.create(
+            event=self.event, contestant=self.contestant, voter_ip='10.0.0.1',
+            voter_identifier='voter-1', number_of_votes=5
+        )
+        store = VoterFeatureStore('voter-1', self.event.id, exclude_vote_id=vote.id)
+        self.assertEqual(store.recent_votes(), 0)
+        
+        cache.clear()
+        store.record(self.contestant.id, 5, vote_id=vote.id)
+        reloaded = VoterFeatureStore('voter-1', self.event.id)
+        self.assertEqual(reloaded.recent_votes(), 5)
+        self.assertEqual(reloaded.max_contestant_count(), 1)
+    
+    def test_vote_scoring_reads_features_instead_of_vote_history(self):
+        """Repeated votes are scored from the store and trip the velocity check"""
+        self.event.published = True
+        self.event.save()
+        
+        first = self._cast_vote(number_of_votes=6)
+        self.assertEqual(first.status_code, 201)
+        
+        second = self._cast_vote(number_of_votes=6)
+        self.assertEqual(second.status_code, 400)
+        self.assertIn('velocity_check:6', second.json()['data']['fraud_flags'])
+
+
+class PublishedCatalogTestCase(EventTestMixin, TestCase):
+    """Test the in-process published event catalog"""
+    
+    def test_lookup_is_query_free_once_built(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = True
+            self.event.save()
+        get_catalog()
+        
+        with self.assertNumQueries(0):
+            entry = get_catalog().lookup(self.contestant.id)
+        self.assertEqual(entry.event_id, self.event.id)
+        self.assertEqual(entry.category_id, self.category.id)
+    
+    def test_mutations_invalidate_the_catalog(self):
+        self.assertIsNone(get_catalog().lookup(self.contestant.id))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = True
+            self.event.save()
+        self.assertIsNotNone(get_catalog().lookup(self.contestant.id))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contestant.delete()
+        self.assertIsNone(get_catalog().lookup(self.contestant.id))
+    
+    def test_vote_for_contestant_of_another_event_is_rejected(self):
+        other = Event.objects.create(creator=self.user, name='Other', amount_per_vote=1.00, published=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = True
+            self.event.save()
+        
+        response = self.client.post(
+            f'/event/{other.id}/vote/{self.contestant.id}/',
+            {'voter_email': 'voter@example.org'}, **self.VOTER_HEADERS
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(VOTE_FRAUD_SCORING='deferred')
+class DeferredFraudScoringTestCase(EventTestMixin, TestCase):
+    """Test recording votes first and scoring them off the request path"""
+    
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = True
+            self.event.save()
+    
+    @mock.patch('Event.views.get_scoring_pool')
+    def test_vote_is_recorded_without_scoring(self, get_scoring_pool):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._cast_vote()
+        
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['data']['scoring'], 'pending')
+        self.assertFalse(VoteFraudDetection.objects.exists())
+        self.assertEqual(get_scoring_pool.return_value.submit.call_count, 1)
+    
+    def test_payment_callback_scores_before_completing(self):
+        with self.captureOnCommitCallbacks():
+            vote_id = self._cast_vote().json()['data']['vote_id']
+        
+        response = self.client.post(f'/event/vote/{vote_id}/payment/', {'payment_status': 'completed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(VoteFraudDetection.objects.filter(vote_id=vote_id).exists())
+        self.assertEqual(Vote.objects.get(pk=vote_id).payment_status, 'completed')
+    
+    def test_quarantined_vote_cannot_be_completed(self):
+        with self.captureOnCommitCallbacks():
+            vote_id = self._cast_vote(HTTP_USER_AGENT='curl/8.0').json()['data']['vote_id']
+        
+        response = self.client.post(f'/event/vote/{vote_id}/payment/', {'payment_status': 'completed'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Vote.objects.get(pk=vote_id).payment_status, 'pending')
+        self.assertIn('bot_user_agent', VoteFraudDetection.objects.get(vote_id=vote_id).fraud_flags)
+    
+    def test_votes_not_recorded_for_deferred_scoring_are_not_scored(self):
+        # Cast before deferred scoring existed: no fraud detection, no vote_created log
+        vote = Vote.objects.create(
+            event=self.event, contestant=self.contestant, voter_ip='10.0.0.1', payment_status='pending'
+        )
+        
+        response = self.client.post(f'/event/vote/{vote.id}/payment/', {'payment_status': 'completed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(VoteFraudDetection.objects.filter(vote=vote).exists())
+        self.assertEqual(Vote.objects.get(pk=vote.id).payment_status, 'completed')
+    
+    def test_checks_are_measured_from_when_the_vote_was_cast(self):
+        """Votes a minute apart are rapid even when the pool scores the last one an hour later"""
+        with self.captureOnCommitCallbacks():
+            vote_ids = [self._cast_vote().json()['data']['vote_id'] for _ in range(3)]
+        cast_at = timezone.now() - timedelta(hours=1)
+        for offset, vote_id in enumerate(vote_ids):
+            Vote.objects.filter(pk=vote_id).update(created_at=cast_at + timedelta(minutes=offset))
+        cache.clear()
+        
+        vote = Vote.objects.get(pk=vote_ids[-1])
+        fraud_detection = score_vote(vote, deferred_log(vote).metadata['request_meta'])
+        self.assertTrue(any(flag.startswith('rapid_sequential_voting:60') for flag in fraud_detection.fraud_flags))
+
+
+class FraudRuleEngineTestCase(TestCase):
+    """Test cost ordering, short-circuiting and per-rule stats"""
+    
+    class StubRule(FraudRule):
+        def __init__(self, name, cost, max_score, adds):
+            self.name = name
+            self.cost = cost
+            self.max_score = max_score
+            self.adds = adds
+        
+        def evaluate(self, manager):
+            manager.risk_score += self.adds
+    
+    def setUp(self):
+        cache.clear()
+        self.stats = RuleStats()
+    
+    def _run(self, rules, threshold=5):
+        manager = SimpleNamespace(risk_score=0, fraud_flags=[])
+        evaluated = FraudRuleEngine(rules, stats=self.stats).run(manager, threshold)
+        return manager, evaluated
+    
+    def test_cheap_rules_run_first(self):
+        rules = [
+            self.StubRule('db', COST_DB, 10, 0),
+            self.StubRule('cache', COST_CACHE, 10, 0),
+            self.StubRule('header', COST_HEADER, 10, 0),
+        ]
+        _, evaluated = self._run(rules)
+        self.assertEqual(evaluated, ['header', 'cache', 'db'])
+    
+    def test_stops_once_threshold_is_reached(self):
+        rules = [
+            self.StubRule('header', COST_HEADER, 40, 40),
+            self.StubRule('db', COST_DB, 30, 30),
+        ]
+        manager, evaluated = self._run(rules)
+        self.assertEqual(evaluated, ['header'])
+        self.assertEqual(manager.risk_score, 40)
+    
+    def test_stops_when_remaining_rules_cannot_reach_threshold(self):
+        rules = [
+            self.StubRule('header', COST_HEADER, 10, 0),
+            self.StubRule('db', COST_DB, 4, 4),
+        ]
+        _, evaluated = self._run(rules)
+        self.assertEqual(evaluated, ['header'])
+    
+    def test_stats_record_calls_hits_and_skips(self):
+        rules = [
+            self.StubRule('header', COST_HEADER, 40, 40),
+            self.StubRule('db', COST_DB, 30, 30),
+        ]
+        self._run(rules)
+        report = self.stats.snapshot(['header', 'db'])
+        self.assertEqual(report['header']['calls'], 1)
+        self.assertEqual(report['header']['hit_rate'], 1.0)
+        self.assertEqual(report['db']['calls'], 0)
+        self.assertEqual(report['db']['skipped'], 1)
+    
+    def test_rules_with_side_effects_run_after_the_verdict(self):
+        history = self.StubRule('history', COST_DB, 15, 0)
+        history.always = True
+        rules = [self.StubRule('header', COST_HEADER, 40, 40), self.StubRule('db', COST_DB, 30, 30), history]
+        _, evaluated = self._run(rules)
+        self.assertEqual(evaluated, ['header', 'history'])
+    
+    def test_skipped_checks_are_stored_as_not_evaluated(self):
+        vote = Vote(id=1, contestant_id=2, event_id=3, number_of_votes=1, voter_email='a@test.com', voter_ip='10.0.0.1')
+        detection = build_fraud_detection(vote, 'fp', 5, [], evaluated_rules=['suspicious_markers', 'velocity'])
+        self.assertTrue(detection.velocity_check_passed)
+        self.assertIsNone(detection.ip_reputation_passed)
+        self.assertIsNone(detection.email_reputation_passed)
+
+
+class EventResultsTestCase(EventTestMixin, TestCase):
+    """Test the grouped, cached results query"""
+    
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = True
+            self.event.save()
+            self.rival = EventCategoryContestant.objects.create(category=self.category, name='Efua')
+            EventCategory.objects.create(event=self.event, name='Empty')
+        self.url = f'/event/{self.event.id}/results/'
+    
+    def _vote(self, contestant, number_of_votes, payment_status='completed'):
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(
+                event=self.event, contestant=contestant, voter_ip='10.0.0.1', voter_email='voter@test.com',
+                number_of_votes=number_of_votes, vote_amount=number_of_votes, payment_status=payment_status
+            )
+    
+    def test_totals_are_vote_weighted_and_completed_only(self):
+        self._vote(self.contestant, 3)
+        self._vote(self.contestant, 4, payment_status='pending')
+        self._vote(self.rival, 2)
+        self._vote(self.rival, 2)
+        
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url).json()['data']
+        
+        main, empty = data['categories']
+        self.assertEqual(empty['contestants'], [])
+        self.assertEqual([(c['name'], c['vote_count']) for c in main['contestants']], [('Efua', 4), ('Ama', 3)])
+        self.assertEqual(main['contestants'][0]['total_votes_amount'], 4.0)
+    
+    def test_results_are_cached_until_votes_change(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        
+        self._vote(self.contestant, 5)
+        data = self.client.get(self.url).json()['data']
+        self.assertEqual(data['categories'][0]['contestants'][0]['vote_count'], 5)
+    
+    def test_unpublished_event_is_not_found(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = False
+            self.event.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class PublishedEventsListingTestCase(EventTestMixin, TestCase):
+    """Test keyset pagination of published events"""
+    
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        Event.objects.filter(pk=self.event.pk).update(published=True, start_time=now)
+        for i, start_time in enumerate([now - timedelta(days=1), now - timedelta(days=1), None, now + timedelta(days=1)]):
+            event = Event.objects.create(creator=self.user, name=f'Event {i}', published=True, start_time=start_time)
+            category = EventCategory.objects.create(event=event, name='Main')
+            EventCategoryContestant.objects.create(category=category, name=f'Contestant {i}')
+    
+    def test_pages_cover_every_event_once_in_order(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            body = self.client.get('/event/published/', params).json()
+            seen += [event['id'] for event in body['data']]
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+        
+        expected = [event.id for event in Event.objects.filter(published=True).order_by(
+            models.F('start_time').desc(nulls_last=True), '-id'
+        )]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 5)
+    
+    def test_query_count_does_not_grow_with_events(self):
+        with self.assertNumQueries(3):
+            self.client.get('/event/published/')
+        with self.assertNumQueries(2):
+            data = self.client.get('/event/published/', {'shallow': '1'}).json()['data']
+        self.assertEqual(set(data[0]['categories'][0]), {'id', 'name'})
+    
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/event/published/', {'cursor': 'nonsense'}).status_code, 400)
+
+
+class EventSearchTestCase(EventTestMixin, TestCase):
+    """Test the full-text event search"""
+    
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.bio = 'Annual campus pageant'
+            self.event.published = True
+            self.event.save()
+            self.other = Event.objects.create(creator=self.user, name='Miss Ama Beauty', published=True)
+            Event.objects.create(creator=self.user, name='Draft Finale')
+    
+    def _search(self, text, **params):
+        return self.client.get('/event/search/', {'event_kwargs': text, **params}).json()
+    
+    def test_matches_names_bios_categories_and_contestants_ranked(self):
+        # 'Ama' is a contestant of Finale but the name of the other event, which ranks higher
+        self.assertEqual([e['id'] for e in self._search('ama')['data']], [self.other.id, self.event.id])
+        self.assertEqual([e['id'] for e in self._search('campus')['data']], [self.event.id])
+        self.assertEqual([e['id'] for e in self._search('fin')['data']], [self.event.id])
+        self.assertEqual(self._search('draft')['data'], [])
+    
+    def test_index_follows_contestant_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            EventCategoryContestant.objects.create(category=self.category, name='Kukua')
+        self.assertEqual([e['id'] for e in self._search('kukua')['data']], [self.event.id])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = False
+            self.event.save()
+        self.assertEqual(self._search('kukua')['data'], [])
+    
+    def test_results_are_paginated(self):
+        body = self._search('ama', limit=1)
+        self.assertEqual(len(body['data']), 1)
+        self.assertTrue(body['has_next'])
+        self.assertFalse(self._search('ama', limit=1, page=2)['has_next'])
+
+
+class EventAutocompleteTestCase(EventTestMixin, TestCase):
+    """Test the in-memory typeahead index"""
+    
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = True
+            self.event.save()
+            self.other = Event.objects.create(creator=self.user, name='Miss Ámara Beauty', published=True)
+        ticks = iter(range(0, 10**6, 10))
+        self.index = AutocompleteIndex(clock=lambda: next(ticks))
+    
+    def _names(self, prefix):
+        return [suggestion.name for suggestion in self.index.complete(prefix)]
+    
+    def test_prefix_matches_names_and_inner_words(self):
+        self.assertEqual(self._names('am'), ['Ama', 'Miss Ámara Beauty'])
+        self.assertEqual(self._names('bea'), ['Miss Ámara Beauty'])
+        self.assertEqual(self._names('FIN'), ['Finale'])
+        self.assertEqual(self._names('zz'), [])
+    
+    def test_best_match_wins_over_earlier_keys(self):
+        self.index.complete('a')
+        # 300 inner-word matches sort before the full-name match
+        self.index._swap({
+            self.event.id: [
+                Suggestion('contestant', 1000 + i, self.event.id, f'Miss Aa{i:03}', 'Finale') for i in range(300)
+            ],
+            self.other.id: [Suggestion('event', self.other.id, self.other.id, 'Azure', 'Azure')],
+        })
+        
+        self.assertEqual(self._names('a')[:2], ['Azure', 'Miss Aa000'])
+    
+    def test_completion_does_not_query_once_loaded(self):
+        self.index.complete('a')
+        with self.assertNumQueries(0):
+            self.index.complete('fin')
+    
+    def test_only_changed_events_are_reloaded(self):
+        self.index.complete('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            EventCategoryContestant.objects.create(category=self.category, name='Abena')
+        
+        # Published ids, then names and contestants of the one changed event
+        with self.assertNumQueries(3):
+            self.assertEqual(self._names('abe'), ['Abena'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = False
+            self.event.save()
+        self.assertEqual(self._names('a'), ['Miss Ámara Beauty'])
+    
+    def test_endpoint_returns_suggestions(self):
+        with mock.patch('Event.views.get_autocomplete_index', return_value=self.index):
+            data = self.client.get('/event/autocomplete/', {'q': 'am'}).json()['data']
+        self.assertEqual(data[0], {
+            'type': 'contestant', 'id': self.contestant.id, 'event_id': self.event.id,
+            'name': 'Ama', 'event_name': 'Finale'
+        })
+
+
+class PublishedEventDetailCacheTestCase(EventTestMixin, TestCase):
+    """Test the versioned voting-page payload"""
+    
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = True
+            self.event.save()
+        self.url = f'/event/public/{self.event.id}/'
+    
+    def test_payload_is_cached_until_the_event_changes(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.json(), first.json())
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contestant.name = 'Ama Serwaa'
+            self.contestant.save()
+        changed = self.client.get(self.url)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(changed.json()['data']['categories'][0]['contestants'][0]['name'], 'Ama Serwaa')
+    
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+    
+    def test_unpublished_event_is_not_found(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.published = False
+            self.event.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+    
+    def test_single_flight_waits_for_the_builder(self):
+        cache.add('payload:building', 1)
+        clock = iter(range(100))
+        
+        def finish_build(seconds):
+            cache.set('payload', {'built': 'elsewhere'})
+        
+        build = mock.Mock(return_value={'built': 'here'})
+        value = single_flight('payload', build, clock=lambda: next(clock), sleep=finish_build)
+        self.assertEqual(value, {'built': 'elsewhere'})
+        build.assert_not_called()
+    
+    def test_single_flight_timed_out_waiter_keeps_the_builders_lock(self):
+        cache.add('payload:building', 'builder')
+        clock = iter(range(0, 100, 10))
+        
+        with self.assertLogs('Event.payloads', 'WARNING'):
+            value = single_flight('payload', lambda: {'built': 'here'}, clock=lambda: next(clock), sleep=lambda s: None)
+        self.assertEqual(value, {'built': 'here'})
+        self.assertEqual(cache.get('payload:building'), 'builder')
+
+
+class CategorySummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EventCategory
+        fields = ['id', 'name']
+
+
+class ShallowEventSerializer(EventSerializer):
+    """DRF reference for serialize_events(shallow=True): EventSerializer without contestants"""
+    categories = CategorySummarySerializer(source='eventcategory_set', many=True, read_only=True)
+
+
+class FastSerializersTestCase(EventTestMixin, TestCase):
+    """Test that the fast serializers render exactly what the DRF serializers do"""
+    
+    def setUp(self):
+        super().setUp()
+        self.event.bio = 'Grand finale'
+        self.event.banner = 'banners/finale.jpg'
+        self.event.amount_per_vote = '2.50'
+        self.event.start_time = timezone.now()
+        self.event.end_time = timezone.now() + timedelta(days=1)
+        self.event.published = True
+        self.event.save()
+        self.contestant.photo = 'contestants_photos/ama.jpg'
+        self.contestant.hobby = 'Singing'
+        self.contestant.save()
+        EventCategoryContestant.objects.create(category=self.category, name='Efua')
+        EventCategory.objects.create(event=self.event, name='Empty')
+        Event.objects.create(creator=self.user, name='Plain', published=True)
+        self.request = RequestFactory().get('/event/published/')
+    
+    def _render_both(self, serializer_class, shallow=False):
+        queryset = Event.objects.order_by('id')
+        expected = serializer_class(
+            queryset.select_related('creator').prefetch_related('eventcategory_set', 'eventcategory_set__contestants'),
+            many=True, context={'request': self.request}
+        ).data
+        fast = serialize_events(event_rows(queryset), request=self.request, shallow=shallow)
+        return JSONRenderer().render(expected), JSONRenderer().render(fast)
+    
+    def test_output_is_byte_identical(self):
+        expected, fast = self._render_both(EventSerializer)
+        self.assertEqual(fast, expected)
+        self.assertIn(b'"amount_per_vote":"2.50"', fast)
+        self.assertIn(b'http://testserver/', fast)
+    
+    def test_shallow_output_is_byte_identical(self):
+        expected, fast = self._render_both(ShallowEventSerializer, shallow=True)
+        self.assertEqual(fast, expected)
+    
+    def test_benchmark_command_runs_and_rolls_back(self):
+        out = StringIO()
+        call_command('benchmark_serializers', events=2, categories=2, contestants=2, repeat=1, stdout=out)
+        self.assertIn('identical JSON: True', out.getvalue())
+        self.assertEqual(Event.objects.count(), 2)
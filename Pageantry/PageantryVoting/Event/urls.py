@@ -9,8 +9,10 @@ from .views import (
     PublishEvent,
     VoteView,
     UpdateVotePaymentView,
+    VoteTicketView,
     EventResultsView,
-    SearchPublishedEvents
+    SearchPublishedEvents,
+    EventAutocomplete
 )
 from django.urls import path
 
@@ -30,6 +32,7 @@ urlpatterns = [
     
     # Voting endpoints (public)
     path('<int:event_id>/vote/<int:contestant_id>/', VoteView.as_view(), name='vote_contestant'),
+    path('vote/ticket/<uuid:ticket>/', VoteTicketView.as_view(), name='vote_ticket'),
     path('vote/<int:vote_id>/payment/', UpdateVotePaymentView.as_view(), name='update_vote_payment'),
     path('<int:event_id>/results/', EventResultsView.as_view(), name='event_results'),
     path('public/<int:event_id>/', ViewPublishedEventDetail.as_view(), name='view_published_event_detail'),
@@ -37,5 +40,6 @@ urlpatterns = [
     # View endpoints
     path('unpublished/', ViewUnpublishedEvents.as_view(), name='view_unpublished_events'),
     path('published/', ViewPublishedEvents.as_view(), name='view_published_events'),
-    path('search/',SearchPublishedEvents.as_view(),name='search_published_events')
+    path('search/',SearchPublishedEvents.as_view(),name='search_published_events'),
+    path('autocomplete/', EventAutocomplete.as_view(), name='event_autocomplete')
 ] 
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""
+Version Counters
+- Cache-backed counters bumped whenever the data behind a derived view changes
+- Workers compare versions instead of re-reading the database
+"""
+
+import time
+
+from django.core.cache import cache
+
+KEY_PREFIX = 'version'
+
+
+def _key(scope):
+    return ':'.join([KEY_PREFIX, *[str(part) for part in scope]])
+
+
+def _seed():
+    # Seeded from the clock so an evicted counter never repeats an old version
+    return int(time.time() * 1000)
+
+
+def get_version(*scope):
+    """Current version for a scope such as ('catalog',) or ('event', 12)"""
+    key = _key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _seed(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*scope):
+    """Move a scope to a new version"""
+    key = _key(scope)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), timeout=None)
+        return cache.get(key)
+
+
+def get_versions(scopes):
+    """Current versions of several scopes in one round trip: {scope: version}"""
+    keys = {tuple(scope): _key(scope) for scope in scopes}
+    found = cache.get_many(list(keys.values()))
+    return {
+        scope: found[key] if key in found else get_version(*scope)
+        for scope, key in keys.items()
+    }
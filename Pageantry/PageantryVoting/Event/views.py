@@ -7,9 +7,19 @@ import json
 import logging
 from django.db import transaction, models
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
 from .serializers import EventSerializer, EventCategorySerializer, EventCategoryContestantSerializer
-from .models import Event, EventCategory, EventCategoryContestant, Vote, VoteFraudDetection, VoteAuditLog
-from .security import VoteSecurityManager, VoteIntegrityValidator
+from .fast_serializers import EVENT_VALUES, event_rows, serialize_events
+from .models import Event, EventCategory, EventCategoryContestant, Vote, VoteAuditLog
+from .security import VoteSecurityManager
+from .catalog import get_catalog
+from .results import get_results
+from .cursors import DEFAULT_PAGE_SIZE, InvalidCursor, keyset_page, page_size
+from .search import DEFAULT_PAGE_SIZE as SEARCH_PAGE_SIZE, page_size as search_page_size, search_events
+from .payloads import event_detail_etag, event_detail_version, get_event_detail
+from .autocomplete import DEFAULT_LIMIT as AUTOCOMPLETE_LIMIT, MAX_LIMIT as AUTOCOMPLETE_MAX_LIMIT, get_autocomplete_index
+from .scoring import ensure_scored, get_scoring_pool, scoring_mode, snapshot_request_meta
+from .ingestion import build_fraud_detection, build_audit_logs, get_ingestion_buffer, ingestion_mode
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import AllowAny
 from django.db.models import Q
@@ -386,12 +396,34 @@ class ViewPublishedEvents(APIView):
     permission_classes = []  # No authentication required for viewing published events
 
     def get(self, request):
+        """
+        Query params:
+        - cursor: next_cursor from the previous page
+        - limit: page size (default 20, max 100)
+        - shallow: leave contestants out of the categories
+        """
         try: 
-            published_events = Event.objects.filter(published=True).order_by('-start_time')
-            serializer = EventSerializer(published_events, many=True, context={'request': request})
+            shallow = request.query_params.get('shallow', '').lower() in ('1', 'true', 'yes')
+            
+            # Constant query count: events, categories and (unless shallow) contestants
+            published_events = Event.objects.filter(published=True).values(*EVENT_VALUES)
+            
+            try:
+                events, next_cursor = keyset_page(
+                    published_events,
+                    cursor=request.query_params.get('cursor'),
+                    limit=page_size(request.query_params.get('limit', DEFAULT_PAGE_SIZE))
+                )
+            except InvalidCursor:
+                return Response({
+                    "status": "error",
+                    "statusText": "Invalid cursor"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
             return Response({
                 "status": "success",
-                "data": serializer.data
+                "data": serialize_events(events, request=request, shallow=shallow),
+                "next_cursor": next_cursor
             }, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Error fetching published events: {e}")
@@ -406,13 +438,27 @@ class ViewPublishedEventDetail(APIView):
     permission_classes = []  # No authentication required
 
     def get(self, request, event_id):
+        """Cached per event version; If-None-Match with the current ETag gets a 304"""
         try:
-            event = get_object_or_404(Event, id=event_id, published=True)
-            serializer = EventSerializer(event, context={'request': request})
-            return Response({
+            version = event_detail_version(event_id)
+            etag = event_detail_etag(event_id, version)
+            
+            if etag in parse_etags(request.headers.get('If-None-Match', '')) and get_catalog().is_published(event_id):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                return response
+            
+            data = get_event_detail(event_id, request, version)
+            if data is None:
+                raise Event.DoesNotExist
+            
+            response = Response({
                 "status": "success",
-                "data": serializer.data
+                "data": data
             }, status=status.HTTP_200_OK)
+            response['ETag'] = etag
+            response['Cache-Control'] = 'public, no-cache'
+            return response
         except Event.DoesNotExist:
             return Response({
                 "status": "error",
@@ -431,12 +477,18 @@ class VoteView(APIView):
 
     def post(self, request, event_id, contestant_id):
         try:
-            # Get event and contestant
-            event = get_object_or_404(Event, id=event_id, published=True)
-            contestant = get_object_or_404(EventCategoryContestant, id=contestant_id)
+            # Resolve event and contestant from the published catalog (no queries)
+            catalog = get_catalog()
+            if not catalog.is_published(event_id):
+                return Response({
+                    "status": "error",
+                    "statusText": "Event not found"
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            entry = catalog.lookup(contestant_id)
 
             # Validate contestant belongs to this event's categories
-            if contestant.category.event_id != event_id:
+            if entry is None or entry.event_id != event_id:
                 return Response({
                     "status": "error",
                     "statusText": "Contestant does not belong to this event"
@@ -462,77 +514,52 @@ class VoteView(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Advanced Security Check - Run comprehensive fraud detection
-            security_manager = VoteSecurityManager(request, event_id, voter_email, number_of_votes)
+            security_manager = VoteSecurityManager(
+                request, event_id, voter_email, number_of_votes,
+                rate_limits=entry.vote_rate_limits
+            )
+            
+            if scoring_mode() == 'deferred':
+                return self._record_for_deferred_scoring(
+                    request, entry, contestant_id, voter_ip, voter_email, number_of_votes, security_manager
+                )
+            
             is_valid, error_message, risk_score, fraud_flags = security_manager.validate_vote()
             
+            if ingestion_mode() == 'buffered':
+                return self._enqueue_vote(
+                    entry, contestant_id, voter_ip, voter_email, number_of_votes,
+                    security_manager, is_valid, error_message, risk_score, fraud_flags
+                )
+            
             # Create vote record with security details
             with transaction.atomic():
                 vote = Vote.objects.create(
-                    contestant=contestant,
-                    event=event,
+                    contestant_id=contestant_id,
+                    event_id=event_id,
                     voter_ip=voter_ip,
                     voter_email=voter_email,
                     voter_identifier=security_manager._create_voter_identifier(),
                     number_of_votes=number_of_votes,
-                    vote_amount=self._calculate_vote_cost(event, number_of_votes),
+                    vote_amount=self._calculate_vote_cost(entry, number_of_votes),
                     payment_status='pending'
                 )
                 
-                # Create fraud detection record
-                vote_data = {
-                    'vote_id': vote.id,
-                    'contestant_id': contestant_id,
-                    'event_id': event_id,
-                    'number_of_votes': number_of_votes,
-                    'voter_email': voter_email
-                }
-                integrity_hash = VoteIntegrityValidator.create_vote_hash(vote_data)
-                vote_signature = security_manager.generate_vote_signature(vote.id)
-                
-                fraud_detection = VoteFraudDetection.objects.create(
-                    vote=vote,
-                    device_fingerprint=security_manager.fingerprint,
-                    risk_score=risk_score,
-                    fraud_flags=fraud_flags,
-                    is_suspicious=risk_score >= security_manager.SUSPICIOUS_VOTE_THRESHOLD,
-                    is_quarantined=risk_score >= security_manager.SUSPICIOUS_VOTE_THRESHOLD,
-                    velocity_check_passed='velocity_check' not in str(fraud_flags),
-                    behavioral_check_passed='abnormal_voting' not in str(fraud_flags),
-                    geographic_check_passed='impossible_travel' not in str(fraud_flags),
-                    ip_reputation_passed='blacklisted_ip' not in fraud_flags and 'high_abuse_ip' not in str(fraud_flags),
-                    email_reputation_passed='disposable_email' not in fraud_flags,
-                    request_signature=vote_signature,
-                    vote_integrity_hash=integrity_hash
-                )
-                
-                # Create audit log
-                VoteAuditLog.objects.create(
-                    vote=vote,
-                    action='vote_created',
-                    description=f'Vote created with {number_of_votes} votes. Risk Score: {risk_score}',
-                    actor='system',
-                    ip_address=voter_ip,
-                    metadata={
-                        'fraud_flags': fraud_flags,
-                        'risk_score': risk_score,
-                        'number_of_votes': number_of_votes
-                    }
+                # Create fraud detection record and audit logs
+                build_fraud_detection(
+                    vote, security_manager.fingerprint, risk_score, fraud_flags, security_manager.evaluated_rules
+                ).save()
+                VoteAuditLog.objects.bulk_create(
+                    build_audit_logs(vote, is_valid, error_message, risk_score, fraud_flags)
                 )
             
+            security_manager.record_vote(contestant_id, vote_id=vote.id)
+            
             from .serializers import VoteSerializer
             serializer = VoteSerializer(vote)
             
             # Determine response based on fraud status
             if not is_valid:
-                VoteAuditLog.objects.create(
-                    vote=vote,
-                    action='fraud_detected',
-                    description=error_message,
-                    actor='system',
-                    ip_address=voter_ip,
-                    metadata={'risk_score': risk_score, 'fraud_flags': fraud_flags}
-                )
-                
                 return Response({
                     "status": "error",
                     "statusText": error_message,
@@ -545,23 +572,13 @@ class VoteView(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Vote passed security checks - awaiting payment
-            if risk_score > 0:
-                VoteAuditLog.objects.create(
-                    vote=vote,
-                    action='vote_flagged',
-                    description=f'Vote flagged for review - Risk Score: {risk_score}',
-                    actor='system',
-                    ip_address=voter_ip,
-                    metadata={'fraud_flags': fraud_flags}
-                )
-            
             return Response({
                 "status": "success",
                 "statusText": f"{number_of_votes} vote(s) recorded successfully. Awaiting payment confirmation.",
                 "data": {
                     **serializer.data,
-                    "total_cost": float(vote.calculate_total_cost()),
-                    "cost_per_vote": float(event.amount_per_vote),
+                    "total_cost": float(self._calculate_vote_cost(entry, number_of_votes)),
+                    "cost_per_vote": float(entry.amount_per_vote),
                     "payment_status": vote.payment_status,
                     "vote_id": vote.id,
                     "risk_score": risk_score,
@@ -576,6 +593,106 @@ class VoteView(APIView):
                 "statusText": "Error recording vote"
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    def _record_for_deferred_scoring(self, request, entry, contestant_id, voter_ip, voter_email,
+                                     number_of_votes, security_manager):
+        """Record the vote now and let the scoring pool run the fraud checks"""
+        request_meta = snapshot_request_meta(request)
+        
+        with transaction.atomic():
+            vote = Vote.objects.create(
+                contestant_id=contestant_id,
+                event_id=entry.event_id,
+                voter_ip=voter_ip,
+                voter_email=voter_email,
+                voter_identifier=security_manager._create_voter_identifier(),
+                number_of_votes=number_of_votes,
+                vote_amount=self._calculate_vote_cost(entry, number_of_votes),
+                payment_status='pending'
+            )
+            VoteAuditLog.objects.create(
+                vote=vote,
+                action='vote_created',
+                description=f'Vote created with {number_of_votes} votes. Fraud scoring deferred',
+                actor='system',
+                ip_address=voter_ip,
+                metadata={
+                    'number_of_votes': number_of_votes,
+                    'scoring': 'deferred',
+                    'request_meta': request_meta
+                }
+            )
+            transaction.on_commit(lambda: get_scoring_pool().submit(vote.id, request_meta))
+        
+        from .serializers import VoteSerializer
+        return Response({
+            "status": "success",
+            "statusText": f"{number_of_votes} vote(s) recorded successfully. Awaiting payment confirmation.",
+            "data": {
+                **VoteSerializer(vote).data,
+                "total_cost": float(vote.vote_amount),
+                "cost_per_vote": float(entry.amount_per_vote),
+                "payment_status": vote.payment_status,
+                "vote_id": vote.id,
+                "risk_score": None,
+                "requires_review": None,
+                "scoring": "pending"
+            }
+        }, status=status.HTTP_201_CREATED)
+    
+    def _enqueue_vote(self, entry, contestant_id, voter_ip, voter_email, number_of_votes,
+                      security_manager, is_valid, error_message, risk_score, fraud_flags):
+        """Hand a validated vote to the write-behind buffer and answer with its ticket"""
+        vote_amount = self._calculate_vote_cost(entry, number_of_votes)
+        ticket = get_ingestion_buffer().submit({
+            'vote': {
+                'contestant_id': contestant_id,
+                'event_id': entry.event_id,
+                'voter_ip': voter_ip,
+                'voter_email': voter_email,
+                'voter_identifier': security_manager._create_voter_identifier(),
+                'number_of_votes': number_of_votes,
+                'vote_amount': str(vote_amount),
+            },
+            'fraud': {
+                'device_fingerprint': security_manager.fingerprint,
+                'risk_score': risk_score,
+                'fraud_flags': fraud_flags,
+                'evaluated_rules': security_manager.evaluated_rules,
+                'is_valid': is_valid,
+                'error_message': error_message,
+            },
+        })
+        security_manager.record_vote(contestant_id)
+        
+        if not is_valid:
+            return Response({
+                "status": "error",
+                "statusText": error_message,
+                "data": {
+                    "ticket": ticket,
+                    "risk_score": risk_score,
+                    "fraud_flags": fraud_flags,
+                    "status": "quarantined"
+                }
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            "status": "success",
+            "statusText": f"{number_of_votes} vote(s) accepted. Awaiting payment confirmation.",
+            "data": {
+                "ticket": ticket,
+                "contestant": contestant_id,
+                "event": entry.event_id,
+                "voter_email": voter_email,
+                "vote_amount": str(vote_amount),
+                "total_cost": float(vote_amount),
+                "cost_per_vote": float(entry.amount_per_vote),
+                "payment_status": "pending",
+                "risk_score": risk_score,
+                "requires_review": risk_score > 0
+            }
+        }, status=status.HTTP_202_ACCEPTED)
+    
     def _get_client_ip(self, request):
         """Get client IP address from request"""
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -585,9 +702,44 @@ class VoteView(APIView):
             ip = request.META.get('REMOTE_ADDR')
         return ip
     
-    def _calculate_vote_cost(self, event, number_of_votes):
+    def _calculate_vote_cost(self, entry, number_of_votes):
         """Calculate total cost for votes"""
-        return number_of_votes * event.amount_per_vote
+        return number_of_votes * entry.amount_per_vote
+
+
+class VoteTicketView(APIView):
+    """Resolve a buffered-ingestion ticket to its stored vote"""
+    permission_classes = []
+
+    def get(self, request, ticket):
+        try:
+            vote = Vote.objects.filter(ingestion_ticket=ticket).values('id', 'payment_status').first()
+            if vote:
+                return Response({
+                    "status": "success",
+                    "data": {
+                        "ticket": str(ticket),
+                        "vote_id": vote['id'],
+                        "payment_status": vote['payment_status']
+                    }
+                }, status=status.HTTP_200_OK)
+            
+            if ingestion_mode() == 'buffered' and get_ingestion_buffer().is_pending(str(ticket)):
+                return Response({
+                    "status": "success",
+                    "data": {"ticket": str(ticket), "vote_id": None, "payment_status": "queued"}
+                }, status=status.HTTP_202_ACCEPTED)
+            
+            return Response({
+                "status": "error",
+                "statusText": "Ticket not found or not yet ingested"
+            }, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            logger.error(f"Error resolving vote ticket: {e}", exc_info=True)
+            return Response({
+                "status": "error",
+                "statusText": "Error resolving vote ticket"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 class UpdateVotePaymentView(APIView):
@@ -608,6 +760,20 @@ class UpdateVotePaymentView(APIView):
                     "statusText": "Invalid payment status"
                 }, status=status.HTTP_400_BAD_REQUEST)
             
+            # A vote recorded for deferred scoring must be scored before it can be completed
+            if payment_status == 'completed' and vote.payment_status != 'completed':
+                fraud_detection = ensure_scored(vote)
+                if fraud_detection is not None and fraud_detection.is_quarantined:
+                    return Response({
+                        "status": "error",
+                        "statusText": "Vote is quarantined pending review",
+                        "data": {
+                            "vote_id": vote.id,
+                            "risk_score": fraud_detection.risk_score,
+                            "fraud_flags": fraud_detection.fraud_flags
+                        }
+                    }, status=status.HTTP_409_CONFLICT)
+            
             with transaction.atomic():
                 old_status = vote.payment_status
                 vote.payment_status = payment_status
@@ -654,32 +820,17 @@ class EventResultsView(APIView):
 
     def get(self, request, event_id):
         try:
-            event = get_object_or_404(Event, id=event_id, published=True)
-            
-            # Get all categories with contestants and their vote counts
-            categories_data = []
-            for category in event.eventcategory_set.all():
-                # Get contestants with vote counts, sorted by votes descending
-                contestants = category.contestants.all().annotate(
-                    vote_count=models.Count('votes')
-                ).order_by('-vote_count')
-                
-                from .serializers import ContestantWithVotesSerializer
-                contestants_serializer = ContestantWithVotesSerializer(contestants, many=True)
-                
-                categories_data.append({
-                    'id': category.id,
-                    'name': category.name,
-                    'contestants': contestants_serializer.data
-                })
+            # All categories and contestants with completed vote totals, cached per version
+            results = get_results(event_id)
+            if results is None:
+                return Response({
+                    "status": "error",
+                    "statusText": "Event not found"
+                }, status=status.HTTP_404_NOT_FOUND)
 
             return Response({
                 "status": "success",
-                "data": {
-                    "event_id": event.id,
-                    "event_name": event.name,
-                    "categories": categories_data
-                }
+                "data": results
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -693,24 +844,70 @@ class EventResultsView(APIView):
 from rest_framework.generics import ListAPIView
 
 class SearchPublishedEvents(APIView):
-    serializer_class = EventSerializer
+    """Full-text search over published events, their categories and contestants"""
+    permission_classes = []  # No authentication required
+
     def get(self, request):
-        search = request.query_params.get("event_kwargs", "").strip()
-
-        # 🔒 Only published events
-        queryset = Event.objects.filter(published=True,name__icontains=search)
-
-        # 🔍 Apply search ONLY if a query exists
-        # if search:
-        #     queryset = queryset.filter(
-        #         Q(name__icontains=search) 
-        #         # |
-        #         # Q(bio__icontains=search)
-        #     )
-
-        serializer = EventSerializer(queryset, many=True)
-        print(serializer.data)
-        print(queryset)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    
-       
\ No newline at end of file
+        """
+        Query params:
+        - event_kwargs: search text (the last word matches as a prefix)
+        - page: 1-based page number (default 1)
+        - limit: page size (default 20, max 50)
+        """
+        try:
+            query = request.query_params.get("event_kwargs", "").strip()
+            try:
+                page = max(1, int(request.query_params.get("page", 1)))
+            except ValueError:
+                page = 1
+            limit = search_page_size(request.query_params.get("limit", SEARCH_PAGE_SIZE))
+
+            event_ids, has_next = search_events(query, page=page, limit=limit)
+
+            # 🔒 Only published events, returned in rank order
+            rows = {row['id']: row for row in event_rows(Event.objects.filter(id__in=event_ids, published=True))}
+            ranked = [rows[event_id] for event_id in event_ids if event_id in rows]
+
+            return Response({
+                "status": "success",
+                "data": serialize_events(ranked, request=request, shallow=True),
+                "page": page,
+                "has_next": has_next
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(f"Error searching events: {e}")
+            return Response({
+                "status": "error",
+                "message": "Error searching events"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class EventAutocomplete(APIView):
+    """Typeahead suggestions for published events and contestants, served from memory"""
+    permission_classes = []  # No authentication required
+
+    def get(self, request):
+        """
+        Query params:
+        - q: prefix of an event or contestant name (or of any word in it)
+        - limit: number of suggestions (default 8, max 20)
+        """
+        try:
+            try:
+                limit = max(1, min(int(request.query_params.get("limit", AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_MAX_LIMIT))
+            except ValueError:
+                limit = AUTOCOMPLETE_LIMIT
+
+            suggestions = get_autocomplete_index().complete(request.query_params.get("q", ""), limit=limit)
+            return Response({
+                "status": "success",
+                "data": [suggestion._asdict() for suggestion in suggestions]
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(f"Error completing search: {e}")
+            return Response({
+                "status": "error",
+                "message": "Error completing search"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
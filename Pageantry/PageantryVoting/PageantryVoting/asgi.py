@@ -3,6 +3,10 @@ ASGI config for PageantryVoting project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn PageantryVoting.asgi:application``)
+for the live tally stream at analytics/stream/<event_id>/: each open stream is a
+coroutine rather than a blocked worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
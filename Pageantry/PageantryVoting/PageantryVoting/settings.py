@@ -110,6 +110,19 @@ DATABASES = {
     }
 }
 
+# ---------------------------
+# CACHE
+# ---------------------------
+# Rate limits and other vote counters rely on atomic cache.incr. The local-memory
+# cache is per process; run multiple workers against a shared Redis cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # 'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        # 'LOCATION': 'redis://127.0.0.1:6379',
+    }
+}
+
 # ---------------------------
 # PASSWORD VALIDATION
 # ---------------------------
@@ -209,3 +222,80 @@ PHONE_VERIFICATION_URL = 'http://10.187.99.190:5173/'
 # IMAGE AND FILE UPLOAD LIMIT
 DATA_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024   # 20MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+
+
+# ---------------------------
+# VOTE INGESTION
+# ---------------------------
+# 'direct' writes every vote in its own transaction; 'buffered' accepts votes into
+# an in-process write-behind buffer that is flushed with bulk inserts.
+VOTE_INGESTION_MODE = 'direct'
+VOTE_INGESTION_FLUSH_INTERVAL_MS = 200
+VOTE_INGESTION_MAX_BATCH = 500
+VOTE_INGESTION_SPOOL_DIR = BASE_DIR / 'spool'
+
+# ---------------------------
+# FRAUD SCORING
+# ---------------------------
+# 'sync' scores every vote before responding; 'deferred' records the vote, answers
+# at once and scores it on a background pool. Either way the payment callback will
+# not complete a vote that has not been scored or that was quarantined.
+VOTE_FRAUD_SCORING = 'sync'
+VOTE_FRAUD_SCORING_WORKERS = 4
+VOTE_FRAUD_SCORING_WAIT_SECONDS = 5
+
+# ---------------------------
+# ANALYTICS PIPELINE
+# ---------------------------
+# 'inline' applies each vote change to the aggregates inside the request; 'queue'
+# stores it as an AnalyticsJob after commit for `manage.py analytics_worker`, which
+# applies all queued changes of an event as one batch.
+ANALYTICS_PIPELINE = 'inline'
+ANALYTICS_WORKER_BATCH = 500
+ANALYTICS_JOB_LEASE_SECONDS = 300
+ANALYTICS_JOB_MAX_ATTEMPTS = 5
+# Above 1, vote counters of hot rows (event, contestants, current buckets) are spread
+# over this many CounterShard rows and folded in by `manage.py compact_counters`.
+ANALYTICS_COUNTER_SHARDS = 0
+
+# ---------------------------
+# ANALYTICS DASHBOARD
+# ---------------------------
+# The dashboard payload is cached per event and rebuilt in the background (at most
+# once per refresh interval) when votes change; GET requests never write.
+ANALYTICS_DASHBOARD_REFRESH_SECONDS = 5
+ANALYTICS_DASHBOARD_TTL = 86400
+# Ranked contestant standings are updated in the cache after every vote commit;
+# entries expire after this many seconds and are rebuilt from the analytics tables.
+ANALYTICS_STANDINGS_TTL = 300
+
+# ---------------------------
+# LIVE TALLY STREAM
+# ---------------------------
+# analytics/stream/<event_id>/ is an async Server-Sent Events view; run the project
+# under an ASGI server (e.g. `uvicorn PageantryVoting.asgi:application`) to use it.
+ANALYTICS_STREAM_POLL_SECONDS = 1
+ANALYTICS_STREAM_HEARTBEAT_SECONDS = 15
+
+# ---------------------------
+# ANALYTICS EXPORT
+# ---------------------------
+# Row exports (votes, contestants, timeline, audit) are streamed as CSV or NDJSON,
+# reading this many rows per database fetch.
+ANALYTICS_EXPORT_CHUNK_SIZE = 2000
+# Parquet exports (format=parquet, or `manage.py export_parquet`) need pyarrow
+# (pip install -r requirements-parquet.txt) and are written one row group of this
+# many rows at a time.
+ANALYTICS_PARQUET_ROW_GROUP_SIZE = 100000
+
+# ---------------------------
+# VOTE ROLLUPS
+# ---------------------------
+# Minute, hour and day buckets of completed votes. Run `manage.py rollup_votes`
+# every minute (cron) to fold minutes into hours and hours into days and to drop
+# rolled-up rows older than their retention in days (None keeps them forever).
+ANALYTICS_ROLLUP_RETENTION_DAYS = {
+    'minute': 2,
+    'hour': 90,
+    'day': None,
+}
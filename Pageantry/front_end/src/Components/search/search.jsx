@@ -1,13 +1,15 @@
 import { useState } from "react";
+import { useNavigate } from "react-router-dom";
 import "./search.css";
 import { BASE_URL } from "../../baseUrl";
 
 export default function SearchBar({ placeholder = "Search...", setnotification }) {
-
+  const [suggestions, setSuggestions] = useState([]);
+  const navigate = useNavigate();
 
   const fetchSearchEvents = async ({ event_kwargs, setnotification }) => {
     try {
-      const response = await fetch(`${BASE_URL(`event/search/?event_kwargs=${event_kwargs}`)}/`)
+      const response = await fetch(BASE_URL(`event/search/?event_kwargs=${encodeURIComponent(event_kwargs)}`))
       const data = await response.json();
       if (response.ok && data.status === 'success') {
         console.log("Search Results:", data.data);
@@ -34,14 +36,44 @@ export default function SearchBar({ placeholder = "Search...", setnotification }
 
 
 
+  // Typeahead suggestions come from the in-memory autocomplete endpoint
+  const fetchSuggestions = async (prefix) => {
+    if (!prefix.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    try {
+      const response = await fetch(BASE_URL(`event/autocomplete/?q=${encodeURIComponent(prefix)}`));
+      const data = await response.json();
+      if (response.ok && data.status === 'success') {
+        setSuggestions(data.data);
+      }
+    } catch (error) {
+      console.error("Error fetching suggestions:", error);
+    }
+  }
+
   return (
     <div className="search-wrapper">
       <input
         type="text"
         className="search-input"
         placeholder={placeholder}
-        onChange={(e) => fetchSearchEvents({ event_kwargs: e.target.value })}
+        onChange={(e) => fetchSuggestions(e.target.value)}
+        onKeyDown={(e) => e.key === 'Enter' && fetchSearchEvents({ event_kwargs: e.target.value, setnotification })}
       />
+      {suggestions.length > 0 && (
+        <ul className="search-suggestions">
+          {suggestions.map((suggestion) => (
+            <li key={`${suggestion.type}-${suggestion.id}`} onClick={() => navigate(`/vote/${suggestion.event_id}`)}>
+              <span className="suggestion-name">{suggestion.name}</span>
+              {suggestion.type === 'contestant' && (
+                <span className="suggestion-event">{suggestion.event_name}</span>
+              )}
+            </li>
+          ))}
+        </ul>
+      )}
     </div>
   );
 }
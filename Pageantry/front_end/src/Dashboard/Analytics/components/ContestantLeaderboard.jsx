@@ -19,37 +19,42 @@ const ContestantLeaderboard = ({ contestants }) => {
       <h2>🏆 Contestant Leaderboard</h2>
       <div className="leaderboard-list">
         {contestants.map((contestant, idx) => (
-          <div key={contestant.contestant_id} className="leaderboard-item">
-            <div className="rank-medal">{getMedalEmoji(idx + 1)}</div>
-            
-            {contestant.contestant_photo && (
-              <img 
-                src={contestant.contestant_photo} 
-                alt={contestant.contestant_name}
-                className="contestant-photo"
-              />
+          <React.Fragment key={contestant.contestant_id}>
+            {(idx === 0 || contestants[idx - 1].category_id !== contestant.category_id) && (
+              <h3 className="leaderboard-category">{contestant.category_name || 'Uncategorized'}</h3>
             )}
+            <div className="leaderboard-item">
+              <div className="rank-medal">{getMedalEmoji(contestant.vote_rank ?? idx + 1)}</div>
+            
+              {contestant.contestant_photo && (
+                <img 
+                  src={contestant.contestant_photo} 
+                  alt={contestant.contestant_name}
+                  className="contestant-photo"
+                />
+              )}
             
-            <div className="contestant-info">
-              <div className="contestant-name">{contestant.contestant_name}</div>
-              <div className="contestant-stats">
-                <span className="stat-item">
-                  📊 {contestant.total_votes} votes
-                </span>
-                <span className="stat-item">
-                  💰 GHS {parseFloat(contestant.total_revenue).toFixed(2)}
-                </span>
+              <div className="contestant-info">
+                <div className="contestant-name">{contestant.contestant_name}</div>
+                <div className="contestant-stats">
+                  <span className="stat-item">
+                    📊 {contestant.total_votes} votes
+                  </span>
+                  <span className="stat-item">
+                    💰 GHS {parseFloat(contestant.total_revenue).toFixed(2)}
+                  </span>
+                </div>
               </div>
-            </div>
             
-            <div className="percentage-bar">
-              <div 
-                className="percentage-fill"
-                style={{ width: `${contestant.percentage_of_total}%` }}
-              ></div>
+              <div className="percentage-bar">
+                <div 
+                  className="percentage-fill"
+                  style={{ width: `${contestant.percentage_of_total}%` }}
+                ></div>
+              </div>
+              <span className="percentage-text">{contestant.percentage_of_total.toFixed(1)}%</span>
             </div>
-            <span className="percentage-text">{contestant.percentage_of_total.toFixed(1)}%</span>
-          </div>
+          </React.Fragment>
         ))}
       </div>
     </div>
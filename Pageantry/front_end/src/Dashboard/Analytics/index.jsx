@@ -53,6 +53,26 @@ const Analytics = () => {
     return () => clearInterval(interval);
   }, [fetchAnalytics, refreshInterval]);
 
+  // Push live totals into the overview between refreshes (published events only)
+  useEffect(() => {
+    if (!window.EventSource) return;
+
+    const stream = new EventSource(`http://127.0.0.1:8000/analytics/stream/${eventId}/`);
+    stream.addEventListener('delta', (message) => {
+      const { total_votes, unique_voters, total_vote_amount } = JSON.parse(message.data);
+      const changes = Object.fromEntries(
+        Object.entries({ total_votes, unique_voters, total_vote_amount }).filter(([, value]) => value !== undefined)
+      );
+      setAnalyticsData((previous) => previous && {
+        ...previous,
+        event_overview: { ...previous.event_overview, ...changes },
+      });
+    });
+    stream.onerror = () => stream.close();
+
+    return () => stream.close();
+  }, [eventId]);
+
   if (loading) {
     return (
       <div className="analytics-container">
@@ -149,7 +169,7 @@ const Analytics = () => {
       {/* Export section */}
       <div className="analytics-export-section">
         <button 
-          onClick={() => window.open(`http://127.0.0.1:8000/analytics/export/${eventId}/?format=csv`, '_blank')}
+          onClick={() => window.open(`http://127.0.0.1:8000/analytics/export/${eventId}/?format=csv&data_type=votes`, '_blank')}
           className="btn-export"
         >
           📥 Export as CSV
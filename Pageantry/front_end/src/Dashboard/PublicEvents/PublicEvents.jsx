@@ -6,15 +6,18 @@ import './public-events.css';
 export default function PublicEvents({ setnotification }) {
   const [events, setEvents] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
   const navigate = useNavigate();
 
   useEffect(() => {
     fetchPublishedEvents();
   }, []);
 
-  const fetchPublishedEvents = async () => {
+  const fetchPublishedEvents = async (cursor = null) => {
     try {
-      const response = await fetch(`${BASE_URL('event/published/')}`, {
+      const params = new URLSearchParams({ shallow: '1' });
+      if (cursor) params.set('cursor', cursor);
+      const response = await fetch(`${BASE_URL('event/published/')}?${params}`, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -24,7 +27,8 @@ export default function PublicEvents({ setnotification }) {
       const data = await response.json();
 
       if (response.ok && data.status === 'success') {
-        setEvents(data.data);
+        setEvents((previous) => (cursor ? [...previous, ...data.data] : data.data));
+        setNextCursor(data.next_cursor);
       } else {
         setnotification?.({
           message: data.message || 'Failed to load events',
@@ -108,6 +112,14 @@ export default function PublicEvents({ setnotification }) {
           ))}
         </div>
       )}
+
+      {nextCursor && (
+        <div className="event-actions">
+          <button className="btn btn-secondary" onClick={() => fetchPublishedEvents(nextCursor)}>
+            Load more events
+          </button>
+        </div>
+      )}
     </div>
   );
 }
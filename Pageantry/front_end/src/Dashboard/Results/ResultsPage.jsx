@@ -17,8 +17,29 @@ function ResultsPage({ setnotification }) {
 
   useEffect(() => {
     fetchResults();
-    const interval = setInterval(fetchResults, 5000); // Refresh every 5 seconds
-    return () => clearInterval(interval);
+
+    // Refetch when the live tally stream reports a change; poll if streaming is unavailable
+    let interval = null;
+    const startPolling = () => {
+      if (!interval) interval = setInterval(fetchResults, 5000); // Refresh every 5 seconds
+    };
+
+    if (!window.EventSource) {
+      startPolling();
+      return () => clearInterval(interval);
+    }
+
+    const stream = new EventSource(BASE_URL(`analytics/stream/${eventId}/`));
+    stream.addEventListener('delta', fetchResults);
+    stream.onerror = () => {
+      stream.close();
+      startPolling();
+    };
+
+    return () => {
+      stream.close();
+      clearInterval(interval);
+    };
   }, [eventId]);
 
   useEffect(() => {